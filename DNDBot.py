@@ -1,24 +1,22 @@
 import asyncio
 import datetime
 import os
-import sqlite3
 import traceback
-import zipfile
 
 import discord.abc
 from discord.ext import commands, tasks
 
-from modules import CampaignBuilder, CampaignSQLHelper, CampaignPlayerManager, CampaignManager, Strings
+from modules import CampaignBuilder, CampaignSQLHelper, CampaignPlayerManager, CampaignManager, Database, Strings, \
+    MessageDispatcher, Lane, DispatchContext
 
 
 class DNDBot(commands.Bot):
     instance: 'DNDBot' = None
 
     # noinspection PyTypeChecker
-    def __init__(self, db: sqlite3.Cursor, connection: sqlite3.Connection, config: dict, **kwargs):
+    def __init__(self, db: Database, config: dict, **kwargs):
         super().__init__(**kwargs)
         self.db = db
-        self.connection = connection
         self.config = config
         self.all_cogs, self.loaded_cogs, self.unloaded_cogs = [], [], []
         self.COG_FILE = "COGS.txt"
@@ -32,40 +30,56 @@ class DNDBot(commands.Bot):
         self.CampaignPlayerManager: CampaignPlayerManager = None
         self.CampaignManager: CampaignManager = None
         self.campaign_creation_callback: callable = None
+        self.dispatcher = MessageDispatcher(config.get("send_concurrency", 8), config.get("bulk_send_concurrency", 4))
         self.backup_task.start()
         self.mutex = asyncio.Lock()
 
+    async def setup_hook(self):
+        await self.CampaignSQLHelper.load_registry()
+
+    async def get_context(self, origin, /, *, cls=DispatchContext):
+        # command replies go through the dispatcher
+        return await super().get_context(origin, cls=cls)
+
     @tasks.loop(hours=24)
     async def backup_task(self):
         await self.wait_until_ready()
-        await self.mutex.acquire()
-        self.connection.close()
         try:
             # if backups/ directory doesn't exist, create it
             if not os.path.exists("backups"):
                 os.makedirs("backups")
-                # zip the database file
             filename = ("backups/" + self.config["database_file"] + '-' +
                         datetime.date.today().strftime("%Y-%m-%d") + ".zip")
-            with zipfile.ZipFile(filename, "w") as backup:
-                backup.write(self.config["database_file"], os.path.basename(self.config["database_file"]))
-        except Exception as e:
+            # snapshot and compress the database without closing the live connection
+            await self.db.backup(filename)
+        except Exception:
             traceback.print_exc()
-        finally:
-            def dict_factory(cursor, row):
-                d = {}
-                for idx, col in enumerate(cursor.description):
-                    d[col[0]] = row[idx]
-                return d
-            self.connection = sqlite3.connect(self.config["database_file"], check_same_thread=False)
-            self.connection.row_factory = dict_factory
-            self.db = self.connection.cursor()
-            self.mutex.release()
 
-    async def try_send_message(self, member: discord.Member, channel: discord.abc.Messageable, message):
+    async def try_send_message(self, member: discord.Member, channel: discord.abc.Messageable, message,
+                               lane: Lane = Lane.INTERACTIVE):
+        """
+        DMs a member, or says in channel that it couldn't. Both go through the dispatcher, each queued behind what is
+        already being sent to its destination.
+        :param member: The member to DM
+        :param channel: Where to say so if the DM fails
+        :param message: The message
+        :param lane: The sends' priority
+        """
         try:
-            await member.send(message)
+            await self.dispatcher.send(member, message, lane)
         except discord.Forbidden:
-            await channel.send(Strings.Error.ERROR_CLOSED_DMS.format(member=member))
+            await self.dispatcher.send(channel, Strings.Error.ERROR_CLOSED_DMS.format(member=member), lane)
         except Exception:
-            await channel.send(Strings.Error.ERROR_UNKNOWN_DMS.format(member=member))
+            await self.dispatcher.send(channel, Strings.Error.ERROR_UNKNOWN_DMS.format(member=member), lane)
+
+    def notify(self, member: discord.Member, channel: discord.abc.Messageable, message,
+               lane: Lane = Lane.BULK) -> asyncio.Future:
+        """
+        Starts try_send_message, by default in the bulk lane, for notifying many members at once
+        :param member: The member to DM
+        :param channel: Where to say so if their DMs are closed
+        :param message: The message
+        :param lane: The send's priority
+        :return: A future that is done once the member was messaged
+        """
+        return asyncio.ensure_future(self.try_send_message(member, channel, message, lane))
@@ -0,0 +1,65 @@
+import json
+from typing import Optional
+
+from fastapi import FastAPI
+from fastapi.exceptions import RequestValidationError
+
+from modules.CampaignSQLHelper import CampaignSQLHelper
+from modules.Database import Database
+from modules.api import api
+from modules.api.ApiContext import context
+from modules.api.BotBridge import MemberInfo, RemoteBridge
+
+# Serves the API from worker processes of its own, so a slow request can never hold up the bot's gateway heartbeats:
+#     uvicorn api_main:app --workers 4
+# main.py has to be running with api_bridge_socket set in config.json, and started first so the database is migrated.
+# Rate limits and response caches are kept per worker.
+
+with open('config.json') as config_file:
+    config = json.load(config_file)
+
+app = FastAPI()
+app.include_router(api.router)
+app.include_router(api.router_v2)
+app.add_exception_handler(RequestValidationError, api.validation_exception_handler)
+
+
+class ApiWorker:
+    """
+    Stands in for the bot where CampaignSQLHelper expects one, the helper only uses its database
+    """
+
+    def __init__(self, db: Database):
+        self.db = db
+        self.config = config
+
+
+@app.on_event("startup")
+async def startup():
+    db = Database(config["database_file"], config.get("database_readers", 4),
+                  config.get("commit_interval_ms", 5) / 1000, config.get("commit_batch_size", 64),
+                  config.get("database_busy_timeout_s", 10))
+    campaigns = CampaignSQLHelper(ApiWorker(db))
+    # the bot writes the campaigns, workers catch up from the event log whenever it commits
+    campaigns.following = True
+    await campaigns.load_registry()
+    bridge = RemoteBridge(config["api_bridge_socket"])
+    bridge.add_commit_listener(campaigns.publish_changes)
+
+    def member_changed(before: Optional[MemberInfo], after: Optional[MemberInfo]):
+        # campaign responses include the DM's name, so they go stale when it changes
+        if before is not None and after is not None and (before.name, before.display_name) == \
+                (after.name, after.display_name):
+            return
+        for campaign in campaigns.campaigns_by_dm((before or after).id):
+            campaigns.touch(campaign.id)
+
+    bridge.add_member_listener(member_changed)
+    context.configure(db, config, campaigns, bridge)
+    await bridge.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await context.bridge.close()
+    await context.db.close()
@@ -0,0 +1,66 @@
+"""
+Compares building campaign rows into the slotted CampaignInfo through Database.row_builder against the old way, a
+dict per row from dict_factory copied onto a plain dataclass with setattr. Run from the repository root:
+    python -m benchmarks.records
+"""
+import dataclasses
+import sqlite3
+import sys
+import timeit
+import tracemalloc
+
+from modules.CampaignInfo import CampaignInfo
+from modules.Database import dict_factory, row_builder
+
+ROWS = 500
+
+# CampaignInfo as it was before it was slotted
+DictCampaignInfo = dataclasses.make_dataclass(
+    "DictCampaignInfo", [(i.name, i.type, dataclasses.field(default=i.default)) for i in dataclasses.fields(CampaignInfo)])
+
+
+def connect() -> sqlite3.Connection:
+    columns = [i.name for i in dataclasses.fields(CampaignInfo)]
+    connection = sqlite3.connect(":memory:")
+    # the table's columns are in another order than the fields, like the real table after its migrations
+    connection.execute(f"CREATE TABLE campaigns ({', '.join(reversed(columns))})")
+    connection.executemany(f"INSERT INTO campaigns ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                           [dataclasses.astuple(CampaignInfo(name=f"Campaign {i}", id=str(i), dm=i % 50,
+                                                             max_players=6)) for i in range(ROWS)])
+    return connection
+
+
+def build_dicts(connection: sqlite3.Connection) -> list:
+    connection.row_factory = dict_factory
+    campaigns = []
+    for row in connection.execute("SELECT * FROM campaigns").fetchall():
+        campaign = DictCampaignInfo()
+        for key, value in row.items():
+            setattr(campaign, key, value)
+        campaigns.append(campaign)
+    return campaigns
+
+
+def build_records(connection: sqlite3.Connection) -> list:
+    connection.row_factory = None
+    cursor = connection.execute("SELECT * FROM campaigns")
+    build = row_builder(CampaignInfo, tuple(i[0] for i in cursor.description))
+    return [build(row) for row in cursor.fetchall()]
+
+
+def main():
+    connection = connect()
+    print(f"Python {sys.version.split()[0]}, sqlite {sqlite3.sqlite_version}, {ROWS} campaign rows")
+    for build in (build_dicts, build_records):
+        seconds = min(timeit.repeat(lambda: build(connection), number=20, repeat=5)) / 20
+        tracemalloc.start()
+        build(connection)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"{build.__name__}: {seconds / ROWS * 1e6:.2f} us/row, peak {peak / ROWS:.0f} B/row")
+    old, new = build_dicts(connection)[0], build_records(connection)[0]
+    print(f"instance size: {sys.getsizeof(old) + sys.getsizeof(old.__dict__)} B -> {sys.getsizeof(new)} B")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,65 +1,52 @@
 import asyncio
 import json
-import logging
-import sqlite3
 import sys
 
 import discord
 from fastapi import FastAPI
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
 
 from DNDBot import DNDBot
+from modules.Database import Database
+from modules.Migrations import Migrations
 from modules.api import api
+from modules.api.ApiContext import context
+from modules.api.BotBridge import BridgeServer, LocalBridge
 from modules.errorhandler import TracebackHandler
-from fastapi import status
-from fastapi import Request
 
 
-def dict_factory(cursor, row):
-    d = {}
-    for idx, col in enumerate(cursor.description):
-        d[col[0]] = row[idx]
-    return d
-
-
-app = FastAPI()
-app.include_router(api.router)
 with open('config.json') as config_file:
     config = json.load(config_file)
 with open('token.txt', 'r') as token:
     TOKEN = token.read().rstrip()
 
+app = FastAPI()
+# with a bridge socket configured the API is served by api_main.py's worker processes, not by the bot's
+if not config.get("api_bridge_socket"):
+    app.include_router(api.router)
+    app.include_router(api.router_v2)
+    app.add_exception_handler(RequestValidationError, api.validation_exception_handler)
+
 
 async def get_prefix(bot_, message):
     return config["prefix"]
 
 
-@app.exception_handler(RequestValidationError)
-async def validation_exception_handler(request: Request, exc: RequestValidationError):
-    # exc_str = f'{exc}'.replace('\n', ' ').replace('   ', ' ')
-    logging.error(f"{request}: {str(exc)}")
-    content = {'status_code': 10422, 'message': str(exc), 'data': None}
-    return JSONResponse(content=content, status_code=status.HTTP_422_UNPROCESSABLE_ENTITY)
-
-
 GUILD_ID = config["server"]
 
-connection = sqlite3.connect(config["database_file"], check_same_thread=False)
-# connection.row_factory = sqlite3.Row
-
-connection.row_factory = dict_factory
-db = connection.cursor()
-db.execute("CREATE TABLE IF NOT EXISTS campaigns (id INTEGER PRIMARY KEY, name TEXT, dm INTEGER, role INTEGER, "
-           "category INTEGER, information_channel INTEGER, min_players INTEGER, max_players INTEGER, current_players "
-           "INTEGER, status_message INTEGER)")
-db.execute("CREATE TABLE IF NOT EXISTS warns (id INTEGER PRIMARY KEY, member INTEGER, reason TEXT)")
-connection.commit()
+db = Database(config["database_file"], config.get("database_readers", 4), config.get("commit_interval_ms", 5) / 1000,
+              config.get("commit_batch_size", 64), config.get("database_busy_timeout_s", 10))
+# migrations run synchronously, nothing else can touch the connection before the bot starts
+migrations = Migrations(db.connection)
+migrations.migrate()
+migrations.check_query_plans()
 
 intents = discord.Intents.all()
 
-bot = DNDBot(db, connection, config, command_prefix=get_prefix, intents=intents)
+bot = DNDBot(db, config, command_prefix=get_prefix, intents=intents)
 DNDBot.instance = bot
+bridge = LocalBridge(bot)
+context.configure(db, config, bot.CampaignSQLHelper, bridge)
 
 
 @bot.event
@@ -98,6 +85,8 @@ DNDBot.instance.campaign_creation_callback = api.campaign_creation_callback
 
 
 async def start():
+    if config.get("api_bridge_socket"):
+        await BridgeServer(bridge, config["api_bridge_socket"]).start()
     try:
         await bot.start(TOKEN)
     except KeyboardInterrupt:
@@ -1,11 +1,12 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, fields
+from operator import attrgetter
 
 
-@dataclass
+@dataclass(slots=True)
 class CampaignInfo:
     """
     Holds the information about a given campaign, normally created by CampaignSQLHelper from a row. Can be
-    initialized to  and filled manually, or can be filled via constructor.
+    initialized to  and filled manually, or can be filled via constructor. Slotted, so only the fields below can be set.
     :param name: The campaign's name
     :param role: The campaign's role
     :param category: The campaign's category channel
@@ -51,3 +52,13 @@ class CampaignInfo:
     new_player_friendly: int = 0
     timestamp: int = 0
     paused: int = 0
+
+    def copy(self) -> 'CampaignInfo':
+        return CampaignInfo(*_values(self))
+
+    def to_dict(self) -> dict:
+        return dict(zip(FIELDS, _values(self)))
+
+
+FIELDS = tuple(field.name for field in fields(CampaignInfo))
+_values = attrgetter(*FIELDS)
@@ -1,3 +1,4 @@
+import asyncio
 import functools
 import sys
 import typing
@@ -8,6 +9,7 @@ import datetime
 from typing import Union, TYPE_CHECKING
 
 from .CampaignInfo import CampaignInfo
+from .MessageDispatcher import Lane
 from .errorhandler import TracebackHandler
 import shlex
 from .Strings import Error, Confirmation
@@ -47,10 +49,10 @@ class CampaignManager(commands.Cog):
             info.replace("\n", """
 """)
         async with self.bot.mutex:
-            campaign = self.CampaignSQLHelper.select_campaign(campaign)
-            commit = self.CampaignSQLHelper.set_campaign_info(campaign, info)
+            campaign = await self.CampaignSQLHelper.select_campaign(campaign)
+            commit = await self.CampaignSQLHelper.set_campaign_info(campaign, info)
             if commit:
-                self.bot.connection.commit()
+                await self.bot.db.commit()
                 # await self.bot.CampaignPlayerManager.update_status(campaign)
                 await context.send("Campaign info set.")
             else:
@@ -84,10 +86,10 @@ class CampaignManager(commands.Cog):
             value.replace("\n", """
 """)
         async with self.bot.mutex:
-            campaign = self.CampaignSQLHelper.select_campaign(campaign)
-            commit = self.CampaignSQLHelper.set_campaign_field(campaign, field, value)
+            campaign = await self.CampaignSQLHelper.select_campaign(campaign)
+            commit = await self.CampaignSQLHelper.set_campaign_field(campaign, field, value)
             if commit:
-                self.bot.connection.commit()
+                await self.bot.db.commit()
                 # await self.bot.CampaignPlayerManager.update_status(campaign)
             else:
                 await context.send("Error setting campaign field")
@@ -102,7 +104,7 @@ class CampaignManager(commands.Cog):
         :param reason: The reason the campaign was deleted, DM'd to the members of the campaign.
         :return: None
         """
-        resp = self.CampaignSQLHelper.select_campaign(campaign)
+        resp = await self.CampaignSQLHelper.select_campaign(campaign)
         if resp is None:
             await channel.send(f"Could not find campaign {campaign}")
             return
@@ -122,9 +124,9 @@ class CampaignManager(commands.Cog):
     async def delete_campaign(self, channel: discord.TextChannel, campaign: CampaignInfo, reason="Campaign deleted"):
 
 
-        members = [i["id"] for i in self.CampaignSQLHelper.get_players(campaign)]
+        members = [i.id for i in await self.CampaignSQLHelper.get_players(campaign)]
 
-        commit = self.CampaignSQLHelper.delete_campaign(campaign.id)
+        commit = await self.CampaignSQLHelper.delete_campaign(campaign.id)
 
         commit2 = await self.CampaignBuilder.delete_campaign(campaign)
 
@@ -135,8 +137,8 @@ class CampaignManager(commands.Cog):
         except Exception:
             pass
         if commit:
+            await self.bot.db.commit()
             await channel.send(f"Campaign \"{campaign.name}\" deleted.")
-            self.bot.connection.commit()
         else:
             await channel.send(f"There was an error deleting \"{campaign.name}\"")
             await self.handle_error()
@@ -147,12 +149,16 @@ class CampaignManager(commands.Cog):
             await channel.send(f"There was an error deleting \"{campaign.name}\".")
             return
 
+        notifications = []
         for member_id in members:
             member = channel.guild.get_member(member_id)
             if member is None:
-                await channel.send(f"Member {member_id} not found, likely left the server")
+                notifications.append(self.bot.dispatcher.send(
+                    channel, f"Member {member_id} not found, likely left the server", Lane.STAFF))
                 continue
-            await self.bot.try_send_message(member, channel, Confirmation.CONFIRM_PLAYER_CAMPAIGN_DELETE.format(member=member, campaign=campaign, reason=reason))
+            notifications.append(self.bot.notify(member, channel, Confirmation.CONFIRM_PLAYER_CAMPAIGN_DELETE.format(
+                member=member, campaign=campaign, reason=reason)))
+        await asyncio.gather(*notifications)
 
     @commands.command()
     @commands.has_any_role(1050188024287338567, 873734392458145912, 809567701735440469)  # dev, admin, officer
@@ -164,12 +170,12 @@ class CampaignManager(commands.Cog):
         :return: None
         """
         async with self.bot.mutex:
-            resp = self.CampaignSQLHelper.select_campaign(campaign)
-            commit = self.CampaignSQLHelper.rename_campaign(resp, name)
+            resp = await self.CampaignSQLHelper.select_campaign(campaign)
+            commit = await self.CampaignSQLHelper.rename_campaign(resp, name)
 
             if commit:
+                await self.bot.db.commit()
                 await context.send(f"Campaign \"{resp.name}\" renamed to \"{name}\".")
-                self.bot.connection.commit()
                 category: discord.CategoryChannel = context.guild.get_channel(resp.category)
                 await category.edit(name=name)
 
@@ -180,9 +186,9 @@ class CampaignManager(commands.Cog):
     @commands.command()
     @commands.has_any_role(1050188024287338567, 873734392458145912, 809567701735440469)  # dev, admin, officer
     async def message_players_campaign_deleted(self, context: commands.Context, role: discord.Role):
-        for member in role.members:
-            self.bot.try_send_message(member, context, f'You have been removed from a campaign due to it being ended by its DM or the '
-                                  f'President. Campaign: {role.name}.')
+        message = f'You have been removed from a campaign due to it being ended by its DM or the President. ' \
+                  f'Campaign: {role.name}.'
+        await asyncio.gather(*(self.bot.notify(member, context, message) for member in role.members))
         await context.send("Players messaged.")
         await role.delete()
         await context.send(f"Role {role.name} deleted.")
@@ -197,9 +203,9 @@ class CampaignManager(commands.Cog):
         :return: None
         """
         async with self.bot.mutex:
-            if self.CampaignSQLHelper.delete_campaign(campaign):
+            if await self.CampaignSQLHelper.delete_campaign(campaign):
+                await self.bot.db.commit()
                 await context.send(f"Campaign {campaign} deregistered.")
-                self.bot.connection.commit()
 
     @commands.command()
     @commands.has_any_role(1050188024287338567, 873734392458145912, 809567701735440469)  # dev, admin, officer
@@ -210,7 +216,7 @@ class CampaignManager(commands.Cog):
         """
         message_content = ""
         async with self.bot.mutex:
-            resp = self.bot.db.execute(f"SELECT * FROM campaigns").fetchall()
+            resp = await self.CampaignSQLHelper.get_campaigns()
         for row in resp:
             message_content += f"{row['id']}: {row['name']}, DM: {str(context.guild.get_member(row['dm']))}, " \
                                f"{row['current_players']}/{row['max_players']} {'Locked' if row['locked'] else ''}\n"
@@ -248,15 +254,15 @@ class CampaignManager(commands.Cog):
             await self.update_lock_status(context.channel, campaign, 0)
 
     async def update_lock_status(self, channel: discord.TextChannel, campaign: Union[int, str], status: int):
-        campaign = self.CampaignSQLHelper.select_campaign(campaign)
+        campaign = await self.CampaignSQLHelper.select_campaign(campaign)
         campaign.locked = status
-        commit = self.CampaignSQLHelper.set_campaign_status(campaign, status)  # unlock
+        commit = await self.CampaignSQLHelper.set_campaign_status(campaign, status)  # unlock
         if commit:
-            self.bot.connection.commit()
+            await self.bot.db.commit()
             await channel.send(f"Campaign {campaign.name} {'un' if status == 0 else ''}locked.")
             if (member := channel.guild.get_member(campaign.dm)) != None:
-                to_send = getattr(Confirmation, "CONFIRM_DM_CAMPAIGN_" + "LOCK" if status else "UNLOCK").value
-                await self.bot.try_send_message(member, channel, to_send)
+                to_send = getattr(Confirmation, "CONFIRM_DM_CAMPAIGN_" + ("LOCK" if status else "UNLOCK")).value
+                await self.bot.notify(member, channel, to_send)
         else:
             print(f"Error {'un' if status == 0 else ''}locking campaign")
 
@@ -264,17 +270,17 @@ class CampaignManager(commands.Cog):
     @commands.has_any_role(1050188024287338567, 873734392458145912, 809567701735440469)  # dev, admin, officer
     async def list_players(self, context: commands.Context, campaign: Union[int, str]):
         async with self.bot.mutex:
-            campaign = self.CampaignSQLHelper.select_campaign(campaign)
-            players = self.CampaignSQLHelper.get_players(campaign)
+            campaign = await self.CampaignSQLHelper.select_campaign(campaign)
+            players = await self.CampaignSQLHelper.get_players(campaign)
             if players is None:
                 await context.send("An error occurred.")
                 return
             message = ""
             for i in players:
-                if (member := context.guild.get_member(i["id"])) is not None:
+                if (member := context.guild.get_member(i.id)) is not None:
                     message += f"{member.display_name} ({member.id})\n"
                 else:
-                    message += f"Could not resolve user {i['id']} -- Perhaps they left?\n"
+                    message += f"Could not resolve user {i.id} -- Perhaps they left?\n"
 
             await context.send(message)
 
@@ -295,7 +301,7 @@ class CampaignManager(commands.Cog):
     @commands.has_any_role(1050188024287338567, 873734392458145912, 809567701735440469)  # dev, admin, officer
     async def fix_perms(self, context: commands.Context, campaign_id: int):
         async with self.bot.mutex:
-            campaign = self.CampaignSQLHelper.select_campaign(campaign_id)
+            campaign = await self.CampaignSQLHelper.select_campaign(campaign_id)
             channel: discord.CategoryChannel = context.guild.get_channel(campaign.category)
             guild = channel.guild
             role = guild.get_role(campaign.role)
@@ -337,7 +343,7 @@ new_player_friendly: [Yes, No]
             await context.send(message)
             return
         async with self.bot.mutex:
-            campaign = self.CampaignSQLHelper.select_campaign(campaign)
+            campaign = await self.CampaignSQLHelper.select_campaign(campaign)
             kwargs = kwargs.replace("“", "\"").replace("”", "\"")  # replace smart quotes with normal quotes
             args = shlex.split(kwargs)
             print(args)
@@ -348,15 +354,15 @@ new_player_friendly: [Yes, No]
                 key, value = arg.split("=")
                 fields.append(key)
                 values.append(value)
-                self.CampaignSQLHelper.set_campaign_field(campaign, key, value)
-            self.bot.connection.commit()
+                await self.CampaignSQLHelper.set_campaign_field(campaign, key, value)
+            await self.bot.db.commit()
             await context.send(
                 "Campaign updated with\n" + "\n".join([f"{fields[i]}={values[i]}" for i in range(len(fields))]))
 
     @commands.command()
     @commands.has_any_role(1050188024287338567, 873734392458145912, 809567701735440469)  # dev, admin, officer
     async def pause_campaign(self, context: commands.Context, campaign_id: int):
-        campaign = self.bot.CampaignSQLHelper.select_campaign(campaign_id)
+        campaign = await self.bot.CampaignSQLHelper.select_campaign(campaign_id)
         await self.pause_resume_campaign(context, campaign, "pause")
 
 
@@ -364,13 +370,14 @@ new_player_friendly: [Yes, No]
     @commands.command(aliases=["unpause_campaign"])
     @commands.has_any_role(1050188024287338567, 873734392458145912, 809567701735440469)  # dev, admin, officer
     async def resume_campaign(self, context: commands.Context, campaign_id: int):
-        campaign = self.bot.CampaignSQLHelper.select_campaign(campaign_id)
+        campaign = await self.bot.CampaignSQLHelper.select_campaign(campaign_id)
         await self.pause_resume_campaign(context, campaign, "resume")
 
     async def pause_resume_campaign(self, context: commands.Context, campaign: CampaignInfo, action: str):
-        if not getattr(self.bot.CampaignSQLHelper, action + "_campaign")(campaign):
+        if not await getattr(self.bot.CampaignSQLHelper, action + "_campaign")(campaign):
             await context.send(f"There was an error while trying to {action} {campaign.name}")
             return
+        await self.bot.db.commit()
         category: discord.CategoryChannel = context.guild.get_channel(campaign.category)
         campaign_role = context.guild.get_role(campaign.role)
         for i in category.text_channels:
@@ -381,20 +388,22 @@ new_player_friendly: [Yes, No]
         player_confirm_enum = getattr(Confirmation, "CONFIRM_PLAYER_CAMPAIGN_" + action.upper())
         dm = context.guild.get_member(campaign.dm)
 
-        players = [i["id"] for i in self.CampaignSQLHelper.get_players(campaign)]
+        players = [i.id for i in await self.CampaignSQLHelper.get_players(campaign)]
+        notifications = []
         for player in players:
             member = context.guild.get_member(player)
             player_confirm_str = player_confirm_enum.value.format(member=member, campaign=campaign)
             if member == None:
-                await context.send(f"Error: player {player} not found")
+                notifications.append(self.bot.dispatcher.send(context, f"Error: player {player} not found"))
                 continue
-            await self.bot.try_send_message(member, context, player_confirm_str)
+            notifications.append(self.bot.notify(member, context, player_confirm_str))
 
         dm_confirm_enum = getattr(Confirmation, "CONFIRM_DM_CAMPAIGN_" + action.upper())
         dm_confirm_str = dm_confirm_enum.value.format(member=dm, campaign=campaign)
 
         dm = context.guild.get_member(campaign.dm)
-        await self.bot.try_send_message(dm, context, dm_confirm_str)
+        notifications.append(self.bot.notify(dm, context, dm_confirm_str))
+        await asyncio.gather(*notifications)
         await context.send(f"Campaign {campaign.name} {action}d succsesfully.")
 
 
@@ -404,7 +413,7 @@ new_player_friendly: [Yes, No]
         async with self.bot.mutex:
             async with context.typing():
                 response = ""
-                campaigns = self.CampaignSQLHelper.get_campaigns()
+                campaigns = await self.CampaignSQLHelper.get_campaigns()
                 for campaign in campaigns:
                     dm = context.guild.get_member(campaign["dm"])
                     if dm is None:
@@ -1,13 +1,11 @@
-import asyncio
 import datetime
 import functools
-import traceback
-from typing import Union, TYPE_CHECKING
+from typing import Optional, Union, TYPE_CHECKING
 
 import discord
 from discord.ext import commands
 
-from modules import CampaignInfo
+from modules import CampaignInfo, PlayerInfo
 from .FakeMember import FakeMember
 
 if TYPE_CHECKING:  # TYPE_CHECKING is always false, allows for type hinting without circular import
@@ -38,7 +36,7 @@ class CampaignPlayerManager(commands.Cog):
 
     async def add_player(self, channel: discord.TextChannel, member: discord.Member, campaign_id: Union[int, str],
                          waitlisted=False, force=False) -> bool:
-        campaign: CampaignInfo = self.bot.CampaignSQLHelper.select_campaign(campaign_id)
+        campaign: CampaignInfo = await self.bot.CampaignSQLHelper.select_campaign(campaign_id)
         if member.id == campaign.dm:
             await channel.send("You cannot join your own campaign.")
             return False
@@ -48,17 +46,18 @@ class CampaignPlayerManager(commands.Cog):
         player_role = channel.guild.get_role(self.bot.config["player_role"])
 
         if (campaign.current_players >= campaign.max_players) and not force:
-            commit = self.bot.CampaignSQLHelper.waitlist_player(campaign, member)
+            commit = await self.bot.CampaignSQLHelper.waitlist_player(campaign, member)
             if commit:
+                await self.bot.db.commit()
                 await channel.send(f"{member.display_name} has been added to the waitlist for {campaign.name}.")
                 # await self.update_status(campaign)
-                self.bot.connection.commit()
                 return True
         if waitlisted:
-            commit = self.bot.CampaignSQLHelper.unwaitlist(campaign, member)
+            commit = await self.bot.CampaignSQLHelper.unwaitlist(campaign, member)
         else:
-            commit = self.bot.CampaignSQLHelper.add_player(campaign, member)
+            commit = await self.bot.CampaignSQLHelper.add_player(campaign, member)
         if commit:
+            await self.bot.db.commit()
             await self.bot.try_send_message(member, channel, Confirmation.CONFIRM_PLAYER_CAMPAIGN_ADD.format(member=member, campaign=campaign))
 
             await member.remove_roles(guest_role)
@@ -69,7 +68,6 @@ class CampaignPlayerManager(commands.Cog):
                 for i in category.channels:
                     if i.name == "lobby":
                         await i.send("This campaign now meets its minimum player goal!")
-            self.bot.connection.commit()
             # await self.update_status(campaign)
             return True
         else:
@@ -106,16 +104,17 @@ class CampaignPlayerManager(commands.Cog):
             await to_react.add_reaction("✅")
             await to_react.add_reaction("❌")
 
-        campaign: CampaignInfo = self.bot.CampaignSQLHelper.select_campaign(campaign_id)
+        campaign: CampaignInfo = await self.bot.CampaignSQLHelper.select_campaign(campaign_id)
         guest_role = channel.guild.get_role(self.bot.config["guest_role"])
         member_role = channel.guild.get_role(self.bot.config["member_role"])
         campaign_role = channel.guild.get_role(campaign.role)
         player_role = channel.guild.get_role(self.bot.config["player_role"])
 
-        commit = self.bot.CampaignSQLHelper.remove_player(campaign, member)
+        commit = await self.bot.CampaignSQLHelper.remove_player(campaign, member)
         if commit:
+            await self.bot.db.commit()
             await member.remove_roles(campaign_role)
-            campaign_roles = self.bot.CampaignSQLHelper.select_field("role")
+            campaign_roles = await self.bot.CampaignSQLHelper.select_field("role")
             guest = True
             for campaign_ in campaign_roles:
                 if any(role.id == campaign_["role"] for role in member.roles):
@@ -129,12 +128,11 @@ class CampaignPlayerManager(commands.Cog):
             dm = await channel.guild.fetch_member(campaign.dm)
             await self.bot.try_send_message(dm, channel, Confirmation.CONFIRM_DM_CAMPAIGN_REMOVE.format(dm=dm, member=member, campaign=campaign))
 
-            self.bot.connection.commit()
             if campaign.current_players - 1 < campaign.max_players:
-                waitlisted_players = self.bot.CampaignSQLHelper.get_waitlist(campaign)
+                waitlisted_players = await self.bot.CampaignSQLHelper.get_waitlist(campaign)
                 if len(waitlisted_players) > 0:
-                    waitlisted_players.sort(key=lambda x: x["pid"])
-                    await unwaitlist_apply(channel.guild.get_member(waitlisted_players[0]["id"]))
+                    waitlisted_players.sort(key=lambda x: x.pid)
+                    await unwaitlist_apply(channel.guild.get_member(waitlisted_players[0].id))
         else:
             await channel.send(Error.ERROR_UNK)
 
@@ -170,11 +168,12 @@ class CampaignPlayerManager(commands.Cog):
             if text_check not in i.name.lower():
                 continue
             campaign_name = i.value
-            try:
-                campaigns.append(self.bot.CampaignSQLHelper.select_campaign(campaign_name))
-            except AttributeError:
+            campaign = await self.bot.CampaignSQLHelper.select_campaign(campaign_name)
+            if campaign is None:
                 await message.guild.get_channel(self.bot.config["staff_botspam"]).send(
                     "Error in application for player: {}\nCampaign {} not found.".format(name, campaign_name))
+                continue
+            campaigns.append(campaign)
         for i in campaigns:
             dm = await message.guild.fetch_member(i.dm)
             embed = discord.Embed(
@@ -195,32 +194,86 @@ class CampaignPlayerManager(commands.Cog):
             # await self.update_status(i)
 
     @commands.command()
-    async def update_campaign_players(self, context: commands.Context, campaign_id: Union[int, str]):
+    async def update_campaign_players(self, context: commands.Context, campaign_id: Union[int, str],
+                                      prune: bool = False):
+        campaign = await self.bot.CampaignSQLHelper.select_campaign(campaign_id)
+        if campaign is None:
+            await context.send(f"Campaign {campaign_id} not found.")
+            return
+        await self.send_reconcile_report(context, await self.reconcile_players(context.guild, [campaign], prune))
+
+    async def reconcile_players(self, guild: discord.Guild, campaigns: list[CampaignInfo],
+                                prune: bool = False) -> Optional[list[str]]:
+        """
+        Brings the players table in line with campaign role membership. All player rows are read once, diffed
+        against the role members with sets, and every fix is written in one transaction.
+        :param guild: The guild the campaign roles live in
+        :param campaigns: The campaigns to reconcile
+        :param prune: Whether to delete player rows whose member no longer has the campaign role
+        :return: One line per difference found, or None if the fixes couldn't be written
+        """
         async with self.bot.mutex:
-            campaign = self.bot.CampaignSQLHelper.select_campaign(campaign_id)
-            campaign_role = context.guild.get_role(campaign.role)
-            campaign_players = self.bot.CampaignSQLHelper.get_players(campaign)
-            members = campaign_role.members
-
-            for i in members:
-                if not any(i.id == j["id"] for j in campaign_players):
-                    self.bot.CampaignSQLHelper.add_player(campaign, i)
-
-            commit = self.bot.CampaignSQLHelper.set_current_player_count(campaign, len(members))
-            if commit:
-                self.bot.connection.commit()
-                await context.send("Campaign players updated.")
-            else:
-                await context.send(Error.ERROR_UNK)
+            rows = await self.bot.CampaignSQLHelper.get_all_players()
+            if rows is None:
+                return None
+            rosters: dict[int, dict[int, PlayerInfo]] = {}
+            for row in rows:
+                rosters.setdefault(row.campaign, {})[row.id] = row
+
+            added, unwaitlisted, removed, report = [], [], [], []
+            for campaign in campaigns:
+                role = guild.get_role(campaign.role)
+                if role is None:
+                    report.append(f"{campaign.name}: role {campaign.role} not found, skipped")
+                    continue
+                members = {member.id: member for member in role.members}
+                roster = rosters.get(campaign.id, {})
+                players = {i for i, row in roster.items() if not row.waitlisted}
+
+                for member_id in members.keys() - players:
+                    if member_id in roster:
+                        unwaitlisted.append((member_id, campaign.id))
+                        report.append(f"{campaign.name}: moved {members[member_id]} off the waitlist")
+                    else:
+                        added.append((member_id, campaign.id, members[member_id].display_name))
+                        report.append(f"{campaign.name}: added {members[member_id]}")
+                for member_id in players - members.keys():
+                    if prune:
+                        removed.append((member_id, campaign.id))
+                        report.append(f"{campaign.name}: removed {roster[member_id].name} ({member_id})")
+                    else:
+                        report.append(f"{campaign.name}: {roster[member_id].name} ({member_id}) is missing the role")
+
+            if added or unwaitlisted or removed:
+                if not await self.bot.CampaignSQLHelper.apply_player_changes(added, unwaitlisted, removed):
+                    return None
+                await self.bot.db.commit()
+            return report
+
+    @staticmethod
+    async def send_reconcile_report(context: commands.Context, report: Optional[list[str]]):
+        if report is None:
+            await context.send(Error.ERROR_UNK)
+            return
+        if len(report) == 0:
+            await context.send("Campaign players are in sync.")
+            return
+        message = ""
+        for line in report + [f"{len(report)} difference(s) found."]:
+            if len(message) + len(line) + 8 > 2000:
+                await context.send("```\n" + message + "```")
+                message = ""
+            message += line + "\n"
+        await context.send("```\n" + message + "```")
 
     @commands.command()
     async def show_waitlisted_players(self, context: commands.Context, campaign_id: Union[int, str]):
         async with self.bot.mutex:
-            campaign = self.bot.CampaignSQLHelper.select_campaign(campaign_id)
-            resp = self.bot.CampaignSQLHelper.get_waitlist(campaign)
+            campaign = await self.bot.CampaignSQLHelper.select_campaign(campaign_id)
+            resp = await self.bot.CampaignSQLHelper.get_waitlist(campaign)
             # sort resp by pid
-            resp.sort(key=lambda x: x["pid"])
-            waitlisted_players = [context.guild.get_member(i["id"]) for i in resp]
+            resp.sort(key=lambda x: x.pid)
+            waitlisted_players = [context.guild.get_member(i.id) for i in resp]
             embed = discord.Embed(
                 title=f"Waitlisted players for {campaign.name}",
                 timestamp=datetime.datetime.utcnow()
@@ -238,10 +291,10 @@ class CampaignPlayerManager(commands.Cog):
             await self.set_max_player_count(context.channel, campaign, count)
 
     async def set_max_player_count(self, channel: discord.TextChannel, campaign: int, count: int):
-        campaign = self.bot.CampaignSQLHelper.select_campaign(campaign)
-        commit = self.bot.CampaignSQLHelper.set_max_players(campaign, count)
+        campaign = await self.bot.CampaignSQLHelper.select_campaign(campaign)
+        commit = await self.bot.CampaignSQLHelper.set_max_players(campaign, count)
         if commit:
-            self.bot.connection.commit()
+            await self.bot.db.commit()
             await channel.send(f"Set max players for {campaign.name} to {count}.")
         else:
             await channel.send(Error.ERROR_UNK)
@@ -250,34 +303,34 @@ class CampaignPlayerManager(commands.Cog):
     @commands.command()
     async def commit(self, context):
         async with self.bot.mutex:
-            self.bot.connection.commit()
+            await self.bot.db.commit()
             await context.send("done")
 
     @commands.has_any_role(1050188024287338567, 873734392458145912, 809567701735440469)  # dev, admin, officer
     @commands.command()
     async def clear_waitlist(self, context: commands.Context, campaign: Union[int, str]):
         async with self.bot.mutex:
-            campaign = self.bot.CampaignSQLHelper.select_campaign(campaign)
-            commit = self.bot.CampaignSQLHelper.clear_waitlist(campaign)
+            campaign = await self.bot.CampaignSQLHelper.select_campaign(campaign)
+            commit = await self.bot.CampaignSQLHelper.clear_waitlist(campaign)
             if commit:
+                await self.bot.db.commit()
                 await context.send(f"Cleared waitlist for {campaign.name}")
-                self.bot.connection.commit()
             else:
                 await context.send(Error.ERROR_UNK)
 
     @commands.command()
     async def handle_waitlist(self, context: commands.Context, campaign: Union[int, str]):
         async with self.bot.mutex:
-            campaign = self.bot.CampaignSQLHelper.select_campaign(campaign)
+            campaign = await self.bot.CampaignSQLHelper.select_campaign(campaign)
             if context.author.id != campaign.dm and not context.author.guild_permissions.administrator and self.bot.config["developer_role"] not in [i.id for i in context.author.roles]:
                 await context.send("You are not the DM of this campaign.")
                 return
-            waitlisted_players = self.bot.CampaignSQLHelper.get_waitlist(campaign)
+            waitlisted_players = await self.bot.CampaignSQLHelper.get_waitlist(campaign)
             if len(waitlisted_players) == 0:
                 await context.send("No waitlisted players.")
                 return
-            waitlisted_players.sort(key=lambda x: x["pid"])
-            member = context.guild.get_member(waitlisted_players[0]["id"])
+            waitlisted_players.sort(key=lambda x: x.pid)
+            member = context.guild.get_member(waitlisted_players[0].id)
             name = member.nick if member.nick else member.display_name
             app_channel = context.guild.get_channel(self.bot.config["applications_channel"])
 
@@ -302,39 +355,37 @@ class CampaignPlayerManager(commands.Cog):
     @commands.command()
     async def update_player_count(self, context: commands.Context, campaign: Union[int, str]):
         async with self.bot.mutex:
-            campaign = self.bot.CampaignSQLHelper.select_campaign(campaign)
-            players = self.bot.CampaignSQLHelper.get_players(campaign)
-            try:
-                self.bot.db.execute(f"UPDATE campaigns SET current_players = ? WHERE id = ?", (len(players), campaign.id))
-            except Exception:
-                traceback.print_exc()
+            campaign = await self.bot.CampaignSQLHelper.select_campaign(campaign)
+            if not await self.bot.CampaignSQLHelper.recount_players(campaign):
                 await context.send(Error.ERROR_UNK)
                 return
-            self.bot.connection.commit()
-            await context.send(f"Campaign {campaign.name} updated to {len(players)} players.")
-
-    @commands.command()
-    async def sync_player_count(self, context: commands.Context, campaign_id: Union[int, str] = None):
-        to_sync = []
-        if campaign_id is None:
-            to_sync = [i["id"] for i in self.bot.CampaignSQLHelper.get_campaigns()]
-        else:
-            to_sync = [self.bot.CampaignSQLHelper.select_campaign(campaign_id).id]
+            await self.bot.db.commit()
+            campaign = await self.bot.CampaignSQLHelper.select_campaign(campaign.id)
+            await context.send(f"Campaign {campaign.name} updated to {campaign.current_players} players.")
+
+    @commands.command(help="Syncs the players of one campaign, or every campaign, with who has its role. Members with "
+                           "the role but no player entry are added as players, waitlisted players with the role are "
+                           "moved onto the roster, and players without the role are removed if prune is set.\n"
+                           "Usage: sync_player_count [campaign] [prune]",
+                      brief="Syncs players with campaign roles, adding missing players.")
+    async def sync_player_count(self, context: commands.Context, campaign_id: Union[int, str] = None,
+                                prune: bool = False):
+        if campaign_id is not None:
+            await self.update_campaign_players(context, campaign_id, prune)
+            return
         await context.send("Syncing player counts...")
-        for i in to_sync:
-            await self.update_player_count(context, i)
-            await asyncio.sleep(.5)
-        await context.send("Sync complete.")
+        campaigns = await self.bot.CampaignSQLHelper.get_campaign_infos()
+        await self.send_reconcile_report(context, await self.reconcile_players(context.guild, campaigns, prune))
 
     @commands.command()
     async def remove_waitlisted_player(self, context: commands.Context, member: discord.Member,
                                        campaign: Union[int, str]):
         async with self.bot.mutex:
-            campaign = self.bot.CampaignSQLHelper.select_campaign(campaign)
-            commit = self.bot.CampaignSQLHelper.remove_waitlisted_player(campaign, member)
+            campaign = await self.bot.CampaignSQLHelper.select_campaign(campaign)
+            commit = await self.bot.CampaignSQLHelper.remove_waitlisted_player(campaign, member)
             if commit:
+                await self.bot.db.commit()
                 await context.send(f"Removed {member.display_name} from the waitlist for {campaign.name}.")
-                self.bot.connection.commit()
             else:
                 await context.send(Error.ERROR_UNK)
 
@@ -342,9 +393,9 @@ class CampaignPlayerManager(commands.Cog):
     async def force_add_player(self, context: commands.Context, member: discord.Member, campaign: Union[int, str]):
         async with self.bot.mutex:
             # get campaign waitlist
-            campaign_obj = self.bot.CampaignSQLHelper.select_campaign(campaign)
-            waitlisted_players = self.bot.CampaignSQLHelper.get_waitlist(campaign_obj)
-            if any(i["id"] == member.id for i in waitlisted_players):
+            campaign_obj = await self.bot.CampaignSQLHelper.select_campaign(campaign)
+            waitlisted_players = await self.bot.CampaignSQLHelper.get_waitlist(campaign_obj)
+            if any(i.id == member.id for i in waitlisted_players):
                 await self.add_player(context.channel, member, campaign, waitlisted=True, force=True)
                 return
             await self.add_player(context.channel, member, campaign, waitlisted=False, force=True)
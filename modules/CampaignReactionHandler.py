@@ -163,13 +163,13 @@ class CampaignReactionHandler(commands.Cog):
                     campaign_info.session_length = embed.fields[FieldValues.session_length].value
                     campaign_info.new_player_friendly = embed.fields[FieldValues.new_player_friendly].value
 
-                commit = self.bot.CampaignSQLHelper.create_campaign(campaign_info)
+                commit = await self.bot.CampaignSQLHelper.create_campaign(campaign_info)
                 if commit:
-                    self.bot.connection.commit()
+                    await self.bot.db.commit()
                     await message.delete()
                     await channel.send(f"Campaign {campaign_info.name} has been created!")
                     if website:
-                        info = self.bot.CampaignSQLHelper.select_campaign(campaign_info.name)
+                        info = await self.bot.CampaignSQLHelper.select_campaign(campaign_info.name)
                         await self.bot.campaign_creation_callback(campaign=info)
                         return
                 else:
@@ -221,7 +221,7 @@ class CampaignReactionHandler(commands.Cog):
         async with self.bot.mutex:
             message_embed = message.embeds[0]
             campaign_name = message_embed.fields[0].value
-            campaign = self.bot.CampaignSQLHelper.select_campaign(campaign_name)
+            campaign = await self.bot.CampaignSQLHelper.select_campaign(campaign_name)
             dm = await message.guild.fetch_member(campaign.dm)
 
             channel = self.bot.get_channel(self.bot.config["player-sign-up"])
@@ -229,11 +229,11 @@ class CampaignReactionHandler(commands.Cog):
                 return
 
             if campaign.current_players >= campaign.max_players:
-                commit = self.bot.CampaignSQLHelper.waitlist_player(campaign, member)
+                commit = await self.bot.CampaignSQLHelper.waitlist_player(campaign, member)
                 if commit:
+                    await self.bot.db.commit()
                     await channel.send(f"{member.mention} has been added to the campaign {campaign.name}'s waitlist")
                     await message.delete()
-                    self.bot.connection.commit()
                 else:
                     await message.channel.send("An unknown error occurred while adding the player to the waitlist.")
             else:
@@ -255,7 +255,7 @@ class CampaignReactionHandler(commands.Cog):
             channel = self.bot.get_channel(self.bot.config["player-sign-up"])
             message_embed = message.embeds[0]
             campaign_name = message_embed.fields[0].value
-            campaign = self.bot.CampaignSQLHelper.select_campaign(campaign_name)
+            campaign = await self.bot.CampaignSQLHelper.select_campaign(campaign_name)
             dm = await message.guild.fetch_member(campaign.dm)
 
             if reactor.id != dm.id:
@@ -312,11 +312,11 @@ class CampaignReactionHandler(commands.Cog):
             elif payload.emoji.name == "❌":
                 await self.deny_waitlisted_player(message, member, payload.member)
                 campaign_name = embed.fields[0].value
-                campaign = self.bot.CampaignSQLHelper.select_campaign(campaign_name)
-                waitlisted_players = self.bot.CampaignSQLHelper.get_waitlisted_players(campaign)
-                waitlisted_players.sort(key=lambda x: x['pid'])
+                campaign = await self.bot.CampaignSQLHelper.select_campaign(campaign_name)
+                waitlisted_players = await self.bot.CampaignSQLHelper.get_waitlisted_players(campaign)
+                waitlisted_players.sort(key=lambda x: x.pid)
                 if len(waitlisted_players) > 0:
-                    member = await message.guild.fetch_member(waitlisted_players[0]['id'])
+                    member = await message.guild.fetch_member(waitlisted_players[0].id)
                     await unwaitlist_apply()
 
     async def approve_waitlisted_player(self, message: discord.Message, member: discord.Member,
@@ -329,7 +329,7 @@ class CampaignReactionHandler(commands.Cog):
         """
         message_embed = message.embeds[0]
         campaign_name = message_embed.fields[0].value
-        campaign = self.bot.CampaignSQLHelper.select_campaign(campaign_name)
+        campaign = await self.bot.CampaignSQLHelper.select_campaign(campaign_name)
         dm = await message.guild.fetch_member(campaign.dm)
 
         channel = self.bot.get_channel(self.bot.config["player-sign-up"])
@@ -337,15 +337,15 @@ class CampaignReactionHandler(commands.Cog):
         if reactor.id != dm.id:
             return
         if campaign.current_players >= campaign.max_players:
-            waitlisted_players = self.bot.CampaignSQLHelper.get_waitlisted_players(campaign)
-            if member.id in [player['id'] for player in waitlisted_players]:
+            waitlisted_players = await self.bot.CampaignSQLHelper.get_waitlisted_players(campaign)
+            if member.id in [player.id for player in waitlisted_players]:
                 await channel.send(f"{member.mention} is already on the waitlist for {campaign.name}.")
                 return
-            commit = self.bot.CampaignSQLHelper.waitlist_player(campaign, member)
+            commit = await self.bot.CampaignSQLHelper.waitlist_player(campaign, member)
             if commit:
+                await self.bot.db.commit()
                 await channel.send(f"{member.mention} has been added to the campaign {campaign.name}'s waitlist")
                 await message.delete()
-                self.bot.connection.commit()
             else:
                 await message.channel.send("An unknown error occurred while adding the player to the waitlist.")
         if await self.bot.CampaignPlayerManager.add_player(message.channel, member, campaign_name, waitlisted=True):
@@ -364,18 +364,18 @@ class CampaignReactionHandler(commands.Cog):
         """
         message_embed = message.embeds[0]
         campaign_name = message_embed.fields[0].value
-        campaign = self.bot.CampaignSQLHelper.select_campaign(campaign_name)
+        campaign = await self.bot.CampaignSQLHelper.select_campaign(campaign_name)
         dm = await message.guild.fetch_member(campaign.dm)
         channel = self.bot.get_channel(self.bot.config["player-sign-up"])
 
         if reactor.id != dm.id:
             return
 
-        campaign = self.bot.CampaignSQLHelper.select_campaign(campaign_name)
+        campaign = await self.bot.CampaignSQLHelper.select_campaign(campaign_name)
         await self.bot.try_send_message(member, channel, Confirmation.CONFIRM_PLAYER_WAITLIST_DENY.format(member=member,
                                                                                                           campaign=campaign))
-        if self.bot.CampaignSQLHelper.remove_player(campaign, member):
-            self.bot.connection.commit()
+        if await self.bot.CampaignSQLHelper.remove_player(campaign, member):
+            await self.bot.db.commit()
             await message.delete()
             await channel.send(Confirmation.CONFIRM_DM_WAITLIST_DENY.format(member=member, campaign=campaign))
         else:
@@ -406,7 +406,7 @@ class CampaignReactionHandler(commands.Cog):
                 regex = re.compile(r"(\w+) \w+$")  # hacky way to get the action from the title
                 action = regex.search(embed.title).group(1).lower()
                 campaign_name = embed.fields[3].value
-                campaign = self.bot.CampaignSQLHelper.select_campaign(campaign_name)
+                campaign = await self.bot.CampaignSQLHelper.select_campaign(campaign_name)
                 func: Callable[['DNDBot', discord.TextChannel, int, discord.Embed], Awaitable[bool]] = (
                     getattr(ActionHandler, action))  # wow, this is a hack
                 return await func(self.bot, message.channel, campaign.id, embed)
@@ -0,0 +1,128 @@
+import bisect
+from typing import Callable, Optional
+
+from .CampaignInfo import CampaignInfo
+
+
+class CampaignRegistry:
+    """
+    In-memory copy of the campaigns table, indexed by id, case-folded name, role, category and DM. Kept in sync by
+    CampaignSQLHelper, which writes through to it whenever it changes a campaign. Lookups hand out copies so callers
+    can't change the cached records by accident.
+    """
+
+    def __init__(self):
+        self.loaded = False
+        self.by_id: dict[int, CampaignInfo] = {}
+        self.by_name: dict[str, int] = {}
+        self.by_role: dict[int, int] = {}
+        self.by_category: dict[int, int] = {}
+        self.by_dm: dict[int, set[int]] = {}
+
+    def load(self, campaigns: list[CampaignInfo]):
+        """
+        Replaces the registry's contents with a full read of the campaigns table
+        :param campaigns: Every campaign in the table
+        """
+        self.by_id.clear()
+        self.by_name.clear()
+        self.by_role.clear()
+        self.by_category.clear()
+        self.by_dm.clear()
+        for campaign in campaigns:
+            self.put(campaign)
+        self.loaded = True
+
+    def put(self, campaign: CampaignInfo):
+        """
+        Adds or replaces a campaign
+        :param campaign: The campaign as read from the campaigns table
+        """
+        self.remove(campaign.id)
+        campaign = campaign.copy()
+        self.by_id[campaign.id] = campaign
+        self.__index(campaign)
+
+    def update(self, campaign_id: int, **fields):
+        """
+        Changes columns of a cached campaign, keeping the indexes in step
+        :param campaign_id: The campaign's ID
+        :param fields: Column names mapped to their new values
+        """
+        campaign = self.by_id.get(campaign_id)
+        if campaign is None:
+            return
+        self.__unindex(campaign)
+        for field, value in fields.items():
+            setattr(campaign, field, value)
+        self.__index(campaign)
+
+    def remove(self, campaign_id: int):
+        campaign = self.by_id.pop(campaign_id, None)
+        if campaign is not None:
+            self.__unindex(campaign)
+
+    def get(self, campaign_id: int) -> Optional[CampaignInfo]:
+        return self.__copy(self.by_id.get(campaign_id))
+
+    def get_by_name(self, name: str) -> Optional[CampaignInfo]:
+        return self.__copy(self.by_id.get(self.by_name.get(name.casefold())))
+
+    def get_by_role(self, role: int) -> Optional[CampaignInfo]:
+        return self.__copy(self.by_id.get(self.by_role.get(role)))
+
+    def get_by_category(self, category: int) -> Optional[CampaignInfo]:
+        return self.__copy(self.by_id.get(self.by_category.get(category)))
+
+    def get_by_dm(self, dm: int) -> list[CampaignInfo]:
+        return [self.by_id[i].copy() for i in sorted(self.by_dm.get(dm, ()))]
+
+    def all(self) -> list[CampaignInfo]:
+        return [self.by_id[i].copy() for i in sorted(self.by_id)]
+
+    def page(self, after_id: int, limit: Optional[int],
+             predicate: Callable[[CampaignInfo], bool]) -> list[CampaignInfo]:
+        """
+        Walks the campaigns in ID order, starting after a given ID, and copies the ones that match
+        :param after_id: Only campaigns with a greater ID are returned
+        :param limit: The most campaigns to return, or None for all of them
+        :param predicate: Decides whether a campaign is included, gets the cached record itself
+        :return: The matching campaigns
+        """
+        ids = sorted(self.by_id)
+        campaigns = []
+        for campaign_id in ids[bisect.bisect_right(ids, after_id):]:
+            campaign = self.by_id[campaign_id]
+            if predicate(campaign):
+                campaigns.append(campaign.copy())
+                if limit is not None and len(campaigns) >= limit:
+                    break
+        return campaigns
+
+    def __index(self, campaign: CampaignInfo):
+        if campaign.name is not None:
+            self.by_name[campaign.name.casefold()] = campaign.id
+        if campaign.role is not None:
+            self.by_role[campaign.role] = campaign.id
+        if campaign.category is not None:
+            self.by_category[campaign.category] = campaign.id
+        if campaign.dm is not None:
+            self.by_dm.setdefault(campaign.dm, set()).add(campaign.id)
+
+    def __unindex(self, campaign: CampaignInfo):
+        # only drop an entry if it still points at this campaign, another one may have taken the key since
+        if campaign.name is not None and self.by_name.get(campaign.name.casefold()) == campaign.id:
+            del self.by_name[campaign.name.casefold()]
+        if self.by_role.get(campaign.role) == campaign.id:
+            del self.by_role[campaign.role]
+        if self.by_category.get(campaign.category) == campaign.id:
+            del self.by_category[campaign.category]
+        campaigns = self.by_dm.get(campaign.dm)
+        if campaigns is not None:
+            campaigns.discard(campaign.id)
+            if not campaigns:
+                del self.by_dm[campaign.dm]
+
+    @staticmethod
+    def __copy(campaign: Optional[CampaignInfo]) -> Optional[CampaignInfo]:
+        return None if campaign is None else campaign.copy()
@@ -1,36 +1,194 @@
 import asyncio
+import json
 import sqlite3
 import traceback
-from typing import Union, Optional, TYPE_CHECKING
+from typing import Callable, Union, Optional, TYPE_CHECKING
 
 import discord
 
-from .CampaignInfo import CampaignInfo
+from .CampaignInfo import CampaignInfo, FIELDS
+from .CampaignRegistry import CampaignRegistry
 from .FakeMember import FakeMember
+from .PlayerInfo import PlayerInfo
 
 if TYPE_CHECKING:  # TYPE_CHECKING is always false, allows for type hinting without circular import
     from ..DNDBot import DNDBot
 
-
 class CampaignSQLHelper:
     """
     WILL NEVER COMMIT TO DATABASE
+    Campaign reads are served from the registry once it is loaded, every campaign write goes through to it.
+    Every write also bumps a version, which the API uses to tell whether a cached response is still current.
     """
 
     def __init__(self, bot: 'DNDBot'):
         self.bot = bot
+        self.registry = CampaignRegistry()
+        # versions are per process and restart from 0 on every boot, they only ever key this process's caches
+        self.version = 0
+        self.reloaded = 0
+        self.versions: dict[int, int] = {}
+        # campaign_events up to this seq have been passed to the change listeners
+        self.published_seq = 0
+        self.resync = False
+        # set when another process writes the campaigns, as in the API's worker processes. The registry is then caught
+        # up from the event log instead of being written through.
+        self.following = False
+        self.change_listeners: list[Callable[[list[dict]], None]] = []
+        self.publish_lock = asyncio.Lock()
+        self.publishing: set[asyncio.Task] = set()
+        bot.db.add_commit_listener(self.publish_changes)
+
+    async def load_registry(self, own_writes: bool = False):
+        """
+        Fills the campaign registry from the database. Also used to resync after the campaigns table was changed
+        outside of this class
+        :param own_writes: Read on the writer, so uncommitted changes to the campaigns are loaded as well
+        """
+        self.registry.load(await self.bot.db.fetchall_as(CampaignInfo, "SELECT * FROM campaigns",
+                                                         own_writes=own_writes))
+        # anything may have changed, every campaign counts as touched
+        self.touch()
+        self.reloaded = self.version
+        # the registry already reflects every logged change, listeners are told to start over instead
+        self.published_seq = (await self.bot.db.fetchone("SELECT MAX(seq) AS seq FROM campaign_events"))["seq"] or 0
+        self.resync = True
+        self.publish_changes()
+
+    def touch(self, campaign_id: Optional[int] = None):
+        """
+        Marks a campaign as changed, which invalidates every cached response that includes it
+        :param campaign_id: The campaign's ID, or None if only the global version should move
+        """
+        self.version += 1
+        if campaign_id is not None:
+            self.versions[campaign_id] = self.version
+
+    def add_change_listener(self, listener: Callable[[list[dict]], None]):
+        """
+        Registers a callback for committed campaign changes. It gets a list of events from campaign_events, each with
+        its seq, the campaign's id, the change and its time, plus the current player count, max players, locked and
+        paused unless the campaign was deleted. A "resync" event without an id means any campaign may have changed.
+        """
+        self.change_listeners.append(listener)
+
+    def publish_changes(self):
+        """
+        Passes newly committed events on to the change listeners, runs after every commit
+        """
+        if self.change_listeners or self.following:
+            task = asyncio.create_task(self.__publish_changes())
+            self.publishing.add(task)
+            task.add_done_callback(self.publishing.discard)
+
+    async def __publish_changes(self):
+        # one publisher at a time, so events go out once and in order
+        async with self.publish_lock:
+            events = []
+            if self.resync:
+                self.resync = False
+                events.append({"seq": self.published_seq, "change": "resync"})
+            # runs from the commit listener, so everything committed so far is on the readers get_changes uses
+            while rows := await self.get_changes(self.published_seq, 500):
+                self.published_seq = rows[-1]["seq"]
+                if self.following:
+                    await self.__follow(rows)
+                events.extend(self.describe_change(i) for i in rows)
+            if not events:
+                return
+            for listener in self.change_listeners:
+                try:
+                    listener(events)
+                except Exception:
+                    traceback.print_exc()
 
-    def get_campaigns(self) -> list[dict]:
-        return self.bot.db.execute("SELECT * FROM campaigns").fetchall()
+    async def __follow(self, events: list[dict]):
+        # rows are read after the events, so a campaign is never older than the events about it
+        ids = list(dict.fromkeys(i["id"] for i in events))
+        campaigns = {i.id: i for i in await self.bot.db.fetchall_as(
+            CampaignInfo, "SELECT * FROM campaigns WHERE id IN (SELECT value FROM json_each(?))", (json.dumps(ids),))}
+        for campaign_id in ids:
+            if campaign_id in campaigns:
+                self.registry.put(campaigns[campaign_id])
+            else:
+                self.registry.remove(campaign_id)
+            self.touch(campaign_id)
 
-    def create_campaign(self, vals: CampaignInfo) -> bool:
+    def describe_change(self, event: dict) -> dict:
+        """
+        Adds the campaign's current player count, max players, locked and paused to an event, unless it's gone
+        """
+        campaign = self.registry.get(event["id"])
+        if event["change"] != "deleted" and campaign is not None:
+            event.update(current_players=campaign.current_players, max_players=campaign.max_players,
+                         locked=campaign.locked, paused=campaign.paused)
+        return event
+
+    async def get_changes(self, since: int, limit: int) -> list[dict]:
+        """
+        Reads the campaign event log. Always reads from a reader connection, which only sees committed events, so
+        changes still waiting for the commit are picked up by the publish that runs once they are committed.
+        :param since: Only events with a greater seq are returned
+        :param limit: The most events to return
+        :return: Events with their seq, campaign id, change and time, ordered by seq
+        """
+        return await self.bot.db.fetchall("SELECT seq, campaign AS id, change, time FROM campaign_events "
+                                          "WHERE seq > ? ORDER BY seq LIMIT ?", (since, limit))
+
+    def campaign_version(self, campaign_id: int) -> int:
+        return max(self.versions.get(campaign_id, 0), self.reloaded)
+
+    async def get_campaigns(self) -> list[dict]:
+        if self.registry.loaded:
+            return [i.to_dict() for i in self.registry.all()]
+        return await self.bot.db.fetchall("SELECT * FROM campaigns")
+
+    async def get_campaign_infos(self) -> list[CampaignInfo]:
+        if self.registry.loaded:
+            return self.registry.all()
+        return await self.bot.db.fetchall_as(CampaignInfo, "SELECT * FROM campaigns")
+
+    async def get_campaign_page(self, after_id: int = 0, limit: Optional[int] = None,
+                                filters: Optional[dict[str, Union[str, bool]]] = None) -> list[CampaignInfo]:
+        """
+        Reads campaigns in ID order, starting after a given ID, so pages cost the same no matter how deep they are
+        :param after_id: Only campaigns with a greater ID are returned
+        :param limit: The most campaigns to return, or None for all of them
+        :param filters: Column names mapped to the value they must have. Text is matched case-insensitively, booleans
+        against whether the column is set
+        :return: The matching campaigns, ordered by ID
+        """
+        filters = filters or {}
+        if self.registry.loaded:
+            return self.registry.page(after_id, limit, lambda campaign: all(
+                self.__matches(getattr(campaign, field), value) for field, value in filters.items()))
+        query, params = "SELECT * FROM campaigns WHERE id > ?", [after_id]
+        for field, value in filters.items():
+            if isinstance(value, bool):
+                query += f" AND COALESCE({field}, 0) {'!=' if value else '='} 0"
+            else:
+                query += f" AND {field} = ? COLLATE NOCASE"
+                params.append(value)
+        query += " ORDER BY id"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        return await self.bot.db.fetchall_as(CampaignInfo, query, params)
+
+    @staticmethod
+    def __matches(value, wanted: Union[str, bool]) -> bool:
+        if isinstance(wanted, bool):
+            return bool(value) == wanted
+        return value is not None and str(value).casefold() == wanted.casefold()
+
+    async def create_campaign(self, vals: CampaignInfo) -> bool:
         """
         Adds a new campaign to the database
         :param vals: Campaign info created by SQLHelper
         :return: Whether we should commit to database
         """
         try:
-            self.bot.db.execute(
+            cursor = await self.bot.db.execute(
                 f"INSERT INTO campaigns (name, dm, role, category, information_channel, min_players, max_players, "
                 f"current_players, status_message, location, playstyle, session_length, meeting_frequency, "
                 f"meeting_day, meeting_time, meeting_date, system, new_player_friendly, timestamp, paused, "
@@ -39,28 +197,35 @@ class CampaignSQLHelper:
                  vals.max_players, vals.current_players, vals.status_message, vals.location, vals.playstyle,
                  vals.session_length, vals.meeting_frequency, vals.meeting_day, vals.meeting_time, vals.meeting_date,
                  vals.system, vals.new_player_friendly, vals.timestamp, vals.paused, vals.info_message))
+            self.registry.put(await self.bot.db.fetchone_as(CampaignInfo, "SELECT * FROM campaigns WHERE id = ?",
+                                                            (cursor.lastrowid,), own_writes=True))
+            self.touch(cursor.lastrowid)
             return True
         except Exception:
             traceback.print_exc()
             return False
 
-    def set_campaign_info(self, campaign: CampaignInfo, info: str) -> bool:
+    async def set_campaign_info(self, campaign: CampaignInfo, info: str) -> bool:
         try:
-            self.bot.db.execute(f"UPDATE campaigns SET info_message = ? WHERE id = ?", (info, campaign.id))
+            await self.bot.db.execute(f"UPDATE campaigns SET info_message = ? WHERE id = ?", (info, campaign.id))
+            self.registry.update(campaign.id, info_message=info)
+            self.touch(campaign.id)
             return True
         except Exception:
             traceback.print_exc()
             return False
 
-    def set_campaign_field(self, campaign: CampaignInfo, field: str, value: str) -> bool:
+    async def set_campaign_field(self, campaign: CampaignInfo, field: str, value: str) -> bool:
         try:
-            self.bot.db.execute(f"UPDATE campaigns SET {field} = ? WHERE id = ?", (value, campaign.id))
+            await self.bot.db.execute(f"UPDATE campaigns SET {field} = ? WHERE id = ?", (value, campaign.id))
+            self.registry.update(campaign.id, **{field: value})
+            self.touch(campaign.id)
             return True
         except Exception:
             traceback.print_exc()
             return False
 
-    def delete_campaign(self, campaign: Union[int, str]) -> bool:
+    async def delete_campaign(self, campaign: Union[int, str]) -> bool:
         """
         Deletes a campaign from the database
         :param campaign: Either campaign name or campaign ID
@@ -70,26 +235,32 @@ class CampaignSQLHelper:
         try:
             # checks whether we passed ID or name
             if isinstance(campaign, int):
-                self.bot.db.execute(f"DELETE FROM campaigns WHERE id = {campaign}")
-                self.bot.db.execute(f"DELETE FROM players WHERE campaign = {campaign}")
+                await self.bot.db.execute(f"DELETE FROM campaigns WHERE id = ?", (campaign,))
+                await self.bot.db.execute(f"DELETE FROM players WHERE campaign = ?", (campaign,))
+                self.registry.remove(campaign)
+                self.touch(campaign)
             else:
-                resp = self.select_campaign(campaign)
-                self.bot.db.execute(f"DELETE FROM campaigns WHERE name LIKE {campaign}")
-                self.bot.db.execute(f"DELETE FROM players WHERE campaign = {resp.id}")
+                resp = await self.select_campaign(campaign)
+                await self.bot.db.execute(f"DELETE FROM campaigns WHERE name = ? COLLATE NOCASE", (campaign,))
+                await self.bot.db.execute(f"DELETE FROM players WHERE campaign = ?", (resp.id,))
+                self.registry.remove(resp.id)
+                self.touch(resp.id)
             return True
         except Exception:
             traceback.print_exc()
             return False
 
-    def set_campaign_status(self, campaign: CampaignInfo, status: int) -> bool:
+    async def set_campaign_status(self, campaign: CampaignInfo, status: int) -> bool:
         try:
-            self.bot.db.execute(f"UPDATE campaigns SET locked = {status} WHERE id = {campaign.id}")
+            await self.bot.db.execute(f"UPDATE campaigns SET locked = ? WHERE id = ?", (status, campaign.id))
+            self.registry.update(campaign.id, locked=status)
+            self.touch(campaign.id)
             return True
         except Exception:
             traceback.print_exc()
             return False
 
-    def select_campaign(self, campaign: Union[int, str]) -> CampaignInfo:
+    async def select_campaign(self, campaign: Union[int, str]) -> CampaignInfo:
         """
         Selects a row from the campaign table
         :param campaign: Either campaign name or campaign ID
@@ -97,161 +268,282 @@ class CampaignSQLHelper:
         """
         # checks whether we passed ID or name
         if isinstance(campaign, int):
-            return self.dict_to_campaign(
-                self.bot.db.execute(f"SELECT * FROM campaigns WHERE id = {campaign}").fetchone())
+            if self.registry.loaded:
+                return self.registry.get(campaign)
+            return await self.bot.db.fetchone_as(CampaignInfo, f"SELECT * FROM campaigns WHERE id = ?", (campaign,))
+        else:
+            if self.registry.loaded:
+                return self.registry.get_by_name(campaign)
+            return await self.bot.db.fetchone_as(CampaignInfo, f"SELECT * FROM campaigns WHERE name = ? "
+                                                               f"COLLATE NOCASE", (campaign,))
+
+    async def select_campaigns(self, campaign_ids: list[int]) -> dict[int, CampaignInfo]:
+        """
+        Selects many campaigns by ID at once
+        :param campaign_ids: The campaigns' IDs
+        :return: Campaign ID mapped to the campaign, IDs that don't exist are left out
+        """
+        if self.registry.loaded:
+            campaigns = [self.registry.get(i) for i in campaign_ids]
         else:
-            return self.dict_to_campaign(
-                self.bot.db.execute(f"SELECT * FROM campaigns WHERE name LIKE ?", (campaign,)).fetchone())
+            campaigns = await self.bot.db.fetchall_as(CampaignInfo, "SELECT * FROM campaigns WHERE id IN "
+                                                                    "(SELECT value FROM json_each(?))",
+                                                      (json.dumps(campaign_ids),))
+        return {i.id: i for i in campaigns if i is not None}
+
+    async def select_campaign_row(self, campaign: Union[int, str]) -> Optional[dict]:
+        """
+        Selects a row from the campaign table as a dict
+        :param campaign: Either campaign name or campaign ID
+        :return: The row, or None if no campaign matched
+        """
+        campaign = await self.select_campaign(campaign)
+        return None if campaign is None else campaign.to_dict()
+
+    def campaign_by_role(self, role: int) -> Optional[CampaignInfo]:
+        return self.registry.get_by_role(role)
 
-    def rename_campaign(self, campaign: CampaignInfo, new_name: str):
+    def campaign_by_category(self, category: int) -> Optional[CampaignInfo]:
+        return self.registry.get_by_category(category)
+
+    def campaigns_by_dm(self, dm: int) -> list[CampaignInfo]:
+        return self.registry.get_by_dm(dm)
+
+    async def rename_campaign(self, campaign: CampaignInfo, new_name: str):
         try:
             # self.bot.db.execute(f"ALTER TABLE {self.__get_table_name(campaign.name)} RENAME TO "
             #                     f"{self.__get_table_name(new_name)}")
-            self.bot.db.execute(f"UPDATE campaigns SET name = ? WHERE name LIKE ?", (new_name, campaign.name))
+            await self.bot.db.execute(f"UPDATE campaigns SET name = ? WHERE name = ? COLLATE NOCASE",
+                                      (new_name, campaign.name))
+            self.registry.update(campaign.id, name=new_name)
+            self.touch(campaign.id)
             return True
         except Exception:
             traceback.print_exc()
             return False
 
-    def select_field(self, field) -> Optional[list[dict]]:
+    async def select_field(self, field) -> Optional[list[dict]]:
         """
         Selects a certain field from the main table
         :param field: the field to be selected
         :return: The rows found
         """
-        return self.bot.db.execute(f"SELECT {field} FROM campaigns").fetchall()
+        if self.registry.loaded:
+            return [{field: getattr(i, field)} for i in self.registry.all()]
+        return await self.bot.db.fetchall(f"SELECT {field} FROM campaigns")
 
     @staticmethod
-    def dict_to_campaign(resp: Union[sqlite3.Row, dict]) -> CampaignInfo:
+    def dict_to_campaign(resp: Union[sqlite3.Row, dict]) -> Optional[CampaignInfo]:
         """
         Converts a row: dict returned by SELECT to a CampaignInfo object
         :param resp: The dictionary to be converted
-        :return: The created CampaignInfo object
+        :return: The created CampaignInfo object, or None if no row was found
         """
+        if resp is None:
+            return None
         if isinstance(resp, sqlite3.Row):
             resp = dict(zip(resp.keys(), resp))
-        campaign = CampaignInfo()
-        for key, value in resp.items():
-            setattr(campaign, key, value)
-        return campaign
+        # CampaignInfo is slotted, columns it has no field for are dropped
+        return CampaignInfo(**{key: value for key, value in resp.items() if key in FIELDS})
 
-    def add_player(self, campaign: CampaignInfo, player: discord.Member):
+    async def add_player(self, campaign: CampaignInfo, player: discord.Member):
         try:
-            is_waitlisted = self.bot.db.execute(f"SELECT waitlisted FROM players WHERE id = ? AND campaign = ?",
-                                                (player.id, campaign.id)).fetchone()
+            is_waitlisted = await self.bot.db.fetchone(f"SELECT waitlisted FROM players WHERE id = ? AND campaign = ?",
+                                                       (player.id, campaign.id), own_writes=True)
             if is_waitlisted:
-                self.__increment_players(campaign, 1)
-                return self.unwaitlist(campaign, player)
+                return await self.unwaitlist(campaign, player)
             else:
-                self.bot.db.execute(f"INSERT INTO players (id, campaign, waitlisted, name) VALUES ("
-                                    f"?, ?, ?, ?)", (player.id, campaign.id, 0, player.display_name))
-                self.__increment_players(campaign, 1)
+                await self.bot.db.execute(f"INSERT INTO players (id, campaign, waitlisted, name) VALUES ("
+                                          f"?, ?, ?, ?)", (player.id, campaign.id, 0, player.display_name))
+                await self.__refresh_player_count(campaign)
+                self.touch(campaign.id)
                 return True
         except Exception:
             traceback.print_exc()
             return False
 
-    def waitlist_player(self, campaign: CampaignInfo, player: discord.Member):
+    async def waitlist_player(self, campaign: CampaignInfo, player: discord.Member):
         try:
-            self.bot.db.execute(f"INSERT INTO players (id, campaign, waitlisted, name) VALUES ("
-                                f"?, ?, ?, ?)", (player.id, campaign.id, 1, player.display_name))
+            await self.bot.db.execute(f"INSERT INTO players (id, campaign, waitlisted, name) VALUES ("
+                                      f"?, ?, ?, ?)", (player.id, campaign.id, 1, player.display_name))
+            self.touch(campaign.id)
             return True
         except Exception:
             traceback.print_exc()
             return False
 
-    def unwaitlist(self, campaign: CampaignInfo, player: discord.Member):
+    async def unwaitlist(self, campaign: CampaignInfo, player: discord.Member):
         try:
             waitlisted = 0
-            self.bot.db.execute(f"UPDATE players SET waitlisted = ? WHERE id = ? AND campaign = {campaign.id}",
-                                (waitlisted, player.id))
-            self.__increment_players(campaign, 1)
+            await self.bot.db.execute(f"UPDATE players SET waitlisted = ? WHERE id = ? AND campaign = ?",
+                                      (waitlisted, player.id, campaign.id))
+            await self.__refresh_player_count(campaign)
+            self.touch(campaign.id)
             return True
         except Exception:
             traceback.print_exc()
             return False
 
-    def clear_waitlist(self, campaign: CampaignInfo):
+    async def clear_waitlist(self, campaign: CampaignInfo):
         try:
-            self.bot.db.execute(f"DELETE FROM players WHERE waitlisted = 1 AND campaign = {campaign.id}")
+            await self.bot.db.execute(f"DELETE FROM players WHERE waitlisted = 1 AND campaign = ?", (campaign.id,))
+            self.touch(campaign.id)
             return True
         except Exception:
             traceback.print_exc()
             return False
 
-    def remove_player(self, campaign: CampaignInfo, player: Union[discord.Member, FakeMember]):
+    async def remove_player(self, campaign: CampaignInfo, player: Union[discord.Member, FakeMember]):
         try:
-            self.bot.db.execute(f"DELETE FROM players WHERE id = {player.id} AND campaign = {campaign.id}")
-            self.__increment_players(campaign, -1)
+            await self.bot.db.execute(f"DELETE FROM players WHERE id = ? AND campaign = ?", (player.id, campaign.id))
+            await self.__refresh_player_count(campaign)
+            self.touch(campaign.id)
             return True
         except Exception:
             traceback.print_exc()
             return False
 
-    def remove_waitlisted_player(self, campaign: CampaignInfo, player: Union[discord.Member, FakeMember]):
+    async def remove_waitlisted_player(self, campaign: CampaignInfo, player: Union[discord.Member, FakeMember]):
         try:
-            self.bot.db.execute(f"DELETE FROM players WHERE id = {player.id} AND campaign = {campaign.id}")
+            await self.bot.db.execute(f"DELETE FROM players WHERE id = ? AND campaign = ?", (player.id, campaign.id))
+            await self.__refresh_player_count(campaign)
+            self.touch(campaign.id)
             return True
         except Exception:
             traceback.print_exc()
             return False
 
-    def set_max_players(self, campaign: CampaignInfo, amount: int):
+    async def set_max_players(self, campaign: CampaignInfo, amount: int):
         try:
-            self.bot.db.execute(f"UPDATE campaigns SET max_players = {amount} WHERE id= {campaign.id}")
+            await self.bot.db.execute(f"UPDATE campaigns SET max_players = ? WHERE id = ?", (amount, campaign.id))
+            self.registry.update(campaign.id, max_players=amount)
+            self.touch(campaign.id)
             return True
         except Exception:
             traceback.print_exc()
             return False
 
-    def __increment_players(self, campaign: CampaignInfo, amount):
+    async def __refresh_player_count(self, campaign: CampaignInfo):
+        """
+        current_players is maintained by triggers on the players table, this only copies the new count into the
+        registry
+        """
+        resp = await self.bot.db.fetchone("SELECT current_players FROM campaigns WHERE id = ?", (campaign.id,),
+                                          own_writes=True)
+        if resp is not None:
+            self.registry.update(campaign.id, current_players=resp["current_players"])
+
+    async def recount_players(self, campaign: Optional[CampaignInfo] = None) -> bool:
+        """
+        Recomputes current_players from the players table. The triggers keep it exact, so this only repairs rows
+        edited by hand
+        :param campaign: The campaign to recount, or None to recount every campaign
+        :return: Whether we should commit to database
+        """
         try:
-            self.bot.db.execute(f"UPDATE campaigns SET current_players = {campaign.current_players + amount} WHERE "
-                                f"name LIKE ?", (campaign.name,))
-            self.bot.connection.commit()
+            if campaign is None:
+                await self.bot.db.execute("UPDATE campaigns SET current_players = (SELECT COUNT(*) FROM players "
+                                          "WHERE players.campaign = campaigns.id AND players.waitlisted = 0)")
+                await self.load_registry(own_writes=True)
+            else:
+                await self.bot.db.execute("UPDATE campaigns SET current_players = (SELECT COUNT(*) FROM players "
+                                          "WHERE players.campaign = campaigns.id AND players.waitlisted = 0) "
+                                          "WHERE id = ?", (campaign.id,))
+                await self.__refresh_player_count(campaign)
+                self.touch(campaign.id)
             return True
         except Exception:
             traceback.print_exc()
             return False
 
-    def get_waitlist(self, campaign: CampaignInfo):
+    async def get_waitlist(self, campaign: CampaignInfo) -> Optional[list[PlayerInfo]]:
         try:
-            return self.bot.db.execute("SELECT * FROM "
-                                       f"players WHERE waitlisted = 1 AND campaign = {campaign.id}").fetchall()
+            return await self.bot.db.fetchall_as(PlayerInfo, "SELECT * FROM players WHERE waitlisted = 1 AND "
+                                                             "campaign = ?", (campaign.id,))
         except Exception:
             traceback.print_exc()
             return None
 
-    def get_waitlisted_players(self, campaign: CampaignInfo):
-        return self.get_waitlist(campaign)
+    async def get_waitlisted_players(self, campaign: CampaignInfo):
+        return await self.get_waitlist(campaign)
 
-    def get_players(self, campaign: CampaignInfo):
+    async def get_players(self, campaign: CampaignInfo) -> Optional[list[PlayerInfo]]:
         try:
-            return self.bot.db.execute("SELECT id FROM "
-                                       f"players WHERE waitlisted = 0 AND campaign = {campaign.id}").fetchall()
+            return await self.bot.db.fetchall_as(PlayerInfo, "SELECT id FROM players WHERE waitlisted = 0 AND "
+                                                             "campaign = ?", (campaign.id,))
         except Exception:
             traceback.print_exc()
             return None
 
-    def set_current_player_count(self, campaign: CampaignInfo, amount: int):
+    async def get_rosters(self, campaign_ids: Optional[list[int]] = None) -> dict[int, tuple[list[int], list[int]]]:
+        """
+        Reads the players and waitlists of many campaigns with one query
+        :param campaign_ids: The campaigns to read, or None for every campaign
+        :return: Campaign ID mapped to (player IDs, waitlisted player IDs), both in signup order. Campaigns without
+        any players are left out
+        """
+        if campaign_ids is None:
+            rows = await self.bot.db.fetchall_as(PlayerInfo, "SELECT * FROM players ORDER BY pid")
+        else:
+            rows = await self.bot.db.fetchall_as(PlayerInfo, "SELECT * FROM players WHERE campaign IN "
+                                                             "(SELECT value FROM json_each(?)) ORDER BY pid",
+                                                 (json.dumps(campaign_ids),))
+        rosters: dict[int, tuple[list[int], list[int]]] = {}
+        for row in rows:
+            rosters.setdefault(row.campaign, ([], []))[1 if row.waitlisted else 0].append(row.id)
+        return rosters
+
+    async def get_all_players(self) -> Optional[list[PlayerInfo]]:
+        try:
+            return await self.bot.db.fetchall_as(PlayerInfo, "SELECT * FROM players")
+        except Exception:
+            traceback.print_exc()
+            return None
+
+    async def apply_player_changes(self, added: list[tuple[int, int, str]], unwaitlisted: list[tuple[int, int]],
+                                   removed: list[tuple[int, int]]) -> bool:
+        """
+        Applies a batch of roster fixes as one job on the writer, so nothing else can be interleaved with it and the
+        whole batch lands in the same transaction. If any statement fails, none of the batch is written.
+        :param added: (member ID, campaign ID, display name) of players to insert
+        :param unwaitlisted: (member ID, campaign ID) of waitlisted players to move onto the roster
+        :param removed: (member ID, campaign ID) of players to delete
+        :return: Whether we should commit to database
+        """
+        def apply(connection: sqlite3.Connection):
+            connection.executemany("INSERT INTO players (id, campaign, waitlisted, name) VALUES (?, ?, 0, ?)", added)
+            connection.executemany("UPDATE players SET waitlisted = 0 WHERE id = ? AND campaign = ?", unwaitlisted)
+            connection.executemany("DELETE FROM players WHERE id = ? AND campaign = ?", removed)
+
         try:
-            self.bot.db.execute(f"UPDATE campaigns SET current_players = {amount} WHERE id= {campaign.id}")
+            await self.bot.db.run_atomic(apply)
+            # the triggers already moved current_players, pick the new counts up in one read
+            changed = list({i[1] for i in added} | {i[1] for i in unwaitlisted} | {i[1] for i in removed})
+            for row in await self.bot.db.fetchall("SELECT id, current_players FROM campaigns WHERE id IN "
+                                                  "(SELECT value FROM json_each(?))", (json.dumps(changed),),
+                                                  own_writes=True):
+                self.registry.update(row["id"], current_players=row["current_players"])
+                self.touch(row["id"])
             return True
         except Exception:
             traceback.print_exc()
             return False
 
-    def pause_campaign(self, campaign: CampaignInfo):
+    async def pause_campaign(self, campaign: CampaignInfo):
         try:
-            self.bot.db.execute(f"UPDATE campaigns SET paused = 1 WHERE id= {campaign.id}")
+            await self.bot.db.execute(f"UPDATE campaigns SET paused = 1 WHERE id = ?", (campaign.id,))
+            self.registry.update(campaign.id, paused=1)
+            self.touch(campaign.id)
             return True
         except Exception:
             traceback.print_exc()
             return False
 
-    def resume_campaign(self, campaign: CampaignInfo):
+    async def resume_campaign(self, campaign: CampaignInfo):
         try:
-            self.bot.db.execute(f"UPDATE campaigns SET paused = 0 WHERE id= {campaign.id}")
+            await self.bot.db.execute(f"UPDATE campaigns SET paused = 0 WHERE id = ?", (campaign.id,))
+            self.registry.update(campaign.id, paused=0)
+            self.touch(campaign.id)
             return True
         except Exception:
             traceback.print_exc()
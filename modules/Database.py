@@ -0,0 +1,333 @@
+import asyncio
+import dataclasses
+import functools
+import os
+import pathlib
+import sqlite3
+import tempfile
+import threading
+import traceback
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
+from typing import Any, AsyncIterator, Callable, Iterable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+def dict_factory(cursor, row):
+    d = {}
+    for idx, col in enumerate(cursor.description):
+        d[col[0]] = row[idx]
+    return d
+
+
+@functools.lru_cache(maxsize=None)
+def row_builder(record: type[T], columns: tuple[str, ...]) -> Callable[[tuple], T]:
+    """
+    Compiles a function that turns a plain row tuple into a record dataclass. Cached per column layout, so the column
+    names are only matched against the fields once per query shape.
+    :param record: The dataclass to build
+    :param columns: The column names of the query, in order
+    :return: A function taking a row tuple and returning a record
+    """
+    names = [field.name for field in dataclasses.fields(record)]
+    if tuple(names) == columns:
+        return lambda row: record(*row)
+    if len(names) > 1 and all(name in columns for name in names):
+        # every field is selected, reorder the row into field order in one C call
+        values = itemgetter(*[columns.index(name) for name in names])
+        return lambda row: record(*values(row))
+    # only some fields are selected, the rest keep their defaults
+    positions = [(columns.index(name), name) for name in names if name in columns]
+    return lambda row: record(**{name: row[index] for index, name in positions})
+
+
+class Database:
+    """
+    Awaitable connection manager for the bot's sqlite3 database. Writes go through a single writer connection owned
+    by one thread, so they are serialized. Reads are spread over a pool of threads that each hold their own read-only
+    connection, so concurrent readers never share a cursor or see each other's result sets. The database runs in WAL
+    mode, so readers, backups and the writer never block each other. Commits are grouped: every commit requested
+    within commit_interval seconds, or before commit_batch writes pile up, is flushed as one transaction. Writes that
+    nobody commits are flushed after commit_interval as well, so the write lock is never held open. Other processes
+    writing the same file, like the API's worker processes, wait up to busy_timeout seconds for the lock.
+    """
+
+    def __init__(self, filename: str, readers: int = 4, commit_interval: float = 0.005, commit_batch: int = 64,
+                 busy_timeout: float = 10):
+        self.filename = filename
+        self.uri = pathlib.Path(filename).resolve().as_uri() + "?mode=ro"
+        self.connection: sqlite3.Connection = None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="database-writer")
+        self.reader_executor = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="database-reader")
+        self.__local = threading.local()
+        self.__readers: list[sqlite3.Connection] = []
+        self.commit_interval = commit_interval
+        self.commit_batch = commit_batch
+        self.busy_timeout = busy_timeout
+        self.__pending = 0
+        self.__waiters: list[asyncio.Future] = []
+        self.__flush_timer: Optional[asyncio.TimerHandle] = None
+        self.__flushes: set[asyncio.Task] = set()
+        self.__commit_listeners: list[Callable[[], None]] = []
+        self.connect()
+
+    def connect(self):
+        """
+        Opens the writer connection and switches the database to WAL journaling
+        """
+        self.connection = sqlite3.connect(self.filename, timeout=self.busy_timeout, check_same_thread=False)
+        self.connection.row_factory = dict_factory
+        self.connection.execute("PRAGMA journal_mode=WAL")
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        Runs a blocking callable on the writer thread
+        :param func: The callable to run
+        :return: Whatever the callable returned
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    async def run_read(self, func: Callable[[sqlite3.Connection], Any], *args, own_writes: bool = False,
+                       **kwargs) -> Any:
+        """
+        Runs a blocking callable on a reader thread, passing it that thread's read-only connection. Readers only ever
+        see committed data.
+        :param func: The callable to run, takes the connection as its first argument
+        :param own_writes: Run on the writer instead, after every write queued before it, so writes that aren't
+        committed yet are seen too. Only for reading back what the caller itself just wrote, since the writer is
+        shared by every write and a read there sees other callers' uncommitted writes as well.
+        :return: Whatever the callable returned
+        """
+        if own_writes:
+            return await self.run(func, self.connection, *args, **kwargs)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.reader_executor,
+                                          functools.partial(self.__call_reader, func, *args, **kwargs))
+
+    async def execute(self, query: str, params: Iterable = ()) -> sqlite3.Cursor:
+        """
+        Executes a single statement on the writer. Every call gets its own cursor, which should only be used for
+        lastrowid/rowcount; use fetchone or fetchall to read rows.
+        """
+        cursor = await self.run(self.connection.execute, query, params)
+        self.__wrote()
+        return cursor
+
+    async def executemany(self, query: str, params: Iterable[Iterable]) -> sqlite3.Cursor:
+        cursor = await self.run(self.connection.executemany, query, params)
+        self.__wrote()
+        return cursor
+
+    async def executemany_atomic(self, query: str, params: Iterable[Iterable]) -> sqlite3.Cursor:
+        """
+        Like executemany, but if any row fails none of the rows are written. Other writes waiting for the same commit
+        are left alone.
+        """
+        return await self.run_atomic(lambda connection: connection.executemany(query, params))
+
+    async def run_atomic(self, func: Callable[[sqlite3.Connection], Any]) -> Any:
+        """
+        Runs a blocking callable on the writer thread inside a savepoint, passing it the writer connection. If it
+        raises, everything it wrote is rolled back and the exception is re-raised. Other writes waiting for the same
+        commit are left alone.
+        :param func: The callable to run, takes the connection as its only argument
+        :return: Whatever the callable returned
+        """
+        result = await self.run(self.__run_atomic, func)
+        self.__wrote()
+        return result
+
+    async def fetchone(self, query: str, params: Iterable = (), own_writes: bool = False) -> Optional[dict]:
+        """
+        :param own_writes: Read on the writer, see run_read
+        """
+        return await self.run_read(self.__fetchone, query, params, own_writes=own_writes)
+
+    async def fetchall(self, query: str, params: Iterable = (), own_writes: bool = False) -> list[dict]:
+        """
+        :param own_writes: Read on the writer, see run_read
+        """
+        return await self.run_read(self.__fetchall, query, params, own_writes=own_writes)
+
+    async def fetchone_as(self, record: type[T], query: str, params: Iterable = (),
+                          own_writes: bool = False) -> Optional[T]:
+        """
+        Like fetchone, but builds the row straight into a record dataclass instead of a dict
+        :param record: The dataclass to build, columns without a matching field are ignored
+        :param own_writes: Read on the writer, see run_read
+        """
+        return await self.run_read(self.__fetch_as, record, query, params, True, own_writes=own_writes)
+
+    async def fetchall_as(self, record: type[T], query: str, params: Iterable = (),
+                          own_writes: bool = False) -> list[T]:
+        """
+        Like fetchall, but builds the rows straight into record dataclasses instead of dicts
+        :param record: The dataclass to build, columns without a matching field are ignored
+        :param own_writes: Read on the writer, see run_read
+        """
+        return await self.run_read(self.__fetch_as, record, query, params, False, own_writes=own_writes)
+
+    async def stream(self, query: str, params: Iterable = (), size: int = 500) -> AsyncIterator[list[dict]]:
+        """
+        Reads the rows of a query in chunks, so the whole result is never held in memory. Runs on a read-only
+        connection of its own, which stays open while the caller works through the chunks, and reads from a single
+        snapshot from start to finish even while the writer keeps committing.
+        :param query: The query to run
+        :param params: The query's parameters
+        :param size: Rows fetched per chunk
+        """
+        loop = asyncio.get_running_loop()
+        connection = await loop.run_in_executor(self.reader_executor, self.__open_reader)
+        try:
+            cursor = await loop.run_in_executor(self.reader_executor, connection.execute, query, params)
+            while True:
+                rows = await loop.run_in_executor(self.reader_executor, cursor.fetchmany, size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            connection.close()
+
+    async def commit(self):
+        """
+        Returns once everything written so far is committed. Callers within the same commit window share a single
+        transaction and fsync, so await this before telling anyone their change went through.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self.__waiters.append(future)
+        self.__schedule_flush(0 if len(self.__waiters) >= self.commit_batch else self.commit_interval)
+        await future
+
+    def add_commit_listener(self, listener: Callable[[], None]):
+        """
+        Registers a callback that runs on the event loop after every successful commit
+        """
+        self.__commit_listeners.append(listener)
+
+    async def backup(self, archive: str, pages: int = 1024):
+        """
+        Writes a compressed snapshot of the database using the sqlite3 online backup API. Runs on its own thread and
+        copies from a read transaction, so reads and writes carry on while the backup is taken.
+        :param archive: Path of the zip file to write
+        :param pages: Pages copied per backup step
+        """
+        await asyncio.to_thread(self.__backup, archive, pages)
+
+    async def close(self):
+        if self.__flush_timer is not None:
+            self.__flush_timer.cancel()
+            self.__flush_timer = None
+        # nothing can be read after closing, so listeners don't hear about the last commit
+        self.__commit_listeners.clear()
+        await self.__flush()
+        await self.run(self.connection.close)
+        self.executor.shutdown(wait=False)
+        self.reader_executor.shutdown(wait=True)
+        for reader in self.__readers:
+            reader.close()
+
+    def __wrote(self):
+        self.__pending += 1
+        self.__schedule_flush(0 if self.__pending >= self.commit_batch else self.commit_interval)
+
+    def __schedule_flush(self, delay: float):
+        if self.__flush_timer is not None:
+            if delay > 0:
+                # a flush is already on its way and will pick this commit up
+                return
+            self.__flush_timer.cancel()
+        self.__flush_timer = asyncio.get_running_loop().call_later(delay, self.__start_flush)
+
+    def __start_flush(self):
+        self.__flush_timer = None
+        task = asyncio.create_task(self.__flush())
+        self.__flushes.add(task)
+        task.add_done_callback(self.__flushes.discard)
+
+    async def __flush(self):
+        waiters, self.__waiters = self.__waiters, []
+        self.__pending = 0
+        try:
+            await self.run(self.connection.commit)
+        except Exception as e:
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_exception(e)
+        else:
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_result(None)
+            for listener in self.__commit_listeners:
+                try:
+                    listener()
+                except Exception:
+                    traceback.print_exc()
+
+    def __run_atomic(self, func: Callable[[sqlite3.Connection], Any]) -> Any:
+        # a savepoint inside the open transaction, releasing the outermost savepoint would commit
+        if not self.connection.in_transaction:
+            self.connection.execute("BEGIN")
+        self.connection.execute("SAVEPOINT atomic")
+        try:
+            result = func(self.connection)
+        except Exception:
+            self.connection.execute("ROLLBACK TO atomic")
+            self.connection.execute("RELEASE atomic")
+            raise
+        self.connection.execute("RELEASE atomic")
+        return result
+
+    def __call_reader(self, func: Callable, *args, **kwargs):
+        reader = getattr(self.__local, "connection", None)
+        if reader is None:
+            reader = self.__open_reader()
+            self.__local.connection = reader
+            self.__readers.append(reader)
+        return func(reader, *args, **kwargs)
+
+    def __open_reader(self) -> sqlite3.Connection:
+        reader = sqlite3.connect(self.uri, uri=True, timeout=self.busy_timeout, check_same_thread=False)
+        reader.row_factory = dict_factory
+        return reader
+
+    def __backup(self, archive: str, pages: int):
+        source = sqlite3.connect(self.uri, uri=True, timeout=self.busy_timeout)
+        fd, snapshot = tempfile.mkstemp(suffix=".db", dir=os.path.dirname(os.path.abspath(archive)))
+        os.close(fd)
+        try:
+            # holding a read transaction pins one WAL snapshot, so the page-stepped copy is consistent even while the
+            # writer keeps committing
+            source.execute("BEGIN")
+            source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+            target = sqlite3.connect(snapshot)
+            try:
+                source.backup(target, pages=pages, sleep=0)
+            finally:
+                target.close()
+            with zipfile.ZipFile(archive, "w", compression=zipfile.ZIP_DEFLATED) as backup:
+                backup.write(snapshot, os.path.basename(self.filename))
+        finally:
+            source.close()
+            os.remove(snapshot)
+
+    @staticmethod
+    def __fetchone(connection: sqlite3.Connection, query: str, params: Iterable):
+        return connection.execute(query, params).fetchone()
+
+    @staticmethod
+    def __fetchall(connection: sqlite3.Connection, query: str, params: Iterable):
+        return connection.execute(query, params).fetchall()
+
+    @staticmethod
+    def __fetch_as(connection: sqlite3.Connection, record: type, query: str, params: Iterable, one: bool):
+        cursor = connection.cursor()
+        cursor.row_factory = None
+        cursor.execute(query, params)
+        build = row_builder(record, tuple(column[0] for column in cursor.description))
+        if one:
+            row = cursor.fetchone()
+            return None if row is None else build(row)
+        return [build(row) for row in cursor.fetchall()]
@@ -0,0 +1,21 @@
+from typing import Optional
+
+import discord
+from discord.ext import commands
+
+from .MessageDispatcher import Lane, MessageDispatcher, current_bucket
+
+
+class DispatchContext(commands.Context):
+    """
+    Command context whose replies are queued on the bot's dispatcher in the interactive lane, so they go out ahead of
+    staff posts and bulk DMs, and in order with everything else sent to the same channel
+    """
+
+    async def send(self, content: Optional[str] = None, **kwargs) -> discord.Message:
+        send = super().send
+        bucket = MessageDispatcher.bucket(self)
+        if current_bucket.get() == bucket:
+            # already the channel's turn, as in dispatcher.send(context, ...), queueing again would wait on itself
+            return await send(content, **kwargs)
+        return await self.bot.dispatcher.submit(lambda: send(content, **kwargs), bucket, Lane.INTERACTIVE)
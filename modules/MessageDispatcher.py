@@ -0,0 +1,124 @@
+import asyncio
+import heapq
+import itertools
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+import discord
+
+# the bucket whose send the current task runs, so a send can tell it already holds its destination's turn
+current_bucket: ContextVar[Optional[Hashable]] = ContextVar("current_bucket", default=None)
+
+
+class Lane(IntEnum):
+    """
+    Priority of an outbound send, lower lanes go first
+    """
+    INTERACTIVE = 0
+    STAFF = 1
+    BULK = 2
+
+
+class MessageDispatcher:
+    """
+    Central queue for the bot's outbound messages. Every send is queued in a lane, command replies before staff channel
+    posts before bulk DMs, and at most concurrency of them are in flight at once. Discord rate limits message sends
+    per channel, so sends to the same destination go out one at a time, in lane order and then in the order they were
+    queued, and a large notification to many members runs as many DMs in parallel as the limits allow. Bulk sends never
+    take every slot, so a reply queued behind a notification starts right away. Callers get a future for every send.
+    """
+
+    def __init__(self, concurrency: int = 8, bulk_concurrency: int = 4):
+        self.concurrency = concurrency
+        self.bulk_concurrency = max(1, min(bulk_concurrency, concurrency - 1))
+        self.running = 0
+        self.running_bulk = 0
+        self.sequence = itertools.count()
+        # queued sends of every destination, each a heap of (lane, seq, send, future)
+        self.buckets: dict[Hashable, list[tuple[int, int, Callable[[], Awaitable[Any]], asyncio.Future]]] = {}
+        self.busy: set[Hashable] = set()
+        # (lane, seq, bucket) of the first send of every idle bucket. Entries go stale when a bucket gets a send that
+        # goes before it or starts sending, stale entries are skipped when they come up.
+        self.ready: list[tuple[int, int, Hashable]] = []
+        self.tasks: set[asyncio.Task] = set()
+
+    def submit(self, send: Callable[[], Awaitable[Any]], bucket: Hashable, lane: Lane = Lane.INTERACTIVE) \
+            -> asyncio.Future:
+        """
+        Queues a send
+        :param send: Called without arguments once it's the send's turn, returns the awaitable that sends
+        :param bucket: The destination, sends with the same bucket never run at the same time
+        :param lane: The send's priority
+        :return: A future for what send's awaitable returns
+        """
+        future = asyncio.get_running_loop().create_future()
+        seq = next(self.sequence)
+        heapq.heappush(self.buckets.setdefault(bucket, []), (lane, seq, send, future))
+        if bucket not in self.busy:
+            heapq.heappush(self.ready, (lane, seq, bucket))
+        self.__pump()
+        return future
+
+    def send(self, destination: discord.abc.Messageable, content: Optional[str] = None,
+             lane: Lane = Lane.INTERACTIVE, **kwargs) -> asyncio.Future:
+        """
+        Queues destination.send(content, **kwargs)
+        :return: A future for the sent message
+        """
+        return self.submit(lambda: destination.send(content, **kwargs), self.bucket(destination), lane)
+
+    @staticmethod
+    def bucket(destination: discord.abc.Messageable) -> int:
+        # a context or message sends to its channel, a member to their DMs
+        return getattr(destination, "channel", destination).id
+
+    def __pump(self):
+        while self.ready and self.running < self.concurrency:
+            lane, seq, bucket = self.ready[0]
+            queued = self.buckets.get(bucket)
+            if bucket in self.busy or not queued or queued[0][1] != seq:
+                heapq.heappop(self.ready)
+                continue
+            if lane == Lane.BULK and self.running_bulk >= self.bulk_concurrency:
+                # only bulk sends are left, they wait for a bulk send to finish
+                return
+            heapq.heappop(self.ready)
+            lane, seq, send, future = heapq.heappop(queued)
+            if not queued:
+                del self.buckets[bucket]
+            if future.cancelled():
+                # the caller stopped waiting before it was sent, the bucket stays idle
+                if queued:
+                    heapq.heappush(self.ready, (queued[0][0], queued[0][1], bucket))
+                continue
+            self.busy.add(bucket)
+            self.running += 1
+            if lane == Lane.BULK:
+                self.running_bulk += 1
+            task = asyncio.create_task(self.__run(bucket, lane, send, future))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def __run(self, bucket: Hashable, lane: Lane, send: Callable[[], Awaitable[Any]], future: asyncio.Future):
+        current_bucket.set(bucket)
+        try:
+            result = await send()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+        else:
+            if not future.done():
+                future.set_result(result)
+        finally:
+            self.busy.discard(bucket)
+            self.running -= 1
+            if lane == Lane.BULK:
+                self.running_bulk -= 1
+            queued = self.buckets.get(bucket)
+            if queued:
+                heapq.heappush(self.ready, (queued[0][0], queued[0][1], bucket))
+            self.__pump()
@@ -0,0 +1,212 @@
+import ast
+import inspect
+import re
+import sqlite3
+import time
+from typing import Callable
+
+from .CampaignSQLHelper import CampaignSQLHelper
+
+# columns that were added to campaigns by hand after the original CREATE TABLE in main.py
+CAMPAIGN_COLUMNS = {
+    "location": "TEXT",
+    "playstyle": "TEXT",
+    "session_length": "TEXT",
+    "meeting_frequency": "TEXT",
+    "meeting_day": "TEXT",
+    "meeting_time": "TEXT",
+    "meeting_date": "TEXT",
+    "system": "TEXT",
+    "new_player_friendly": "TEXT",
+    "timestamp": "INTEGER",
+    "paused": "INTEGER DEFAULT 0",
+    "info_message": "TEXT",
+    "locked": "INTEGER DEFAULT 0",
+}
+
+
+class Migrations:
+    """
+    Versioned schema migrations. Every step runs in its own transaction and records its version in schema_version, so
+    a database is brought up to date from whatever version it was left at. Must run before anything else uses the
+    connection.
+    """
+
+    def __init__(self, connection: sqlite3.Connection):
+        self.connection = connection
+        self.steps: list[tuple[int, str, Callable[[sqlite3.Connection], None]]] = [
+            (1, "create base tables", self.create_tables),
+            (2, "add missing campaign columns", self.add_campaign_columns),
+            (3, "create lookup indexes", self.create_indexes),
+            (4, "derive current_players with triggers", self.create_player_count_triggers),
+            (5, "make users.id unique", self.unique_user_ids),
+            (6, "log campaign changes", self.create_campaign_events),
+        ]
+
+    @property
+    def version(self) -> int:
+        row = self.connection.execute("SELECT MAX(version) AS version FROM schema_version").fetchone()
+        return row["version"] or 0
+
+    def migrate(self) -> int:
+        """
+        Applies every step newer than the current schema version
+        :return: The schema version after migrating
+        """
+        self.connection.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER PRIMARY KEY, "
+                                "description TEXT, applied INTEGER)")
+        self.connection.commit()
+        current = self.version
+        for version, description, step in self.steps:
+            if version <= current:
+                continue
+            # DDL doesn't open a transaction implicitly, so a step is only atomic with an explicit BEGIN
+            self.connection.execute("BEGIN")
+            try:
+                step(self.connection)
+                self.connection.execute("INSERT INTO schema_version (version, description, applied) VALUES (?, ?, ?)",
+                                        (version, description, int(time.time())))
+                self.connection.commit()
+            except Exception:
+                self.connection.rollback()
+                raise
+            print(f"Migrated database to version {version}: {description}")
+            current = version
+        return current
+
+    @staticmethod
+    def create_tables(connection: sqlite3.Connection):
+        connection.execute("CREATE TABLE IF NOT EXISTS campaigns (id INTEGER PRIMARY KEY, name TEXT, dm INTEGER, "
+                           "role INTEGER, category INTEGER, information_channel INTEGER, min_players INTEGER, "
+                           "max_players INTEGER, current_players INTEGER, status_message INTEGER)")
+        connection.execute("CREATE TABLE IF NOT EXISTS warns (id INTEGER PRIMARY KEY, member INTEGER, reason TEXT)")
+        connection.execute("CREATE TABLE IF NOT EXISTS players (pid INTEGER PRIMARY KEY AUTOINCREMENT, id INTEGER, "
+                           "campaign INTEGER, waitlisted INTEGER DEFAULT 0, name TEXT)")
+        connection.execute("CREATE TABLE IF NOT EXISTS users (id INTEGER, first_name TEXT, last_name TEXT, "
+                           "unt_email TEXT, unt_student INTEGER, playstyle TEXT, bio TEXT, pronouns TEXT, image TEXT, "
+                           "position TEXT)")
+        connection.execute("CREATE TABLE IF NOT EXISTS reminders (id INTEGER PRIMARY KEY, user_id INTEGER, "
+                           "channel INTEGER, time INTEGER, phrase TEXT, jump_url TEXT)")
+        connection.execute("CREATE TABLE IF NOT EXISTS authorized_users (id INTEGER PRIMARY KEY, name TEXT, "
+                           "token TEXT, permissions INTEGER DEFAULT 0)")
+
+    @staticmethod
+    def add_campaign_columns(connection: sqlite3.Connection):
+        existing = {row["name"] for row in connection.execute("PRAGMA table_info(campaigns)").fetchall()}
+        for column, definition in CAMPAIGN_COLUMNS.items():
+            if column not in existing:
+                connection.execute(f"ALTER TABLE campaigns ADD COLUMN {column} {definition}")
+
+    @staticmethod
+    def create_indexes(connection: sqlite3.Connection):
+        # (campaign, waitlisted, id) covers the roster and waitlist lookups without touching the table
+        connection.execute("CREATE INDEX IF NOT EXISTS players_campaign ON players (campaign, waitlisted, id)")
+        connection.execute("CREATE INDEX IF NOT EXISTS players_member ON players (id, campaign)")
+        connection.execute("CREATE INDEX IF NOT EXISTS warns_member ON warns (member)")
+        connection.execute("CREATE INDEX IF NOT EXISTS campaigns_name ON campaigns (name COLLATE NOCASE)")
+        connection.execute("CREATE INDEX IF NOT EXISTS campaigns_role ON campaigns (role)")
+        connection.execute("CREATE INDEX IF NOT EXISTS campaigns_dm ON campaigns (dm)")
+        connection.execute("CREATE INDEX IF NOT EXISTS authorized_users_token ON authorized_users (token)")
+        connection.execute("CREATE INDEX IF NOT EXISTS users_id ON users (id)")
+        connection.execute("CREATE INDEX IF NOT EXISTS reminders_user ON reminders (user_id)")
+
+    @staticmethod
+    def create_player_count_triggers(connection: sqlite3.Connection):
+        # current_players only ever moves by the rows that actually changed, so it can't drift from the players table
+        connection.execute("CREATE TRIGGER IF NOT EXISTS players_insert AFTER INSERT ON players "
+                           "WHEN NEW.waitlisted = 0 BEGIN "
+                           "UPDATE campaigns SET current_players = current_players + 1 WHERE id = NEW.campaign; "
+                           "END")
+        connection.execute("CREATE TRIGGER IF NOT EXISTS players_delete AFTER DELETE ON players "
+                           "WHEN OLD.waitlisted = 0 BEGIN "
+                           "UPDATE campaigns SET current_players = current_players - 1 WHERE id = OLD.campaign; "
+                           "END")
+        connection.execute("CREATE TRIGGER IF NOT EXISTS players_update AFTER UPDATE OF waitlisted, campaign "
+                           "ON players BEGIN "
+                           "UPDATE campaigns SET current_players = current_players - (OLD.waitlisted = 0) "
+                           "WHERE id = OLD.campaign; "
+                           "UPDATE campaigns SET current_players = current_players + (NEW.waitlisted = 0) "
+                           "WHERE id = NEW.campaign; "
+                           "END")
+        # start from an exact count, the old read-modify-write updates may have drifted
+        connection.execute("UPDATE campaigns SET current_players = (SELECT COUNT(*) FROM players WHERE "
+                           "players.campaign = campaigns.id AND players.waitlisted = 0)")
+
+    @staticmethod
+    def unique_user_ids(connection: sqlite3.Connection):
+        # the old check-then-insert could race and leave duplicates, keep the most recently written row of each
+        connection.execute("DELETE FROM users WHERE rowid NOT IN (SELECT MAX(rowid) FROM users GROUP BY id)")
+        connection.execute("DROP INDEX IF EXISTS users_id")
+        connection.execute("CREATE UNIQUE INDEX users_id ON users (id)")
+
+    @staticmethod
+    def create_campaign_events(connection: sqlite3.Connection):
+        # AUTOINCREMENT so a seq is never handed out twice, even after the newest events are deleted
+        connection.execute("CREATE TABLE IF NOT EXISTS campaign_events (seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+                           "campaign INTEGER, change TEXT, time INTEGER)")
+        # logged by triggers, so an event is part of the same statement, and transaction, as the change itself
+        now = "CAST(strftime('%s', 'now') AS INTEGER)"
+        log = "INSERT INTO campaign_events (campaign, change, time)"
+        connection.execute(f"CREATE TRIGGER IF NOT EXISTS campaigns_log_insert AFTER INSERT ON campaigns BEGIN "
+                           f"{log} VALUES (NEW.id, 'created', {now}); END")
+        connection.execute(f"CREATE TRIGGER IF NOT EXISTS campaigns_log_delete AFTER DELETE ON campaigns BEGIN "
+                           f"{log} VALUES (OLD.id, 'deleted', {now}); END")
+        # current_players is left out, the players triggers already log every change that moves it. Columns added by
+        # later migrations need this trigger recreated to be logged.
+        columns = [row["name"] for row in connection.execute("PRAGMA table_info(campaigns)").fetchall()
+                   if row["name"] not in ("id", "current_players")]
+        connection.execute(f"CREATE TRIGGER IF NOT EXISTS campaigns_log_update AFTER UPDATE OF {', '.join(columns)} "
+                           f"ON campaigns BEGIN {log} VALUES (NEW.id, 'updated', {now}); END")
+        connection.execute(f"CREATE TRIGGER IF NOT EXISTS players_log_insert AFTER INSERT ON players BEGIN "
+                           f"{log} VALUES (NEW.campaign, 'players', {now}); END")
+        connection.execute(f"CREATE TRIGGER IF NOT EXISTS players_log_delete AFTER DELETE ON players BEGIN "
+                           f"{log} VALUES (OLD.campaign, 'players', {now}); END")
+        connection.execute(f"CREATE TRIGGER IF NOT EXISTS players_log_update AFTER UPDATE OF waitlisted, campaign "
+                           f"ON players BEGIN {log} VALUES (NEW.campaign, 'players', {now}); "
+                           f"{log} SELECT OLD.campaign, 'players', {now} WHERE OLD.campaign IS NOT NEW.campaign; END")
+
+    def check_query_plans(self):
+        """
+        Runs EXPLAIN QUERY PLAN over every filtered query in CampaignSQLHelper and raises if any of them would scan a
+        whole table instead of searching an index
+        """
+        scans = []
+        for query in self.helper_queries():
+            plan = self.connection.execute(f"EXPLAIN QUERY PLAN {query}", (None,) * query.count("?")).fetchall()
+            for row in plan:
+                # table-valued functions like json_each scan their argument, not a table
+                if row["detail"].startswith("SCAN") and "VIRTUAL TABLE" not in row["detail"]:
+                    scans.append(f"{query}: {row['detail']}")
+        if scans:
+            raise RuntimeError("CampaignSQLHelper queries fall back to a full table scan:\n" + "\n".join(scans))
+
+    @staticmethod
+    def helper_queries() -> list[str]:
+        """
+        Collects the SQL statements with a WHERE clause from CampaignSQLHelper's source, so new queries are checked
+        without having to be listed anywhere. Interpolated identifiers are replaced with a real column name. Statements
+        that only filter inside a subquery touch every row on purpose and are left out.
+        :return: The statements found
+        """
+        queries, fragments = [], set()
+        for node in ast.walk(ast.parse(inspect.getsource(CampaignSQLHelper))):
+            if isinstance(node, ast.JoinedStr):
+                fragments.update(id(part) for part in node.values)
+                query = "".join(part.value if isinstance(part, ast.Constant) else "name" for part in node.values)
+            elif isinstance(node, ast.Constant) and isinstance(node.value, str) and id(node) not in fragments:
+                query = node.value
+            else:
+                continue
+            if query.split(" ", 1)[0] in ("SELECT", "UPDATE", "DELETE") and " WHERE " in Migrations.outer(query):
+                queries.append(query)
+        return queries
+
+    @staticmethod
+    def outer(query: str) -> str:
+        """
+        Strips every parenthesized part of a statement, leaving the outermost query
+        """
+        stripped = re.sub(r"\([^()]*\)", "", query)
+        while stripped != query:
+            query, stripped = stripped, re.sub(r"\([^()]*\)", "", stripped)
+        return query
@@ -0,0 +1,19 @@
+from dataclasses import dataclass
+
+
+@dataclass(slots=True)
+class PlayerInfo:
+    """
+    A row of the players table, built by Database.fetchall_as
+    :param pid: Row ID, increases with every signup so it orders the waitlist
+    :param id: The player's Discord ID
+    :param campaign: The campaign's ID
+    :param waitlisted: Whether the player is on the waitlist
+    :param name: The player's display name when they joined
+    """
+
+    pid: int = 0
+    id: int = 0
+    campaign: int = 0
+    waitlisted: int = 0
+    name: str = ""
@@ -0,0 +1,30 @@
+from dataclasses import dataclass
+
+
+@dataclass(slots=True)
+class UserProfile:
+    """
+    A row of the users table, the profile a member fills in on the website. Built by Database.fetchall_as, the
+    defaults stand in for members that never filled it in.
+    :param id: The member's Discord ID
+    :param first_name: First name
+    :param last_name: Last name
+    :param unt_email: UNT email address
+    :param unt_student: Whether the member is a UNT student
+    :param playstyle: Preferred playstyle
+    :param bio: Profile bio
+    :param pronouns: Pronouns
+    :param image: Profile image file name
+    :param position: Officer position
+    """
+
+    id: int = 0
+    first_name: str = ""
+    last_name: str = ""
+    unt_email: str = ""
+    unt_student: int = 0
+    playstyle: str = ""
+    bio: str = ""
+    pronouns: str = ""
+    image: str = ""
+    position: str = ""
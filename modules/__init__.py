@@ -1,6 +1,13 @@
+from .Database import Database
 from .CampaignSQLHelper import CampaignSQLHelper
 from .CampaignInfo import CampaignInfo
 from .CampaignBuilder import CampaignBuilder
 from .CampaignManager import CampaignManager
 from .CampaignPlayerManager import CampaignPlayerManager
 from .FakeMember import FakeMember
+from .PlayerInfo import PlayerInfo
+from .UserProfile import UserProfile
+from .CampaignRegistry import CampaignRegistry
+from .Migrations import Migrations
+from .MessageDispatcher import MessageDispatcher, Lane
+from .DispatchContext import DispatchContext
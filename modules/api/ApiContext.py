@@ -0,0 +1,35 @@
+from typing import Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .BotBridge import BotBridge
+    from ..CampaignSQLHelper import CampaignSQLHelper
+    from ..Database import Database
+
+
+class ApiContext:
+    """
+    Everything the API uses from the process it runs in. main.py fills it in from the bot when the API is served by the
+    bot's own process, api_main.py with a database connection, campaign helper and RemoteBridge of its own when it is
+    served by separate worker processes.
+    """
+
+    def __init__(self):
+        self.db: Optional['Database'] = None
+        self.config: dict = {}
+        self.campaigns: Optional['CampaignSQLHelper'] = None
+        self.bridge: Optional['BotBridge'] = None
+
+    def configure(self, db: 'Database', config: dict, campaigns: 'CampaignSQLHelper', bridge: 'BotBridge'):
+        """
+        :param db: The database the API reads and writes
+        :param config: The bot's config
+        :param campaigns: The campaign helper whose registry the API reads campaigns from
+        :param bridge: How the API reaches the Discord client
+        """
+        self.db = db
+        self.config = config
+        self.campaigns = campaigns
+        self.bridge = bridge
+
+
+context = ApiContext()
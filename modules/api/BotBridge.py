@@ -0,0 +1,440 @@
+import asyncio
+import dataclasses
+import itertools
+import os
+import socket
+import traceback
+from typing import Callable, Optional, TYPE_CHECKING
+
+import discord
+import orjson
+
+from .MemberResolver import MemberResolver
+from .encoding import dumps
+
+if TYPE_CHECKING:
+    from DNDBot import DNDBot
+
+# a line holds one message, the largest is a chunk of the member directory
+LINE_LIMIT = 2 ** 22
+SNAPSHOT_CHUNK = 500
+# long enough for a send with reactions to wait out Discord's rate limits
+REQUEST_TIMEOUT = 30
+# a worker that stops reading is dropped once this much is queued for it, it gets a new snapshot when it reconnects
+MAX_CLIENT_BUFFER = 2 ** 24
+
+
+@dataclasses.dataclass(slots=True)
+class MemberInfo:
+    """
+    The parts of a Discord user the API uses, small enough to be sent to the API's worker processes
+    :param id: The user's ID
+    :param name: Username
+    :param discriminator: Discriminator, "0" for users on the new username system
+    :param display_name: Nickname in the guild, or display name outside of it
+    :param in_guild: Whether the user is a member of the guild
+    :param roles: IDs of the member's roles
+    :param joined: When the member joined the guild, ISO 8601
+    """
+
+    id: int
+    name: str
+    discriminator: str
+    display_name: str
+    in_guild: bool = False
+    roles: list[int] = dataclasses.field(default_factory=list)
+    joined: Optional[str] = None
+
+    @classmethod
+    def from_user(cls, user: discord.abc.User) -> 'MemberInfo':
+        if isinstance(user, discord.Member):
+            return cls(user.id, user.name, user.discriminator, user.display_name, True, [i.id for i in user.roles],
+                       None if user.joined_at is None else user.joined_at.isoformat())
+        return cls(user.id, user.name, user.discriminator, user.display_name)
+
+    def __str__(self):
+        # the same as str() of a discord.py user
+        return self.name if self.discriminator == "0" else f"{self.name}#{self.discriminator}"
+
+
+class BotBridge:
+    """
+    How the API reaches the Discord client. LocalBridge calls the bot directly when the API runs in the bot's process,
+    RemoteBridge forwards to a BridgeServer in the bot's process when the API runs in worker processes of its own.
+    """
+
+    def get_member(self, user_id: int) -> Optional[MemberInfo]:
+        """
+        Looks a guild member up in the member directory, never waits on Discord
+        :param user_id: The member's ID
+        :return: The member, or None if they aren't in the directory
+        """
+        raise NotImplementedError
+
+    def role_members(self, role_id: int) -> list[int]:
+        """
+        :param role_id: The role's ID
+        :return: The IDs of every guild member with the role
+        """
+        raise NotImplementedError
+
+    async def resolve(self, user_id: int) -> Optional[MemberInfo]:
+        """
+        Looks up a user, asking Discord if they aren't in the member directory
+        :param user_id: The user's ID
+        :return: The user, with in_guild telling whether they are a member, or None if they can't be found
+        """
+        raise NotImplementedError
+
+    async def send_embed(self, channel_id: int, embed: discord.Embed, content: Optional[str] = None,
+                         reactions: tuple[str, ...] = ()) -> bool:
+        """
+        Sends an embed to a channel and adds reactions to it, in order
+        :param channel_id: The channel's ID
+        :param embed: The embed
+        :param content: Text sent along with the embed
+        :param reactions: The reactions to add
+        :return: Whether the message was sent
+        """
+        raise NotImplementedError
+
+
+class LocalBridge(BotBridge):
+    """
+    The bridge for an API running in the bot's own process, every call goes straight to the bot
+    """
+
+    def __init__(self, bot: 'DNDBot', resolver: Optional[MemberResolver] = None):
+        self.bot = bot
+        self.resolver = resolver or MemberResolver()
+        self.__guild: Optional[discord.Guild] = None
+
+    @property
+    def guild(self) -> Optional[discord.Guild]:
+        # None until the bot has connected
+        if self.__guild is None:
+            self.__guild = self.bot.get_guild(self.bot.config["server"])
+        return self.__guild
+
+    def get_member(self, user_id: int) -> Optional[MemberInfo]:
+        member = self.guild.get_member(user_id)
+        return None if member is None else MemberInfo.from_user(member)
+
+    def role_members(self, role_id: int) -> list[int]:
+        role = self.guild.get_role(role_id)
+        return [] if role is None else [i.id for i in role.members]
+
+    async def resolve(self, user_id: int) -> Optional[MemberInfo]:
+        user = await self.resolver.resolve(self.guild, user_id)
+        if user is None:
+            # users that left the guild are still cached while they share another guild with the bot
+            user = self.bot.get_user(user_id)
+        return None if user is None else MemberInfo.from_user(user)
+
+    async def send_embed(self, channel_id: int, embed: discord.Embed, content: Optional[str] = None,
+                         reactions: tuple[str, ...] = ()) -> bool:
+        channel = self.bot.get_channel(channel_id)
+        if channel is None:
+            return False
+        message = await channel.send(content=content, embed=embed)
+        for reaction in reactions:
+            await message.add_reaction(reaction)
+        return True
+
+
+class BridgeServer:
+    """
+    The bot's end of the bridge to the API's worker processes, served on a unix socket. Messages are JSON objects, one
+    per line. A worker is sent the whole member directory when it connects and every change to it after that, plus a
+    "committed" message after each of the bot's commits, which tells it to catch up with the campaign event log.
+    Workers send requests with an id, and each is answered by a "reply" with the same id.
+    """
+
+    def __init__(self, bridge: LocalBridge, path: str):
+        self.bridge = bridge
+        self.bot = bridge.bot
+        self.path = path
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.clients: set[asyncio.StreamWriter] = set()
+        self.handlers = {"resolve": self.__resolve, "send_embed": self.__send_embed}
+
+    async def start(self):
+        if os.path.exists(self.path):
+            # left behind by a previous run
+            os.remove(self.path)
+        # only processes running as the bot's user may connect. The umask applies while the socket file is created, so
+        # it never exists with looser permissions.
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        umask = os.umask(0o177)
+        try:
+            sock.bind(self.path)
+        except Exception:
+            sock.close()
+            raise
+        finally:
+            os.umask(umask)
+        self.server = await asyncio.start_unix_server(self.__serve, sock=sock, limit=LINE_LIMIT)
+        self.bot.add_listener(self.on_ready, "on_ready")
+        self.bot.add_listener(self.on_member_join, "on_member_join")
+        self.bot.add_listener(self.on_member_update, "on_member_update")
+        self.bot.add_listener(self.on_user_update, "on_user_update")
+        self.bot.add_listener(self.on_member_remove, "on_member_remove")
+        self.bot.db.add_commit_listener(self.committed)
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+        for writer in list(self.clients):
+            writer.close()
+        self.clients.clear()
+
+    def committed(self):
+        self.broadcast({"type": "committed"})
+
+    async def on_ready(self):
+        # workers that connected before the guild was cached were sent an empty directory
+        for writer in list(self.clients):
+            self.__send_snapshot(writer)
+
+    async def on_member_join(self, member: discord.Member):
+        self.__member_changed(member)
+
+    async def on_member_update(self, before: discord.Member, after: discord.Member):
+        self.__member_changed(after)
+
+    async def on_user_update(self, before: discord.User, after: discord.User):
+        guild = self.bridge.guild
+        member = None if guild is None else guild.get_member(after.id)
+        if member is not None:
+            self.__member_changed(member)
+
+    async def on_member_remove(self, member: discord.Member):
+        if member.guild.id == self.bot.config["server"]:
+            self.broadcast({"type": "member_removed", "id": member.id})
+
+    def broadcast(self, message: dict):
+        line = dumps(message) + b"\n"
+        for writer in list(self.clients):
+            self.__write(writer, line)
+
+    def __member_changed(self, member: discord.Member):
+        if member.guild.id == self.bot.config["server"]:
+            self.broadcast({"type": "member", "member": MemberInfo.from_user(member)})
+
+    def __write(self, writer: asyncio.StreamWriter, line: bytes):
+        if writer.transport.get_write_buffer_size() > MAX_CLIENT_BUFFER:
+            print("Dropping an API worker that stopped reading from the bot bridge")
+            self.clients.discard(writer)
+            writer.close()
+            return
+        writer.write(line)
+
+    def __send_snapshot(self, writer: asyncio.StreamWriter):
+        guild = self.bridge.guild
+        members = [] if guild is None else [MemberInfo.from_user(i) for i in guild.members]
+        for start in range(0, max(len(members), 1), SNAPSHOT_CHUNK):
+            self.__write(writer, dumps({"type": "members", "reset": start == 0,
+                                        "last": start + SNAPSHOT_CHUNK >= len(members),
+                                        "members": members[start:start + SNAPSHOT_CHUNK]}) + b"\n")
+
+    async def __serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # nothing is awaited between the snapshot and joining the clients, so no change can fall between them
+        self.__send_snapshot(writer)
+        self.clients.add(writer)
+        requests = set()
+        try:
+            while line := await reader.readline():
+                task = asyncio.create_task(self.__handle(writer, orjson.loads(line)))
+                requests.add(task)
+                task.add_done_callback(requests.discard)
+        except (ConnectionError, ValueError):
+            traceback.print_exc()
+        finally:
+            self.clients.discard(writer)
+            writer.close()
+
+    async def __handle(self, writer: asyncio.StreamWriter, request: dict):
+        if not isinstance(request, dict) or "id" not in request:
+            # there is nothing to address a reply to
+            print(f"Ignoring a malformed bot bridge request: {request!r:.200}")
+            return
+        reply = {"type": "reply", "id": request["id"]}
+        handler = self.handlers.get(request.get("type"))
+        if handler is None:
+            reply["error"] = f"Unknown request type {request.get('type')!r}"
+            self.__write(writer, dumps(reply) + b"\n")
+            return
+        try:
+            reply["result"] = await handler(request)
+        except Exception as e:
+            traceback.print_exc()
+            reply["error"] = f"{type(e).__name__}: {e}"
+        if not writer.is_closing():
+            self.__write(writer, dumps(reply) + b"\n")
+
+    async def __resolve(self, request: dict) -> Optional[MemberInfo]:
+        return await self.bridge.resolve(request["user"])
+
+    async def __send_embed(self, request: dict) -> bool:
+        return await self.bridge.send_embed(request["channel"], discord.Embed.from_dict(request["embed"]),
+                                            request["content"], tuple(request["reactions"]))
+
+
+class RemoteBridge(BotBridge):
+    """
+    The bridge as seen from an API worker process. It holds a copy of the member directory that the bot keeps
+    current, so member lookups never leave the process, and forwards everything else to the BridgeServer. The
+    connection is retried for as long as the worker runs, and every reconnect starts from a new snapshot.
+    """
+
+    def __init__(self, path: str, retry_interval: float = 1):
+        self.path = path
+        self.retry_interval = retry_interval
+        self.members: dict[int, MemberInfo] = {}
+        self.loading: dict[int, MemberInfo] = {}
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.pending: dict[int, asyncio.Future] = {}
+        self.request_ids = itertools.count(1)
+        self.commit_listeners: list[Callable[[], None]] = []
+        self.member_listeners: list[Callable[[Optional[MemberInfo], Optional[MemberInfo]], None]] = []
+        self.connected = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def add_commit_listener(self, listener: Callable[[], None]):
+        """
+        Registers a callback for every commit the bot makes. It is also called after every reconnect, since commits
+        may have been missed while the bridge was down.
+        """
+        self.commit_listeners.append(listener)
+
+    def add_member_listener(self, listener: Callable[[Optional[MemberInfo], Optional[MemberInfo]], None]):
+        """
+        Registers a callback for changes to the member directory. It gets the member before and after the change,
+        before is None for a member that joined and after is None for one that left.
+        """
+        self.member_listeners.append(listener)
+
+    async def start(self, timeout: float = 10):
+        """
+        Connects in the background
+        :param timeout: How long to wait for the first member directory before carrying on without it
+        """
+        self.task = asyncio.create_task(self.__run())
+        try:
+            await asyncio.wait_for(self.connected.wait(), timeout)
+        except asyncio.TimeoutError:
+            print(f"The bot bridge at {self.path} isn't reachable yet, retrying in the background")
+
+    async def close(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+
+    def get_member(self, user_id: int) -> Optional[MemberInfo]:
+        return self.members.get(user_id)
+
+    def role_members(self, role_id: int) -> list[int]:
+        return [i.id for i in self.members.values() if role_id in i.roles]
+
+    async def resolve(self, user_id: int) -> Optional[MemberInfo]:
+        member = self.members.get(user_id)
+        if member is not None:
+            return member
+        try:
+            user = await self.__request("resolve", user=user_id)
+        except (ConnectionError, RuntimeError, asyncio.TimeoutError):
+            traceback.print_exc()
+            return None
+        return None if user is None else MemberInfo(**user)
+
+    async def send_embed(self, channel_id: int, embed: discord.Embed, content: Optional[str] = None,
+                         reactions: tuple[str, ...] = ()) -> bool:
+        try:
+            return await self.__request("send_embed", channel=channel_id, embed=embed.to_dict(), content=content,
+                                        reactions=list(reactions))
+        except (ConnectionError, RuntimeError, asyncio.TimeoutError):
+            traceback.print_exc()
+            return False
+
+    async def __request(self, kind: str, **fields):
+        if self.writer is None:
+            raise ConnectionError("The bot bridge isn't connected")
+        request_id = next(self.request_ids)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        self.writer.write(dumps({"type": kind, "id": request_id, **fields}) + b"\n")
+        try:
+            return await asyncio.wait_for(future, REQUEST_TIMEOUT)
+        finally:
+            self.pending.pop(request_id, None)
+
+    async def __run(self):
+        while True:
+            try:
+                reader, self.writer = await asyncio.open_unix_connection(self.path, limit=LINE_LIMIT)
+            except OSError:
+                await asyncio.sleep(self.retry_interval)
+                continue
+            try:
+                while line := await reader.readline():
+                    self.__receive(orjson.loads(line))
+            except (ConnectionError, ValueError):
+                traceback.print_exc()
+            finally:
+                self.writer.close()
+                self.writer = None
+                self.connected.clear()
+                for future in self.pending.values():
+                    if not future.done():
+                        future.set_exception(ConnectionError("The bot bridge disconnected"))
+                self.pending.clear()
+            print("Lost the bot bridge, reconnecting")
+            await asyncio.sleep(self.retry_interval)
+
+    def __receive(self, message: dict):
+        kind = message["type"]
+        if kind == "reply":
+            future = self.pending.pop(message["id"], None)
+            if future is None or future.done():
+                return
+            if "error" in message:
+                future.set_exception(RuntimeError(message["error"]))
+            else:
+                future.set_result(message["result"])
+        elif kind == "committed":
+            self.__committed()
+        elif kind == "member":
+            member = MemberInfo(**message["member"])
+            self.__member_changed(self.members.get(member.id), member)
+            self.members[member.id] = member
+        elif kind == "member_removed":
+            self.__member_changed(self.members.pop(message["id"], None), None)
+        elif kind == "members":
+            if message["reset"]:
+                self.loading = {}
+            self.loading.update((i["id"], MemberInfo(**i)) for i in message["members"])
+            if message["last"]:
+                previous, self.members, self.loading = self.members, self.loading, {}
+                # report whatever changed while the bridge was down, or every member on the first connect
+                for user_id in previous.keys() | self.members.keys():
+                    if previous.get(user_id) != self.members.get(user_id):
+                        self.__member_changed(previous.get(user_id), self.members.get(user_id))
+                self.connected.set()
+                self.__committed()
+
+    def __member_changed(self, before: Optional[MemberInfo], after: Optional[MemberInfo]):
+        for listener in self.member_listeners:
+            try:
+                listener(before, after)
+            except Exception:
+                traceback.print_exc()
+
+    def __committed(self):
+        for listener in self.commit_listeners:
+            try:
+                listener()
+            except Exception:
+                traceback.print_exc()
@@ -1,3 +1,5 @@
+import asyncio
+
 import discord
 
 from DNDBot import DNDBot
@@ -138,12 +140,12 @@ class ActionHandler:
     @staticmethod
     async def end(bot: DNDBot, channel: discord.TextChannel, campaign: int, embed: discord.Embed) -> bool:
         try:
+            campaign = await bot.CampaignSQLHelper.select_campaign(campaign)
             if len(embed.fields) >= 5:
                 reason = embed.fields[4].value
                 await bot.CampaignManager.delete_campaign(channel, campaign, reason)
             else:
                 await bot.CampaignManager.delete_campaign(channel, campaign)
-            campaign = await bot.CampaignSQLHelper.select_campaign(channel, campaign)
             dm = channel.guild.get_member(campaign.dm)
             await dm.send(f"This is a notification that your request to end a campaign has been processed. The "
                           f"campaign will be deleted and the players will be notified. Campaign: {campaign.name}.")
@@ -155,28 +157,35 @@ class ActionHandler:
 
     @staticmethod
     async def pause(bot: DNDBot, channel: discord.TextChannel, campaign: int, embed: discord.Embed) -> bool:
-        campaign_info = await bot.CampaignSQLHelper.select_campaign(channel, campaign)
+        campaign_info = await bot.CampaignSQLHelper.select_campaign(campaign)
         category: discord.CategoryChannel = channel.guild.get_channel(campaign_info.category)
         campaign_role = channel.guild.get_role(campaign_info.role)
 
-        commit = await bot.CampaignSQLHelper.pause_campaign(campaign)
+        commit = await bot.CampaignSQLHelper.pause_campaign(campaign_info)
         if commit:
+            await bot.db.commit()
             for i in category.channels:
                 await i.set_permissions(campaign_role, send_messages=False)
-            players = bot.CampaignSQLHelper.get_players(campaign)
+            players = await bot.CampaignSQLHelper.get_players(campaign_info)
+            notifications = []
             for i in players:
-                member = channel.guild.get_member(i)
-                await member.send(f"This is a notification that a campaign you’re in has been paused. The channels for "
-                                  f"the campaign will be locked, and the campaign will not hold any sessions until it "
-                                  f"is unpaused. Please reach out to your DM for more information. If you wish to "
-                                  f"leave the campaign at any time, you may do so through the Leave a Campaign form "
-                                  f"found in <#812549890227437588> or <#823698349243760670>. Campaign: "
-                                  f"{campaign_info.name}.")
+                member = channel.guild.get_member(i.id)
+                if member is None:
+                    continue
+                notifications.append(bot.notify(
+                    member, channel, f"This is a notification that a campaign you’re in has been paused. The channels "
+                                     f"for the campaign will be locked, and the campaign will not hold any sessions "
+                                     f"until it is unpaused. Please reach out to your DM for more information. If you "
+                                     f"wish to leave the campaign at any time, you may do so through the Leave a "
+                                     f"Campaign form found in <#812549890227437588> or <#823698349243760670>. "
+                                     f"Campaign: {campaign_info.name}."))
             dm = channel.guild.get_member(campaign_info.dm)
-            await dm.send(f"This is a notification that your request to pause a campaign has been processed. The "
-                          f"channels will be locked and the players will be notified. To unpause the campaign, please "
-                          f"fill out the same form found in <#823698349243760670> in the Dungeon Masters category. "
-                          f"Campaign: {campaign_info.name}.")
+            notifications.append(bot.notify(
+                dm, channel, f"This is a notification that your request to pause a campaign has been processed. The "
+                             f"channels will be locked and the players will be notified. To unpause the campaign, "
+                             f"please fill out the same form found in <#823698349243760670> in the Dungeon Masters "
+                             f"category. Campaign: {campaign_info.name}."))
+            await asyncio.gather(*notifications)
             await channel.send(f"Campaign {campaign_info.name} paused")
             return True
         else:
@@ -185,23 +194,30 @@ class ActionHandler:
 
     @staticmethod
     async def resume(bot: DNDBot, channel: discord.TextChannel, campaign: int, embed: discord.Embed) -> bool:
-        campaign_info = await bot.CampaignSQLHelper.select_campaign(channel, campaign)
+        campaign_info = await bot.CampaignSQLHelper.select_campaign(campaign)
         category: discord.CategoryChannel = channel.guild.get_channel(campaign_info.category)
         campaign_role = channel.guild.get_role(campaign_info.role)
 
-        commit = await bot.CampaignSQLHelper.resume_campaign(campaign)
+        commit = await bot.CampaignSQLHelper.resume_campaign(campaign_info)
         if commit:
+            await bot.db.commit()
             for i in category.channels:
                 await i.set_permissions(campaign_role, send_messages=True)
-            players = bot.CampaignSQLHelper.get_players(campaign)
+            players = await bot.CampaignSQLHelper.get_players(campaign_info)
+            notifications = []
             for i in players:
-                member = channel.guild.get_member(i)
-                await member.send(f"This is a notification that a campaign you’re in has been resumed. The channels "
-                                  f"for the campaign will be unlocked. Campaign: {campaign_info.name}.")
+                member = channel.guild.get_member(i.id)
+                if member is None:
+                    continue
+                notifications.append(bot.notify(
+                    member, channel, f"This is a notification that a campaign you’re in has been resumed. The channels "
+                                     f"for the campaign will be unlocked. Campaign: {campaign_info.name}."))
             dm = channel.guild.get_member(campaign_info.dm)
-            await dm.send(f"This is a notification that your request to resume a campaign has been processed. The "
-                          f"channels will be unlocked and the players will be notified. "
-                          f"Campaign: {campaign_info.name}.")
+            notifications.append(bot.notify(
+                dm, channel, f"This is a notification that your request to resume a campaign has been processed. The "
+                             f"channels will be unlocked and the players will be notified. "
+                             f"Campaign: {campaign_info.name}."))
+            await asyncio.gather(*notifications)
             return True
         else:
             await channel.send("Failed to resume campaign")
@@ -211,7 +227,7 @@ class ActionHandler:
     async def lock(bot: DNDBot, channel: discord.TextChannel, campaign: int, embed: discord.Embed) -> bool:
         try:
             await bot.CampaignManager.update_lock_status(channel, campaign, 1)
-            campaign_info = await bot.CampaignSQLHelper.select_campaign(channel, campaign)
+            campaign_info = await bot.CampaignSQLHelper.select_campaign(campaign)
             dm = channel.guild.get_member(campaign_info.dm)
             await dm.send(f"This is a notification that your request to lock a campaign has been processed. New "
                           f"players will not be able to apply until the campaign has been unlocked. "
@@ -225,7 +241,7 @@ class ActionHandler:
     async def unlock(bot: DNDBot, channel: discord.TextChannel, campaign: int, embed: discord.Embed) -> bool:
         try:
             await bot.CampaignManager.update_lock_status(channel, campaign, 0)
-            campaign_info = await bot.CampaignSQLHelper.select_campaign(channel, campaign)
+            campaign_info = await bot.CampaignSQLHelper.select_campaign(campaign)
             dm = channel.guild.get_member(campaign_info.dm)
             await dm.send(f"This is a notification that your request to unlock a campaign has been processed. New "
                           f"players will be able to apply for the campaign. Campaign: {campaign_info.name}.")
@@ -238,7 +254,7 @@ class ActionHandler:
     async def update(bot: DNDBot, channel: discord.TextChannel, campaign: int, embed: discord.Embed) -> bool:
         try:
             await bot.CampaignPlayerManager.set_max_player_count(channel, campaign, int(embed.fields[4].value))
-            campaign_info = await bot.CampaignSQLHelper.select_campaign(channel, campaign)
+            campaign_info = await bot.CampaignSQLHelper.select_campaign(campaign)
             dm = channel.guild.get_member(campaign_info.dm)
             await dm.send(f"This is a notification that your request to update the max player count for a campaign has "
                           f"been processed. Campaign: {campaign_info.name}.")
@@ -0,0 +1,78 @@
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+from fastapi import Request
+
+from .encoding import dumps
+
+
+
+class ChangeBroadcaster:
+    """
+    Fans committed campaign changes out to Server-Sent Events subscribers. Every subscriber has a bounded queue; one
+    that falls so far behind that its queue fills up has its backlog dropped and gets a resync event instead, telling
+    it to refetch /campaigns. A slow client never holds up the others or grows memory without bound. Events are sent
+    with their seq as the SSE id, so a reconnecting client can pick up where it left off.
+    """
+
+    def __init__(self, queue_size: int = 256, heartbeat: float = 15, max_subscribers: int = 256):
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self.max_subscribers = max_subscribers
+        self.subscribers: set[asyncio.Queue] = set()
+
+    @property
+    def full(self) -> bool:
+        return len(self.subscribers) >= self.max_subscribers
+
+    def publish(self, events: list[dict]):
+        """
+        Queues events for every subscriber, called by CampaignSQLHelper after each commit
+        """
+        for queue in self.subscribers:
+            for event in events:
+                try:
+                    queue.put_nowait(event)
+                except asyncio.QueueFull:
+                    while not queue.empty():
+                        queue.get_nowait()
+                    queue.put_nowait({"seq": events[-1]["seq"], "change": "resync"})
+                    break
+
+    async def stream(self, request: Request,
+                     backlog: Optional[Callable[[], Awaitable[list[dict]]]] = None) -> AsyncIterator[bytes]:
+        """
+        Yields one subscriber's event stream in SSE format until the client disconnects. Sends a comment every
+        heartbeat seconds while idle, so proxies keep the connection open and dead clients are noticed.
+        :param request: The subscriber's request
+        :param backlog: Reads the events the client missed, sent before any new ones
+        """
+        queue = asyncio.Queue(self.queue_size)
+        # subscribe before reading the backlog, so nothing committed in between is missed
+        self.subscribers.add(queue)
+        try:
+            yield b"retry: 5000\n\n"
+            seq = 0
+            if backlog is not None:
+                for event in await backlog():
+                    seq = event["seq"]
+                    yield self.format(event)
+            while True:
+                try:
+                    event: Optional[dict] = await asyncio.wait_for(queue.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield b": heartbeat\n\n"
+                    continue
+                # already sent as part of the backlog
+                if event["change"] != "resync" and event["seq"] <= seq:
+                    continue
+                yield self.format(event)
+        finally:
+            self.subscribers.discard(queue)
+
+    @staticmethod
+    def format(event: dict) -> bytes:
+        return (b"id: " + str(event["seq"]).encode() + b"\nevent: " + event["change"].encode() + b"\ndata: " +
+                dumps(event) + b"\n\n")
@@ -0,0 +1,166 @@
+import asyncio
+import os
+import pathlib
+import re
+import tempfile
+from email.utils import formatdate, parsedate_to_datetime
+from typing import BinaryIO, Optional
+
+from PIL import Image
+from fastapi import Request, Response, status
+from fastapi.responses import StreamingResponse
+
+from .ResponseCache import ResponseCache
+
+# campaign image names are generated by the website, anything else could be a path
+CID = re.compile(r"[A-Za-z0-9_-]+")
+
+
+class ImageStore:
+    """
+    Serves campaign images from a configurable directory. Files are streamed off the event loop with validators and
+    Cache-Control, so repeat requests can be answered with 304. Smaller widths are resized once and kept in a size
+    capped cache directory, least recently used variants are removed first. Responses stream from a file handle opened
+    before the response starts, so evicting a variant never cuts off a response that is serving it.
+    """
+
+    # requested widths are rounded up to one of these, so the cache can't be filled with every possible width
+    WIDTHS = (160, 320, 640, 1280)
+
+    def __init__(self, root: str, cache_dir: str, cache_size: int = 256 * 1024 * 1024, max_age: int = 3600):
+        self.root = pathlib.Path(root)
+        self.cache_dir = pathlib.Path(cache_dir)
+        self.cache_size = cache_size
+        self.max_age = max_age
+        self.locks: dict[str, asyncio.Lock] = {}
+
+    @classmethod
+    def from_config(cls, config: dict) -> 'ImageStore':
+        return cls(config.get("image_directory", "images"), config.get("image_cache_directory", "images/cache"),
+                   config.get("image_cache_mb", 256) * 1024 * 1024, config.get("image_max_age_s", 3600))
+
+    async def respond(self, cid: str, width: Optional[int], request: Request) -> Response:
+        """
+        Answers an image request
+        :param cid: The image's name, without the extension
+        :param width: The width the client wants, or None for the original
+        :param request: The incoming request, checked for If-None-Match and If-Modified-Since
+        :return: The image, a 304, or a 404
+        """
+        if not CID.fullmatch(cid):
+            return Response(status_code=status.HTTP_404_NOT_FOUND)
+        source = self.root / f"{cid}.png"
+        if width is not None:
+            width = next((i for i in self.WIDTHS if i >= width), None)
+        try:
+            stat = await asyncio.to_thread(os.stat, source)
+        except FileNotFoundError:
+            return Response(status_code=status.HTTP_404_NOT_FOUND)
+
+        # validators come from the original, which every variant is made from and named after, so they stay the same
+        # however often a variant is used or made again
+        suffix = "" if width is None else f"-{width}"
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}{suffix}"'
+        headers = {"ETag": etag, "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+                   "Cache-Control": f"public, max-age={self.max_age}"}
+        if self.not_modified(request, etag, stat.st_mtime):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        try:
+            file = await self.open(source, width)
+        except FileNotFoundError:
+            return Response(status_code=status.HTTP_404_NOT_FOUND)
+        headers["Content-Length"] = str(os.fstat(file.fileno()).st_size)
+        return StreamingResponse(self.stream(file), media_type="image/png", headers=headers)
+
+    async def open(self, source: pathlib.Path, width: Optional[int]) -> BinaryIO:
+        """
+        Opens an image, or its resized copy for a width
+        :param source: The original image
+        :param width: One of WIDTHS, or None for the original
+        :return: The open file
+        """
+        if width is None:
+            return await asyncio.to_thread(open, source, "rb")
+        path = await self.variant(source, width)
+        try:
+            return await asyncio.to_thread(open, path, "rb")
+        except FileNotFoundError:
+            if path == source:
+                raise
+        # another request evicted the copy before it was opened, it is made again
+        return await asyncio.to_thread(open, await self.variant(source, width), "rb")
+
+    @staticmethod
+    async def stream(file: BinaryIO, chunk_size: int = 64 * 1024):
+        try:
+            while chunk := await asyncio.to_thread(file.read, chunk_size):
+                yield chunk
+        finally:
+            file.close()
+
+    async def variant(self, source: pathlib.Path, width: int) -> pathlib.Path:
+        """
+        Finds or makes a resized copy of an image
+        :param source: The original image
+        :param width: The width to resize to
+        :return: The resized copy, or the original if it isn't wider than width
+        """
+        lock = self.locks.setdefault(f"{source.stem}-{width}", asyncio.Lock())
+        # one request resizes, any others for the same variant wait for it instead of doing the work again
+        async with lock:
+            return await asyncio.to_thread(self.__variant, source, width)
+
+    def __variant(self, source: pathlib.Path, width: int) -> pathlib.Path:
+        # the source's mtime is part of the name, so a replaced image never serves an old variant
+        path = self.cache_dir / f"{source.stem}-{width}-{source.stat().st_mtime_ns:x}.png"
+        if path.exists():
+            # the mtime tracks use, eviction goes by it
+            os.utime(path)
+            return path
+        with Image.open(source) as image:
+            if image.width <= width:
+                return source
+            image.thumbnail((width, image.height))
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            fd, temp = tempfile.mkstemp(suffix=".tmp", dir=self.cache_dir)
+            os.close(fd)
+            try:
+                image.save(temp, format="PNG", optimize=True)
+                os.replace(temp, path)
+            except Exception:
+                os.remove(temp)
+                raise
+        self.__evict()
+        return path
+
+    def __evict(self):
+        files = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".png"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(i[1] for i in files)
+        for _, size, path in sorted(files):
+            if total <= self.cache_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                # open files can't be removed on Windows, it goes on a later eviction
+                continue
+            total -= size
+
+    @staticmethod
+    def not_modified(request: Request, etag: str, modified: float) -> bool:
+        # If-None-Match wins over If-Modified-Since when both are sent
+        if request.headers.get("if-none-match") is not None:
+            return ResponseCache.not_modified(request, etag)
+        since = request.headers.get("if-modified-since")
+        if since is None:
+            return False
+        try:
+            return int(modified) <= parsedate_to_datetime(since).timestamp()
+        except (TypeError, ValueError):
+            return False
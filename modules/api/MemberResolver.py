@@ -0,0 +1,56 @@
+import asyncio
+import time
+import traceback
+from typing import Optional
+
+import discord
+
+
+class MemberResolver:
+    """
+    Finds guild members for the API. The bot runs with every intent, so the guild's member cache is complete and almost
+    every lookup is answered from it. Only a cache miss asks Discord, a few requests at a time, and IDs that turn out
+    not to be members are remembered for a while so they don't cost a request each time.
+    """
+
+    def __init__(self, concurrency: int = 2, miss_ttl: float = 300):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.miss_ttl = miss_ttl
+        self.misses: dict[int, float] = {}
+
+    async def resolve(self, guild: discord.Guild, user_id: int) -> Optional[discord.Member]:
+        """
+        Looks up a member of the guild
+        :param guild: The guild
+        :param user_id: The member's ID
+        :return: The member, or None if they aren't in the guild
+        """
+        member = guild.get_member(user_id)
+        if member is not None:
+            return member
+        if self.misses.get(user_id, 0) > time.monotonic():
+            return None
+        async with self.semaphore:
+            # another request may have fetched them while this one waited
+            member = guild.get_member(user_id)
+            if member is None:
+                try:
+                    member = await guild.fetch_member(user_id)
+                except discord.NotFound:
+                    self.__missed(user_id)
+                except discord.HTTPException:
+                    # not a definite answer, so it isn't remembered
+                    traceback.print_exc()
+        return member
+
+    def forget(self, user_id: int):
+        """
+        Drops a remembered miss, e.g. because the user just joined
+        """
+        self.misses.pop(user_id, None)
+
+    def __missed(self, user_id: int):
+        now = time.monotonic()
+        if len(self.misses) >= 4096:
+            self.misses = {i: expiry for i, expiry in self.misses.items() if expiry > now}
+        self.misses[user_id] = now + self.miss_ttl
@@ -1,10 +1,25 @@
 import functools
+import hashlib
 import json
+import time
 from enum import IntEnum
 
 from fastapi import status
 
-from DNDBot import DNDBot
+from .ApiContext import context
+
+# how long a token's permissions are trusted before authorized_users is read again
+TOKEN_TTL = 60
+MAX_CACHED_TOKENS = 1024
+MAX_CACHED_MISSES = 1024
+# sha256 of an authorized token mapped to (permissions, expiry), raw tokens are never kept in memory
+token_cache: dict[bytes, tuple[int, float]] = {}
+# sha256 of unknown tokens mapped to their expiry. Kept apart from token_cache, so a client sending random tokens only
+# ever pushes other unknown tokens out.
+miss_cache: dict[bytes, float] = {}
+# sha256 of every token that was authorized when it was last read, oldest first. Outlives TOKEN_TTL and
+# invalidate_tokens, so the rate limiter can tell a real client whose cache entry ran out from a made up token.
+verified_tokens: dict[bytes, None] = {}
 
 
 def permissions(permissions_value: 'Permissions'):
@@ -12,8 +27,7 @@ def permissions(permissions_value: 'Permissions'):
         @functools.wraps(func)
         async def wrapper_decorator(*args, **kwargs):
             token = kwargs.get("auth", "")
-            permissions_level = check_authorization(token)
-            print(token, permissions_level, permissions_value, permissions_level & permissions_value)
+            permissions_level = await check_authorization(token)
             if permissions_level & permissions_value == 0:
                 response = kwargs.get("response", None)
                 if response is not None:
@@ -36,8 +50,64 @@ class Permissions(IntEnum):
     FULL = 0b11111111
 
 
-def check_authorization(auth: str) -> int:
-    user = DNDBot.instance.db.execute("SELECT * FROM authorized_users WHERE token=?", (auth,)).fetchone()
-    if user is not None:
-        return user["permissions"]
-    return 0
+async def check_authorization(auth: str) -> int:
+    """
+    Looks up the permissions of an API token. Answers from the token cache while the entry is fresh, and recently seen
+    unknown tokens from a smaller cache of their own, so a misconfigured client doesn't reach the database either.
+    :param auth: The token sent with the request
+    :return: The token's permission bits, 0 if it isn't authorized
+    """
+    digest = token_digest(auth)
+    now = time.monotonic()
+    entry = token_cache.get(digest)
+    if entry is not None and entry[1] > now:
+        return entry[0]
+    if miss_cache.get(digest, 0) > now:
+        return 0
+    user = await context.db.fetchone("SELECT * FROM authorized_users WHERE token=?", (auth,))
+    if user is None or user["permissions"] == 0:
+        verified_tokens.pop(digest, None)
+        make_room(miss_cache, MAX_CACHED_MISSES, lambda expiry: expiry <= now)
+        miss_cache[digest] = now + TOKEN_TTL
+        return 0
+    make_room(token_cache, MAX_CACHED_TOKENS, lambda value: value[1] <= now)
+    token_cache[digest] = (user["permissions"], now + TOKEN_TTL)
+    verified_tokens.pop(digest, None)
+    make_room(verified_tokens, MAX_CACHED_TOKENS, lambda value: False)
+    verified_tokens[digest] = None
+    return user["permissions"]
+
+
+def token_digest(auth: str) -> bytes:
+    return hashlib.sha256(auth.encode()).digest()
+
+
+def is_verified(digest: bytes) -> bool:
+    """
+    Whether a token was authorized the last time it was read from the database, however long ago that was, unless it
+    has since been found to be unknown. Never reads the database itself.
+    :param digest: The token's token_digest
+    """
+    return digest in verified_tokens and miss_cache.get(digest, 0) <= time.monotonic()
+
+
+def make_room(cache: dict, size: int, expired):
+    """
+    Drops expired entries from a full cache, then the oldest ones if it is still full
+    """
+    if len(cache) < size:
+        return
+    for key in [key for key, value in cache.items() if expired(value)]:
+        del cache[key]
+    while len(cache) >= size:
+        del cache[next(iter(cache))]
+
+
+def invalidate_tokens():
+    """
+    Forgets every cached token, call after changing authorized_users so the change applies immediately. Only this
+    process's cache is cleared, API worker processes pick the change up within TOKEN_TTL. verified_tokens is kept,
+    revoked tokens are dropped from it when they are next read.
+    """
+    token_cache.clear()
+    miss_cache.clear()
@@ -0,0 +1,138 @@
+import asyncio
+import functools
+import json
+import math
+import time
+from enum import StrEnum
+from typing import Optional
+
+from fastapi import Response, status
+
+from .ApiContext import context
+from .Permissions import is_verified, token_digest
+
+# how often buckets that refilled completely are dropped
+SWEEP_INTERVAL = 60
+
+
+class RouteClass(StrEnum):
+    READ = "read"
+    WRITE = "write"
+    BULK = "bulk"
+
+
+class TokenBucket:
+    """
+    Allows rate requests per second on average, with bursts of up to capacity
+    """
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def take(self, now: float) -> float:
+        """
+        Takes a token if there is one
+        :return: 0 if a token was taken, otherwise how many seconds until one is available
+        """
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def idle(self, now: float) -> bool:
+        return self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+
+class RateLimiter:
+    """
+    Keeps API traffic from starving the Discord client, which shares its event loop. Every verified token gets a
+    token bucket, and every route class a limit on the requests it has in flight. Tokens that were never verified all
+    share one bucket, so made up tokens never get around the limit, and never use up a real client's requests even
+    once its cached permissions have expired. Requests over either limit are answered with 429 and Retry-After
+    instead of queueing up without bound.
+    """
+
+    def __init__(self, rate: float = 10, burst: float = 40, concurrency: Optional[dict[RouteClass, int]] = None,
+                 queue_timeout: float = 2):
+        self.rate = rate
+        self.burst = burst
+        self.queue_timeout = queue_timeout
+        concurrency = concurrency or {}
+        self.semaphores = {i: asyncio.Semaphore(concurrency.get(i, 4)) for i in RouteClass}
+        # keyed by the token's digest, like the token cache in Permissions, so only authorized tokens get a bucket
+        self.buckets: dict[bytes, TokenBucket] = {}
+        self.unverified = TokenBucket(rate, burst, time.monotonic())
+        self.swept = time.monotonic()
+
+    @classmethod
+    def from_config(cls, config: dict) -> 'RateLimiter':
+        return cls(config.get("api_rate_per_second", 10), config.get("api_rate_burst", 40),
+                   {RouteClass.READ: config.get("api_read_concurrency", 16),
+                    RouteClass.WRITE: config.get("api_write_concurrency", 4),
+                    RouteClass.BULK: config.get("api_bulk_concurrency", 2)},
+                   config.get("api_queue_timeout_s", 2))
+
+    def check_rate(self, token: str) -> float:
+        """
+        Charges a request to a token's bucket
+        :param token: The auth token of the request
+        :return: 0 if the request may go ahead, otherwise the seconds to wait before retrying
+        """
+        now = time.monotonic()
+        if now - self.swept >= SWEEP_INTERVAL:
+            # full buckets hold no state worth keeping
+            self.buckets = {i: bucket for i, bucket in self.buckets.items() if not bucket.idle(now)}
+            self.swept = now
+        key = token_digest(token)
+        if not is_verified(key):
+            # the database is only read by @permissions, once this lets the request through
+            return self.unverified.take(now)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket(self.rate, self.burst, now)
+        return bucket.take(now)
+
+
+limiter: Optional[RateLimiter] = None
+
+
+def rate_limited(route_class: RouteClass):
+    """
+    Applies the API rate limits to an endpoint, goes above @permissions so rejected requests cost nothing else
+    :param route_class: Which concurrency limit the endpoint counts towards
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper_decorator(*args, **kwargs):
+            global limiter
+            if limiter is None:
+                limiter = RateLimiter.from_config(context.config)
+            response: Optional[Response] = kwargs.get("response", None)
+            wait = limiter.check_rate(kwargs.get("auth", ""))
+            if wait > 0:
+                return too_many_requests(response, wait)
+            semaphore = limiter.semaphores[route_class]
+            try:
+                await asyncio.wait_for(semaphore.acquire(), limiter.queue_timeout)
+            except asyncio.TimeoutError:
+                return too_many_requests(response, 1)
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                semaphore.release()
+
+        return wrapper_decorator
+    return decorator
+
+
+def too_many_requests(response: Optional[Response], wait: float) -> str:
+    if response is not None:
+        response.status_code = status.HTTP_429_TOO_MANY_REQUESTS
+        response.headers["Retry-After"] = str(math.ceil(wait))
+    return json.dumps({"error": "Too many requests"})
@@ -0,0 +1,94 @@
+import hashlib
+from collections import OrderedDict
+from typing import Awaitable, Callable, Hashable, Optional, Union
+
+from fastapi import Request, Response, status
+
+
+class ResponseCache:
+    """
+    Remembers the serialized body of API responses along with the version they were built under. Versions are made
+    from CampaignSQLHelper's counters, so a matching version means nothing the response depends on has been written
+    since. The ETag sent to clients is a hash of the body instead, since the counters are per process and every API
+    worker has to hand out the same ETag for the same body. Least recently used entries are dropped once the cache is
+    full. Also keeps serialized fragments, like a single campaign inside a listing, so a response only re-encodes the
+    parts that changed.
+    """
+
+    def __init__(self, size: int = 256):
+        self.size = size
+        # key mapped to (version, body, ETag, headers set while building the body)
+        self.entries: OrderedDict[Hashable, tuple[str, bytes, str, tuple[tuple[str, str], ...]]] = OrderedDict()
+        self.fragments: dict[Hashable, tuple[int, bytes]] = {}
+
+    def get(self, key: Hashable, version: str) -> Optional[tuple[bytes, str, tuple[tuple[str, str], ...]]]:
+        """
+        :return: The body, its ETag and the headers set while building it, if it was built under version
+        """
+        entry = self.entries.get(key)
+        if entry is None or entry[0] != version:
+            return None
+        self.entries.move_to_end(key)
+        return entry[1:]
+
+    def put(self, key: Hashable, version: str, body: bytes, etag: str, headers: tuple[tuple[str, str], ...] = ()):
+        self.entries[key] = (version, body, etag, headers)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def get_fragment(self, key: Hashable, version: int) -> Optional[bytes]:
+        entry = self.fragments.get(key)
+        if entry is None or entry[0] != version:
+            return None
+        return entry[1]
+
+    def put_fragment(self, key: Hashable, version: int, fragment: bytes):
+        self.fragments[key] = (version, fragment)
+
+    def clear(self):
+        self.entries.clear()
+        self.fragments.clear()
+
+    async def respond(self, key: Hashable, version: str, request: Request, response: Response,
+                      build: Callable[[], Awaitable[bytes]]) -> Union[bytes, Response]:
+        """
+        Answers a conditional GET. Returns 304 if the client already has the current body, the cached body if the
+        server has one for this version, and only calls build otherwise. Headers build sets on the response, like a
+        next page cursor, are cached along with the body, and every header on the response is kept on a 304.
+        :param key: Identifies the response, e.g. the route and its arguments
+        :param version: The current version of everything the response depends on
+        :param request: The incoming request, checked for If-None-Match
+        :param response: The outgoing response, gets the ETag header
+        :param build: Builds the body when nothing usable is cached
+        :return: The body, or a 304 response
+        """
+        cached = self.get(key, version)
+        if cached is None:
+            before = dict(response.headers.items())
+            body = await build()
+            # errors aren't cached or tagged, the next request should try again
+            if response.status_code is not None and response.status_code != status.HTTP_200_OK:
+                return body
+            etag = self.etag(body)
+            self.put(key, version, body, etag,
+                     tuple((k, v) for k, v in response.headers.items() if before.get(k) != v))
+        else:
+            body, etag, headers = cached
+            for name, value in headers:
+                response.headers[name] = value
+        response.headers["ETag"] = etag
+        if self.not_modified(request, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=dict(response.headers.items()))
+        return body
+
+    @staticmethod
+    def etag(body: bytes) -> str:
+        return f'"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+
+    @staticmethod
+    def not_modified(request: Request, etag: str) -> bool:
+        header = request.headers.get("if-none-match")
+        if header is None:
+            return False
+        return header.strip() == "*" or etag in (i.strip() for i in header.split(","))
@@ -1,228 +1,402 @@
+import asyncio
 import datetime
+import functools
 import json
+import traceback
 import typing
 
+import logging
+
 import discord
-from fastapi import Response, status, APIRouter
+from fastapi import Request, Response, status, APIRouter
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, StreamingResponse
 
 from DNDBot import DNDBot
 from modules.api.Permissions import permissions, Permissions
+from .ApiContext import context
+from .BotBridge import MemberInfo
 from .CampaignActionHandler import ActionEmbedCreator
+from .ChangeBroadcaster import ChangeBroadcaster
+from .ImageStore import ImageStore
+from .RateLimiter import RouteClass, rate_limited
+from .ResponseCache import ResponseCache
+from .encoding import JSON_MEDIA_TYPE, dumps, join
 from .returned_structs import UserInfo
 from .structs import CampaignApplication, PartialCampaignInfo, CampaignActionRequest, UserUpdateRequest, \
-    UserUpdateManyRequest
-from .. import CampaignInfo
+    UserUpdateManyRequest, CampaignFetchMany, UserFetchMany
+from .. import CampaignInfo, UserProfile
+from ..CampaignInfo import FIELDS
 
+# v1 routes send their JSON encoded a second time as a JSON string, which is what the website was written against.
+# v2 serves the same endpoints as plain JSON.
 router = APIRouter()
+router_v2 = APIRouter(prefix="/v2")
+response_cache = ResponseCache()
+broadcaster = ChangeBroadcaster()
 # noinspection PyTypeChecker
-guild: discord.Guild = None
-
-
-def init_guild():
-    global guild
-    if guild is None:
-        guild = DNDBot.instance.get_guild(DNDBot.instance.config["server"])
-
-
-async def get_user_helper(user_id: int) -> (str, int):
-    user = await guild.fetch_member(user_id)
-    user_info = DNDBot.instance.db.execute("SELECT * FROM users WHERE id = ?", (user_id,)).fetchone()
-    if user_info is None:
-        user_info = {"first_name": "", "last_name": "", "unt_email": "", "unt_student": 0, "playstyle": ""}
-
-    resp = UserInfo()
-    resp.id = user.id
-    resp.name = user.name
-    resp.discriminator = user.discriminator
-    resp.nickname = user.display_name
-    resp.campaigns_player = []
-    resp.campaigns_dm = []
-    resp.warnings = {}
-    resp.first_name = user_info["first_name"]
-    resp.last_name = user_info["last_name"]
-    resp.unt_email = user_info["unt_email"]
-    resp.unt_student = bool(user_info["unt_student"])
-    resp.playstyle = user_info["playstyle"]
-
-    res = DNDBot.instance.db.execute("select id, reason from warns where member = ?", (user.id,)).fetchall()
-    for i in res:
-        # resp["warnings"][str(i["id"])] = i["reason"]
-        resp.warnings[i["id"]] = i["reason"]
-
-    if user is None:
-        user = DNDBot.instance.get_user(user_id)
-        if user is None:
-            return json.dumps({"error": "User not found"}), 404
-
-        return json.dumps(resp.__dict__)
-        # resp = {"id": user.id, "name": user.name, "discriminator": user.discriminator, "nickname": user.display_name,
-        #         "in_discord": False, "officer": False, "developer": False, "verified": False, "guest": False,
-        #         "player": False, "dm": False, "banned_player": False, "banned_dm": False, "joined": "",
-        #         "campaigns_player": [], "campaigns_dm": [], "warnings": {}, "first_name": user_info["first_name"],
-        #         "last_name": user_info["last_name"], "unt_email": user_info["unt_email"],
-        #         "unt_student": bool(user_info["unt_student"]),
-        #         "playstyle": user_info["playstyle"], user_info["bio"]: "", user_info["pronouns"]: "",
-        #         user_info["image"]: "", user_info["position"]: ""
-        #         }
-        # return json.dumps(resp)
-
-    officer_role = guild.get_role(DNDBot.instance.config["officer_role"])
-    developer_role = guild.get_role(DNDBot.instance.config["developer_role"])
-    verified_role = guild.get_role(DNDBot.instance.config["verified_role"])
-    guest_role = guild.get_role(DNDBot.instance.config["guest_role"])
-    player_role = guild.get_role(DNDBot.instance.config["member_role"])
-    dm_role = guild.get_role(DNDBot.instance.config["dm_role"])
-    banned_player_role = guild.get_role(DNDBot.instance.config["banned_player_role"])
-    banned_dm_role = guild.get_role(DNDBot.instance.config["banned_dm_role"])
-
-    resp.in_discord = True
-    resp.officer = officer_role in user.roles
-    resp.developer = developer_role in user.roles
-    resp.verified = verified_role in user.roles
-    resp.guest = guest_role in user.roles
-    resp.player = player_role in user.roles
-    resp.dm = dm_role in user.roles
-    resp.banned_player = banned_player_role in user.roles
-    resp.banned_dm = banned_dm_role in user.roles
-    resp.joined = user.joined_at.isoformat()
-
-    # resp = {"id": user.id, "name": user.name, "discriminator": user.discriminator, "nickname": user.display_name,
-    #         "in_discord": True, "officer": officer_role in user.roles, "developer": developer_role in user.roles,
-    #         "verified": verified_role in user.roles, "guest": guest_role in user.roles,
-    #         "player": player_role in user.roles, "dm": dm_role in user.roles,
-    #         "banned_player": banned_player_role in user.roles, "banned_dm": banned_dm_role in user.roles,
-    #         "joined": user.joined_at.isoformat(), "campaigns_player": [], "campaigns_dm": [], "warnings": {},
-    #         "first_name": user_info["first_name"],
-    #         "last_name": user_info["last_name"], "unt_email": user_info["unt_email"],
-    #         "unt_student": bool(user_info["unt_student"]), "playstyle": user_info["playstyle"]}
-
-    res = DNDBot.instance.db.execute("select * from campaigns where dm = ?", (user.id,)).fetchall()
-    for i in res:
-        # resp["campaigns_dm"].append(i["id"])
-        resp.campaigns_dm.append(i["id"])
-    res = DNDBot.instance.db.execute("select * from players where id = ? and waitlisted = 0", (user.id,)).fetchall()
-    for i in res:
-        # resp["campaigns_player"].append(i["campaign"])
-        resp.campaigns_player.append(i["campaign"])
-
-    return json.dumps(resp.__dict__), 200
-
-
-@router.get("/images/{cid}")
-async def get_image(cid: str):
-    with open(f"/home/ryan/Development/CAGBot/images/{cid}.png", "rb") as file:
-        return Response(file.read(), media_type="image/png")
-
-
-@router.get("/campaigns")
-@permissions(Permissions.CAMPAIGN_READ)
-async def get_campaigns(auth: str, response: Response):
-    init_guild()
-    campaigns = DNDBot.instance.CampaignSQLHelper.get_campaigns()
-    for val in campaigns:
-        dm = guild.get_member(val["dm"])
-        if dm is None:
-            val["dm_username"] = "Unknown"
-            val["dm_nickname"] = "Unknown"
+image_store: ImageStore = None
+# fields campaign_helper adds on top of the campaign's columns
+CAMPAIGN_EXTRA_FIELDS = ("players", "waitlist", "dm_username", "dm_nickname", "date_created")
+MAX_PAGE_SIZE = 100
+MAX_USERS_PER_REQUEST = 250
+MAX_CAMPAIGNS_PER_REQUEST = 250
+MAX_USER_UPDATES = 1000
+MAX_CHANGES = 1000
+# UserInfo flags mapped to the config key of the role they check for
+USER_ROLES = {"officer": "officer_role", "developer": "developer_role", "verified": "verified_role",
+              "guest": "guest_role", "player": "member_role", "dm": "dm_role", "banned_player": "banned_player_role",
+              "banned_dm": "banned_dm_role"}
+
+
+def route(method: str, path: str):
+    """
+    Registers an endpoint under both API versions. Endpoints return their body already serialized by dumps, so it is
+    only encoded once, or a Response which both versions pass through untouched.
+    :param method: The HTTP method
+    :param path: The path, without the version prefix
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def v1(*args, **kwargs):
+            ret = await func(*args, **kwargs)
+            return ret.decode() if isinstance(ret, bytes) else ret
+
+        @functools.wraps(func)
+        async def v2(*args, **kwargs):
+            ret = await func(*args, **kwargs)
+            if isinstance(ret, str):
+                ret = ret.encode()
+            if not isinstance(ret, bytes):
+                return ret
+            # a returned Response replaces the injected one, so carry over what the endpoint set on it
+            response: Response = kwargs["response"]
+            resp = Response(ret, status_code=response.status_code or status.HTTP_200_OK, media_type=JSON_MEDIA_TYPE)
+            resp.headers.update(response.headers)
+            return resp
+
+        router.add_api_route(path, v1, methods=[method])
+        router_v2.add_api_route(path, v2, methods=[method])
+        return func
+    return decorator
+
+
+async def validation_exception_handler(request: Request, exc: RequestValidationError):
+    # exc_str = f'{exc}'.replace('\n', ' ').replace('   ', ' ')
+    logging.error(f"{request}: {str(exc)}")
+    content = {'status_code': 10422, 'message': str(exc), 'data': None}
+    return JSONResponse(content=content, status_code=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+
+async def get_user_helper(user_id: int) -> (bytes, int):
+    users = await get_users_helper([user_id])
+    if user_id not in users:
+        return dumps({"error": "User not found"}), 404
+    return dumps(users[user_id].__dict__), 200
+
+
+async def get_users_helper(user_ids: list[int]) -> dict[int, UserInfo]:
+    """
+    Builds the API's view of many users at once. Members come from the member directory, any misses are fetched
+    concurrently, and the users, warns, campaigns and players rows for every user are read with one query per table.
+    :param user_ids: The users' IDs
+    :return: User ID mapped to the user, users that can't be found at all are left out
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    members = await asyncio.gather(*(context.bridge.resolve(i) for i in user_ids))
+    users: dict[int, MemberInfo] = {user_id: user for user_id, user in zip(user_ids, members) if user is not None}
+    if not users:
+        return {}
+    ids = json.dumps(list(users))
+
+    profiles = {}
+    for profile in await context.db.fetchall_as(UserProfile, "SELECT * FROM users WHERE id IN "
+                                                             "(SELECT value FROM json_each(?))", (ids,)):
+        profiles.setdefault(profile.id, profile)
+    # warnings, DM campaigns and player campaigns in one round trip, each part searches its own index
+    rows = await context.db.fetchall(
+        "SELECT 'warn' AS kind, member AS user, id, reason FROM warns WHERE member IN (SELECT value FROM json_each(?)) "
+        "UNION ALL SELECT 'dm', dm, id, NULL FROM campaigns WHERE dm IN (SELECT value FROM json_each(?)) "
+        "UNION ALL SELECT 'player', id, campaign, NULL FROM players WHERE id IN (SELECT value FROM json_each(?)) "
+        "AND waitlisted = 0", (ids,) * 3)
+
+    roles = {field: context.config[key] for field, key in USER_ROLES.items()}
+    resp = {}
+    for user_id, user in users.items():
+        user_info = profiles.get(user_id) or UserProfile()
+        info = UserInfo()
+        info.id = user.id
+        info.name = user.name
+        info.discriminator = user.discriminator
+        info.nickname = user.display_name
+        info.campaigns_player = []
+        info.campaigns_dm = []
+        info.warnings = {}
+        info.first_name = user_info.first_name
+        info.last_name = user_info.last_name
+        info.unt_email = user_info.unt_email
+        info.unt_student = bool(user_info.unt_student)
+        info.playstyle = user_info.playstyle
+        if user.in_guild:
+            info.in_discord = True
+            for field, role in roles.items():
+                setattr(info, field, role in user.roles)
+            info.joined = user.joined
+        resp[user_id] = info
+    for i in rows:
+        info = resp[i["user"]]
+        if i["kind"] == "warn":
+            info.warnings[i["id"]] = i["reason"]
+        elif i["kind"] == "dm":
+            info.campaigns_dm.append(i["id"])
         else:
-            val["dm_username"] = dm.name
-            val["dm_nickname"] = dm.display_name
-        players = DNDBot.instance.db.execute(f"SELECT * FROM players WHERE campaign = ?",
-                                             (val["id"],)).fetchall()
-        val["players"] = [i["id"] for i in players if i["waitlisted"] == 0]
-        val["waitlist"] = [i["id"] for i in players if i["waitlisted"] == 1]
-        val["date_created"] = val["timestamp"]
-    return json.dumps(campaigns)
+            info.campaigns_player.append(i["id"])
+    return resp
+
+
+@route("GET", "/images/{cid}")
+async def get_image(cid: str, request: Request, w: typing.Optional[int] = None):
+    global image_store
+    if image_store is None:
+        image_store = ImageStore.from_config(context.config)
+    return await image_store.respond(cid, w, request)
 
 
-@router.get("/campaigns/getmany/{id_list}")
+def global_version() -> str:
+    """
+    Version of responses that may include any campaign, it changes whenever any campaign does
+    """
+    return str(context.campaigns.version)
+
+
+def campaign_helper(campaign: dict, rosters: dict[int, tuple[list[int], list[int]]]) -> dict:
+    """
+    Fills in the fields the website expects on top of a campaign row
+    :param campaign: The campaign row, changed in place
+    :param rosters: Player and waitlist IDs by campaign, as returned by CampaignSQLHelper.get_rosters
+    :return: The campaign row
+    """
+    campaign["players"], campaign["waitlist"] = rosters.get(campaign["id"], ([], []))
+    dm = context.bridge.get_member(campaign["dm"])
+    if dm is None:
+        campaign["dm_username"] = "Unknown"
+        campaign["dm_nickname"] = "Unknown"
+    else:
+        campaign["dm_username"] = dm.name
+        campaign["dm_nickname"] = dm.display_name
+    campaign["date_created"] = campaign["timestamp"]
+    return campaign
+
+
+async def campaign_fragments(campaigns: list[dict]) -> list[bytes]:
+    """
+    Serializes campaigns for the API, reusing the encoding of every campaign that hasn't changed since it was last
+    served. Only the changed campaigns have their rosters read.
+    :param campaigns: The campaign rows
+    :return: Each campaign's JSON, in the same order
+    """
+    helper = context.campaigns
+    # the version is read before the data, so a write racing with the build leaves the fragment stale, not wrong
+    versions = [helper.campaign_version(i["id"]) for i in campaigns]
+    fragments = [response_cache.get_fragment(i["id"], version) for i, version in zip(campaigns, versions)]
+    stale = [i["id"] for i, fragment in zip(campaigns, fragments) if fragment is None]
+    if stale:
+        rosters = await helper.get_rosters(stale)
+        for index, campaign in enumerate(campaigns):
+            if fragments[index] is None:
+                fragments[index] = dumps(campaign_helper(campaign, rosters))
+                response_cache.put_fragment(campaign["id"], versions[index], fragments[index])
+    return fragments
+
+
+@route("GET", "/campaigns")
+@rate_limited(RouteClass.READ)
 @permissions(Permissions.CAMPAIGN_READ)
-async def get_many_campaign(id_list: str, auth: str, response: Response):
-    init_guild()
+async def get_campaigns(auth: str, request: Request, response: Response, limit: typing.Optional[int] = None,
+                        after_id: int = 0, system: typing.Optional[str] = None, location: typing.Optional[str] = None,
+                        meeting_day: typing.Optional[str] = None, locked: typing.Optional[bool] = None,
+                        paused: typing.Optional[bool] = None, new_player_friendly: typing.Optional[str] = None,
+                        fields: typing.Optional[str] = None):
+    """
+    Lists campaigns in ID order. With limit, at most that many are returned and the X-Next-Cursor header holds the
+    after_id of the next page, if there is one. The other parameters filter on the column of the same name, and fields
+    is a comma separated list of the fields to return.
+    """
+    filters = {"system": system, "location": location, "meeting_day": meeting_day, "locked": locked,
+               "paused": paused, "new_player_friendly": new_player_friendly}
+    filters = {field: value for field, value in filters.items() if value is not None}
+    if limit is None and after_id == 0 and not filters and fields is None:
+        async def build():
+            # campaigns come from the registry, so the listing costs at most one players query
+            return join(await campaign_fragments(await context.campaigns.get_campaigns()))
+
+        return await response_cache.respond("campaigns", global_version(), request, response, build)
+
+    if limit is not None and limit < 1:
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return dumps({"error": "limit must be at least 1."})
+    projection = None
+    if fields is not None:
+        # the ID is always included, clients need it to ask for the next page
+        projection = ["id"] + [i for i in dict.fromkeys(i.strip() for i in fields.split(",")) if i and i != "id"]
+        unknown = [i for i in projection if i not in FIELDS and i not in CAMPAIGN_EXTRA_FIELDS]
+        if unknown:
+            response.status_code = status.HTTP_400_BAD_REQUEST
+            return dumps({"error": f"Unknown fields: {', '.join(unknown)}"})
+
+    version = global_version()
+    limit = None if limit is None else min(limit, MAX_PAGE_SIZE)
+
+    async def build_page():
+        # only queried when the page isn't cached, the cursor header is cached along with the body. One extra
+        # campaign tells whether there is a next page.
+        campaigns = await context.campaigns.get_campaign_page(after_id, None if limit is None else limit + 1, filters)
+        if limit is not None and len(campaigns) > limit:
+            campaigns = campaigns[:limit]
+            response.headers["X-Next-Cursor"] = str(campaigns[-1].id)
+        rows = [i.to_dict() for i in campaigns]
+        if projection is None:
+            return join(await campaign_fragments(rows))
+        rosters = {}
+        if rows and ("players" in projection or "waitlist" in projection):
+            rosters = await context.campaigns.get_rosters([i["id"] for i in rows])
+        return dumps([{field: campaign[field] for field in projection}
+                      for campaign in (campaign_helper(i, rosters) for i in rows)])
+
+    key = ("campaigns", after_id, limit, tuple(sorted(filters.items())), projection and tuple(projection))
+    return await response_cache.respond(key, version, request, response, build_page)
+
+
+@route("GET", "/campaigns/getmany/{id_list}")
+@rate_limited(RouteClass.BULK)
+@permissions(Permissions.CAMPAIGN_READ)
+async def get_many_campaign(id_list: str, auth: str, request: Request, response: Response):
     if '[' in id_list:
         id_list = id_list[1:-1]
     try:
         campaign_ids = [int(i) for i in id_list.split(",")]
     except ValueError:
         response.status_code = status.HTTP_400_BAD_REQUEST
-        return json.dumps({"error": "IDs must be valid integers."})
-    campaigns = []
+        return dumps({"error": "IDs must be valid integers."})
+    if len(campaign_ids) > MAX_CAMPAIGNS_PER_REQUEST:
+        return too_many_campaigns(response)
+    return await response_cache.respond(("getmany", tuple(campaign_ids)), global_version(), request, response,
+                                        lambda: get_many_campaign_helper(campaign_ids, response))
+
+
+@route("POST", "/campaigns/getmany")
+@rate_limited(RouteClass.BULK)
+@permissions(Permissions.CAMPAIGN_READ)
+async def post_many_campaign(auth: str, request: CampaignFetchMany, http_request: Request, response: Response):
+    if len(request.campaign_ids) > MAX_CAMPAIGNS_PER_REQUEST:
+        return too_many_campaigns(response)
+    return await response_cache.respond(("getmany", tuple(request.campaign_ids)), global_version(), http_request,
+                                        response, lambda: get_many_campaign_helper(request.campaign_ids, response))
+
+
+def too_many_campaigns(response: Response) -> bytes:
+    # checked before the response cache, so oversized requests never become cache keys
+    response.status_code = status.HTTP_400_BAD_REQUEST
+    return dumps({"error": f"At most {MAX_CAMPAIGNS_PER_REQUEST} campaigns can be requested at once."})
+
+
+async def get_many_campaign_helper(campaign_ids: list[int], response: Response) -> bytes:
+    campaigns = await context.campaigns.select_campaigns(campaign_ids)
     for campaign_id in campaign_ids:
-        resp = DNDBot.instance.db.execute(f"SELECT * FROM campaigns WHERE id = {campaign_id}").fetchone()
-        if resp is None:
+        if campaign_id not in campaigns:
             response.status_code = status.HTTP_404_NOT_FOUND
-            return json.dumps({"error": f"Campaign {campaign_id} not found"})
-        players = DNDBot.instance.db.execute(f"SELECT * FROM players WHERE campaign = ?", (resp["id"],)).fetchall()
-        resp["players"] = [i["id"] for i in players if i["waitlisted"] == 0]
-        resp["waitlist"] = [i["id"] for i in players if i["waitlisted"] == 1]
-        dm = guild.get_member(resp["dm"])
-        if dm is None:
-            resp["dm_username"] = "Unknown"
-            resp["dm_nickname"] = "Unknown"
-        else:
-            resp["dm_username"] = dm.name
-            resp["dm_nickname"] = dm.display_name
-        resp["new_player_friendly"] = resp["new_player_friendly"]
-        resp["date_created"] = resp["timestamp"]
-        campaigns.append(resp)
-    return json.dumps(campaigns)
+            return dumps({"error": f"Campaign {campaign_id} not found"})
+    return join(await campaign_fragments([campaigns[i].to_dict() for i in campaign_ids]))
+
+
+@route("GET", "/campaigns/events")
+@rate_limited(RouteClass.READ)
+@permissions(Permissions.CAMPAIGN_READ)
+async def campaign_events(auth: str, request: Request, response: Response):
+    """
+    Server-Sent Events stream of committed campaign changes, see CampaignSQLHelper.add_change_listener for the events
+    """
+    helper = context.campaigns
+    if broadcaster.publish not in helper.change_listeners:
+        helper.add_change_listener(broadcaster.publish)
+    if broadcaster.full:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return dumps({"error": "Too many subscribers"})
+    backlog = None
+    last_event_id = request.headers.get("last-event-id", "")
+    if last_event_id.isdigit():
+        async def backlog():
+            # a reconnecting client gets what it missed, or a resync if that is more than a page of the log
+            events = await helper.get_changes(int(last_event_id), MAX_CHANGES + 1)
+            if len(events) > MAX_CHANGES:
+                return [{"seq": max(events[-1]["seq"], helper.published_seq), "change": "resync"}]
+            return [helper.describe_change(i) for i in events]
+    return StreamingResponse(broadcaster.stream(request, backlog), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@route("GET", "/changes")
+@rate_limited(RouteClass.READ)
+@permissions(Permissions.CAMPAIGN_READ)
+async def get_changes(auth: str, response: Response, since: int = 0, limit: int = MAX_CHANGES):
+    """
+    Reads the campaign event log after a cursor. Start from 0, then pass the returned cursor as since until more is
+    false. Each event has its seq, the campaign's id, the change (created, updated, players or deleted) and its time.
+    """
+    if limit < 1:
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return dumps({"error": "limit must be at least 1."})
+    limit = min(limit, MAX_CHANGES)
+    events = await context.campaigns.get_changes(since, limit + 1)
+    more = len(events) > limit
+    events = events[:limit]
+    return dumps({"events": events, "cursor": events[-1]["seq"] if events else since, "more": more})
 
 
-@router.get("/campaigns/{campaign_id}")
+@route("GET", "/campaigns/{campaign_id}")
+@rate_limited(RouteClass.READ)
 @permissions(Permissions.CAMPAIGN_READ)
-async def get_campaign(campaign_id: typing.Union[int, str], auth: str, response: Response):
-    init_guild()
+async def get_campaign(campaign_id: typing.Union[int, str], auth: str, request: Request, response: Response):
     try:
         campaign_id = int(campaign_id)
     except ValueError:
         pass
-    try:
-        if isinstance(campaign_id, int):
-            resp = DNDBot.instance.db.execute(f"SELECT * FROM campaigns WHERE id = {campaign_id}").fetchone()
-        else:
-            resp = DNDBot.instance.db.execute(f"SELECT * FROM campaigns WHERE name LIKE ?", (campaign_id,)).fetchone()
-
-        players = DNDBot.instance.db.execute(f"SELECT * FROM players WHERE campaign = ?", (resp["id"],)).fetchall()
-        resp["players"] = [i["id"] for i in players if i["waitlisted"] == 0]
-        resp["waitlist"] = [i["id"] for i in players if i["waitlisted"] == 1]
-    except TypeError:
+    resp = await context.campaigns.select_campaign_row(campaign_id)
+    if resp is None:
         response.status_code = status.HTTP_404_NOT_FOUND
-        return json.dumps({"error": "Campaign not found"})
-    dm = guild.get_member(resp["dm"])
-    if dm is None:
-        resp["dm_username"] = "Unknown"
-        resp["dm_nickname"] = "Unknown"
-    else:
-        resp["dm_username"] = dm.name
-        resp["dm_nickname"] = dm.display_name
-    resp["new_player_friendly"] = resp["new_player_friendly"]
-    resp["date_created"] = resp["timestamp"]
-    return json.dumps(resp)
+        return dumps({"error": "Campaign not found"})
 
+    async def build():
+        return (await campaign_fragments([resp]))[0]
 
-@router.get("/campaigns/{campaign_id}/players")
+    version = str(context.campaigns.campaign_version(resp["id"]))
+    return await response_cache.respond(("campaign", resp["id"]), version, request, response, build)
+
+
+@route("GET", "/campaigns/{campaign_id}/players")
+@rate_limited(RouteClass.READ)
 @permissions(Permissions.USER_READ)
 async def get_players(campaign_id: typing.Union[int, str], auth: str, response: Response):
     try:
         campaign_id = int(campaign_id)
     except ValueError:
         pass
-    campaign = DNDBot.instance.CampaignSQLHelper.select_campaign(campaign_id)
+    campaign = await context.campaigns.select_campaign(campaign_id)
     if campaign is None:
         response.status_code = status.HTTP_404_NOT_FOUND
-        return json.dumps({"error": "Campaign not found"})
-    resp = DNDBot.instance.CampaignSQLHelper.get_players(campaign)
+        return dumps({"error": "Campaign not found"})
+    resp = await context.campaigns.get_players(campaign)
 
-    return json.dumps(resp)
+    return dumps([{"id": i.id} for i in resp])
 
 
-@router.post("/campaigns/create")
+@route("POST", "/campaigns/create")
+@rate_limited(RouteClass.WRITE)
 @permissions(Permissions.CAMPAIGN_CREATE)
 async def create_campaign(auth: str, campaign: PartialCampaignInfo, response: Response):
-    init_guild()
     if not campaign.meeting_date and not campaign.meeting_day:
         response.status_code = status.HTTP_400_BAD_REQUEST
-        return json.dumps({"error": "Meeting date or day must be specified"})
+        return dumps({"error": "Meeting date or day must be specified"})
     embed = discord.Embed(
         title="New Campaign Sign-Up! (Website)",
     )
@@ -248,46 +422,39 @@ async def create_campaign(auth: str, campaign: PartialCampaignInfo, response: Re
     embed.add_field(name="Max Players", value=campaign.max_players, inline=True)
     embed.add_field(name="New Player Friendly", value=campaign.new_player_friendly, inline=True)
 
-    channel = DNDBot.instance.get_channel(DNDBot.instance.config["dm_receipts"])
-    DNDBot.instance.db.execute("UPDATE users SET playstyle = ? WHERE id = ?",
-                               (campaign.playstyle, campaign.dm.discord_id))
-    DNDBot.instance.connection.commit()
-    message = await channel.send(embed=embed)
-    if not message:
+    await context.db.execute("UPDATE users SET playstyle = ? WHERE id = ?",
+                             (campaign.playstyle, campaign.dm.discord_id))
+    await context.db.commit()
+    if not await context.bridge.send_embed(context.config["dm_receipts"], embed, reactions=("✅", "❌")):
         response.status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
-        return json.dumps({"error": "Failed to create campaign"})
-    await message.add_reaction("✅")
-    await message.add_reaction("❌")
+        return dumps({"error": "Failed to create campaign"})
 
-    return json.dumps({"success": True})
+    return dumps({"success": True})
 
 
-@router.post("/campaigns/{campaign_id}/action")
+@route("POST", "/campaigns/{campaign_id}/action")
+@rate_limited(RouteClass.WRITE)
 @permissions(Permissions.CAMPAIGN_CREATE)
 async def campaign_action_request(auth: str, campaign_id, campaign_action: CampaignActionRequest, response: Response):
-    init_guild()
-    campaign = DNDBot.instance.CampaignSQLHelper.select_campaign(campaign_id)
-    embed = getattr(ActionEmbedCreator, campaign_action.action.name)()
-    channel = DNDBot.instance.get_channel(DNDBot.instance.config["campaign_action_channel"])
-    to_react = await channel.send(embed=embed)
-    await to_react.add_reaction("✅")
-    await to_react.add_reaction("❌")
+    campaign = await context.campaigns.select_campaign(campaign_id)
+    embed = getattr(ActionEmbedCreator, campaign_action.action.name)(campaign_action, campaign)
+    await context.bridge.send_embed(context.config["campaign_action_channel"], embed, reactions=("✅", "❌"))
 
 
-@router.post("/campaigns/apply")
+@route("POST", "/campaigns/apply")
+@rate_limited(RouteClass.WRITE)
 @permissions(Permissions.USER_CREATE)
 async def apply_to_campaigns(auth: str, application: CampaignApplication, response: Response):
-    init_guild()
     for campaign in application.campaigns:
         if "(waitlist)" in campaign:
             campaign = campaign[:-11]
-        campaign = DNDBot.instance.CampaignSQLHelper.select_campaign(campaign)
+        campaign = await context.campaigns.select_campaign(campaign)
         if campaign is None:
             response.status_code = status.HTTP_404_NOT_FOUND
-            return json.dumps({"error": "Campaign not found"})
+            return dumps({"error": "Campaign not found"})
     for i in application.campaigns:
-        campaign = DNDBot.instance.CampaignSQLHelper.select_campaign(i)
-        dm = guild.get_member(campaign.dm)
+        campaign = await context.campaigns.select_campaign(i)
+        dm = context.bridge.get_member(campaign.dm)
         embed = discord.Embed(
             title=f"New Application for {campaign.name}",
             timestamp=datetime.datetime.utcnow()
@@ -295,109 +462,204 @@ async def apply_to_campaigns(auth: str, application: CampaignApplication, respon
         embed.add_field(name="Campaign", value=campaign.name, inline=False)
         embed.add_field(name="DM", value=str(dm), inline=False)
         embed.add_field(name="Name", value=f"{application.first_name} {application.last_name}", inline=False)
-        embed.add_field(name="Discord", value=f"{str(guild.get_member(application.discord_id))}")
+        embed.add_field(name="Discord", value=f"{str(context.bridge.get_member(application.discord_id))}")
         embed.add_field(name="Discord ID", value=str(application.discord_id))
         embed.set_footer(text="React with a green checkmark to approve or a red X to deny.")
 
-        channel = DNDBot.instance.get_channel(DNDBot.instance.config["applications_channel"])
-        message = await channel.send(content=dm.mention, embed=embed)
-        await message.add_reaction("✅")
-        await message.add_reaction("❌")
+        await context.bridge.send_embed(context.config["applications_channel"], embed, content=f"<@{campaign.dm}>",
+                                        reactions=("✅", "❌"))
 
-    return json.dumps({"success": True})
+    return dumps({"success": True})
 
 
 async def update_user_helper(user_id: int, user: UserUpdateRequest):
-    exists = (await guild.fetch_member(user_id)) is None
-    if exists:
-        return json.dumps({"error": "User not found"}), 404
-    exists = DNDBot.instance.db.execute("SELECT * from USERS where id = ?", (user_id,)).fetchone()
-    if not exists:
-        DNDBot.instance.db.execute(
-            "INSERT INTO users (first_name, last_name, id, unt_email, unt_student, playstyle, bio, pronouns, "
-            "image, position) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-            (user.first_name, user.last_name, user.id,
-             user.unt_email, int(user.unt_student), user.playstyle, user.bio,
-             user.pronouns, user.image, user.position))
-    else:
-        DNDBot.instance.db.execute("UPDATE users SET first_name = ?, last_name = ?, id = ?, unt_email = ?, "
-                                   "unt_student = ?, playstyle = ?, bio = ?, pronouns = ?, image = ?, position = ? "
-                                   "WHERE id = ?",
-                                   (user.first_name, user.last_name, user.id,
-                                    user.unt_email, int(user.unt_student), user.playstyle, user.bio,
-                                    user.pronouns, user.image, user.position, user.id))
-    return json.dumps({"success": True}), 200
+    if user.id != user_id:
+        return dumps({"error": "User ID doesn't match the path"}), 400
+    result = (await upsert_users([user]))[0]
+    if not result["success"]:
+        return dumps({"error": result["error"]}), 404
+    return dumps({"success": True}), 200
+
+
+async def upsert_users(users: list[UserUpdateRequest]) -> list[dict]:
+    """
+    Validates a batch of profile updates and writes every valid one with a single executemany, inserting users that
+    don't have a profile yet. Either every valid row is written or, if the write fails, none are. Does not commit.
+    :param users: The updated profiles
+    :return: A result for each user, in the same order
+    """
+    members = await asyncio.gather(*(context.bridge.resolve(i.id) for i in users))
+    results, rows, seen = [], [], set()
+    for user, member in zip(users, members):
+        if member is None or not member.in_guild:
+            results.append({"id": user.id, "success": False, "error": "User not found"})
+        elif user.id in seen:
+            results.append({"id": user.id, "success": False, "error": "User appears more than once"})
+        else:
+            seen.add(user.id)
+            rows.append((user.id, user.first_name, user.last_name, user.unt_email, int(user.unt_student),
+                         user.playstyle, user.bio, user.pronouns, user.image, user.position))
+            results.append({"id": user.id, "success": True})
+    if rows:
+        await context.db.executemany_atomic(
+            "INSERT INTO users (id, first_name, last_name, unt_email, unt_student, playstyle, bio, pronouns, image, "
+            "position) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (id) DO UPDATE SET "
+            "first_name = excluded.first_name, last_name = excluded.last_name, unt_email = excluded.unt_email, "
+            "unt_student = excluded.unt_student, playstyle = excluded.playstyle, bio = excluded.bio, "
+            "pronouns = excluded.pronouns, image = excluded.image, position = excluded.position", rows)
+    return results
 
 
 @router.get("/users/officers")
+@rate_limited(RouteClass.BULK)
 @permissions(Permissions.USER_READ)
 async def get_officers(auth: str, response: Response):
-    init_guild()
-    members = [tuple(await get_user_helper(i.id))[0] for i in
-               guild.get_role(DNDBot.instance.config["officer_role"]).members]
-    return json.dumps(members)
+    users = await get_users_helper(context.bridge.role_members(context.config["officer_role"]))
+    # v1 sends every officer as a JSON string of its own inside the list
+    return dumps([dumps(i.__dict__).decode() for i in users.values()]).decode()
 
 
-@router.post("/users/updatemany")
+@router_v2.get("/users/officers")
+@rate_limited(RouteClass.BULK)
+@permissions(Permissions.USER_READ)
+async def get_officers_v2(auth: str, response: Response):
+    users = await get_users_helper(context.bridge.role_members(context.config["officer_role"]))
+    return Response(dumps([i.__dict__ for i in users.values()]), media_type=JSON_MEDIA_TYPE)
+
+
+@route("GET", "/users/getmany/{id_list}")
+@rate_limited(RouteClass.BULK)
+@permissions(Permissions.USER_READ)
+async def get_many_users(id_list: str, auth: str, response: Response):
+    if '[' in id_list:
+        id_list = id_list[1:-1]
+    try:
+        user_ids = [int(i) for i in id_list.split(",")]
+    except ValueError:
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return dumps({"error": "IDs must be valid integers."})
+    return await get_many_users_helper(user_ids, response)
+
+
+@route("POST", "/users/getmany")
+@rate_limited(RouteClass.BULK)
+@permissions(Permissions.USER_READ)
+async def post_many_users(auth: str, request: UserFetchMany, response: Response):
+    return await get_many_users_helper(request.user_ids, response)
+
+
+async def get_many_users_helper(user_ids: list[int], response: Response) -> bytes:
+    """
+    Returns the requested users in the order they were asked for. Users that can't be found are left out, so a
+    roster still loads when one of its players has left Discord.
+    """
+    if len(user_ids) > MAX_USERS_PER_REQUEST:
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return dumps({"error": f"At most {MAX_USERS_PER_REQUEST} users can be requested at once."})
+    users = await get_users_helper(user_ids)
+    return dumps([users[i].__dict__ for i in dict.fromkeys(user_ids) if i in users])
+
+
+@route("POST", "/users/updatemany")
+@rate_limited(RouteClass.WRITE)
 @permissions(Permissions.USER_WRITE)
 async def user_update_many(auth: str, request: UserUpdateManyRequest,  response: Response):
-    init_guild()
-    for i in request.users:
-        ret, status_code = await get_user_helper(i.id)
-        if status_code != 200:
-            return ret, status_code
-    DNDBot.instance.connection.commit()
-    return json.dumps({"success": True})
+    if len(request.users) > MAX_USER_UPDATES:
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return dumps({"error": f"At most {MAX_USER_UPDATES} users can be updated at once."})
+    try:
+        results = await upsert_users(request.users)
+    except Exception:
+        traceback.print_exc()
+        response.status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+        return dumps({"error": "Failed to update users"})
+    await context.db.commit()
+    return dumps({"success": all(i["success"] for i in results), "results": results})
 
 
-@router.get("/users/{user_id}")
+@route("GET", "/users/{user_id}")
+@rate_limited(RouteClass.READ)
 @permissions(Permissions.USER_READ)
 async def get_user(user_id: int, auth: str, response: Response) -> str:
-    init_guild()
     resp, status_ = await get_user_helper(user_id)
     response.status_code = status_
     return resp
 
 
-@router.post("/users/{user_id}/update")
+@route("POST", "/users/{user_id}/update")
+@rate_limited(RouteClass.WRITE)
 @permissions(Permissions.USER_CREATE)
 async def update_user(user_id: int, auth: str, user: UserUpdateRequest, response: Response):
-    init_guild()
     ret, status_ = await update_user_helper(user_id, user)
-    if ret:
-        response.status_code = status_
-        return ret
-    DNDBot.instance.connection.commit()
+    response.status_code = status_
+    if status_ == status.HTTP_200_OK:
+        await context.db.commit()
+    return ret
 
 
-@router.get("/users/{user_id}/delete")
+@route("GET", "/users/{user_id}/delete")
+@rate_limited(RouteClass.WRITE)
 @permissions(Permissions.USER_CREATE)
 async def delete_user(user_id: int, auth: str, response: Response):
-    init_guild()
-    exists = (await guild.fetch_member(user_id)) is None
-    if exists:
+    member = await context.bridge.resolve(user_id)
+    if member is None or not member.in_guild:
         response.status_code = status.HTTP_404_NOT_FOUND
-        return json.dumps({"error": "User not found"})
-    DNDBot.instance.db.execute("DELETE FROM users WHERE id = ?", (user_id,))
-    DNDBot.instance.connection.commit()
+        return dumps({"error": "User not found"})
+    await context.db.execute("DELETE FROM users WHERE id = ?", (user_id,))
+    await context.db.commit()
 
 
-@router.get("/users/{user_id}/warnings")
+@route("GET", "/users/{user_id}/warnings")
+@rate_limited(RouteClass.READ)
 @permissions(Permissions.USER_READ)
 async def get_user_warnings(user_id: int, auth: str, response: Response):
-    warns = DNDBot.instance.db.execute("select * from warns where member = ?", (user_id,)).fetchall()
+    warns = await context.db.fetchall("select * from warns where member = ?", (user_id,))
     resp = [{i["id"]: i["reason"]} for i in warns]
-    return json.dumps(resp)
+    return dumps(resp)
+
+
+@route("GET", "/export/campaigns")
+@rate_limited(RouteClass.BULK)
+@permissions(Permissions.CAMPAIGN_READ)
+async def export_campaigns(auth: str, response: Response):
+    return export_response("SELECT * FROM campaigns ORDER BY id")
+
+
+@route("GET", "/export/players")
+@rate_limited(RouteClass.BULK)
+@permissions(Permissions.USER_READ)
+async def export_players(auth: str, response: Response):
+    return export_response("SELECT * FROM players ORDER BY pid")
+
+
+@route("GET", "/export/users")
+@rate_limited(RouteClass.BULK)
+@permissions(Permissions.USER_READ)
+async def export_users(auth: str, response: Response):
+    return export_response("SELECT * FROM users")
+
+
+def export_response(query: str) -> StreamingResponse:
+    """
+    Streams every row of a query as newline-delimited JSON, one chunk of rows at a time
+    :param query: The query to export
+    """
+    async def rows():
+        async for chunk in context.db.stream(query):
+            yield b"".join(dumps(row) + b"\n" for row in chunk)
+
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
 
 
 # async def campaign_creation_callback(instance: DNDBot, campaign_info: CampaignInfo):
 async def campaign_creation_callback(*args, campaign: CampaignInfo = None):
-    init_guild()
+    # called by the bot, so this always runs in the bot's process
+    guild = DNDBot.instance.get_guild(DNDBot.instance.config["server"])
     oneshot = campaign.meeting_date is not ""
     name = campaign.name
     dungeon_master = await guild.fetch_member(campaign.dm)
 
-    DNDBot.instance.connection.commit()
+    await DNDBot.instance.db.commit()
     await (guild.get_channel(DNDBot.instance.config["notification_channel"])).send(
         f"<@&{DNDBot.instance.config['new_campaign_role']}>: A new campaign has opened: "
             f"\"{campaign.name}\"! This {'one-shot' if oneshot else 'campaign'} will run using {campaign.system} by <@{campaign.dm}> on {campaign.meeting_date if oneshot else campaign.meeting_day}, for {campaign.session_length} starting at {campaign.meeting_time}! "
@@ -0,0 +1,21 @@
+from typing import Any
+
+import orjson
+
+JSON_MEDIA_TYPE = "application/json"
+
+
+def dumps(obj: Any) -> bytes:
+    """
+    Serializes a response body in one pass. Integer keys become strings, the same as json.dumps would make them.
+    :param obj: Anything orjson can serialize, dataclasses included
+    :return: The UTF-8 encoded JSON
+    """
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+
+def join(fragments: list[bytes]) -> bytes:
+    """
+    Builds a JSON array out of already serialized elements
+    """
+    return b"[" + b",".join(fragments) + b"]"
@@ -114,6 +114,10 @@ class CampaignFetchMany(BaseModel):
     campaign_ids: list[int]
 
 
+class UserFetchMany(BaseModel):
+    user_ids: list[int]
+
+
 class CampaignAction(enum.Enum):
     leave = "Leave a campaign as a player"
     end = "End a campaign as a Dungeon Master"
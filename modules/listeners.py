@@ -5,19 +5,20 @@ from discord.ext import commands
 class Listeners(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.bot.db.execute("CREATE TABLE IF NOT EXISTS reacts (id INTEGER PRIMARY KEY, phrase TEXT, reaction TEXT, "
-                            "channel INTEGER)")
-        self.bot.db.execute("CREATE TABLE IF NOT EXISTS responses (id INTEGER PRIMARY KEY, phrase TEXT, response TEXT, "
-                            "channel INTEGER)")
-        self.bot.connection.commit()
         self.reacts = {}
         self.responses = {}
 
-        self.load_reactions()
-
-    def load_reactions(self):
-        react_table = self.bot.db.execute("SELECT * FROM reacts").fetchall()
-        response_table = self.bot.db.execute("SELECT * FROM responses").fetchall()
+    async def cog_load(self):
+        await self.bot.db.execute("CREATE TABLE IF NOT EXISTS reacts (id INTEGER PRIMARY KEY, phrase TEXT, "
+                                  "reaction TEXT, channel INTEGER)")
+        await self.bot.db.execute("CREATE TABLE IF NOT EXISTS responses (id INTEGER PRIMARY KEY, phrase TEXT, "
+                                  "response TEXT, channel INTEGER)")
+        await self.bot.db.commit()
+        await self.load_reactions()
+
+    async def load_reactions(self):
+        react_table = await self.bot.db.fetchall("SELECT * FROM reacts")
+        response_table = await self.bot.db.fetchall("SELECT * FROM responses")
         self.reacts = {i["id"]: (i["phrase"], i["reaction"], i["channel"]) for i in react_table}
         self.responses = {i["id"]: (i["phrase"], i["response"], i["channel"]) for i in response_table}
 
@@ -25,7 +26,7 @@ class Listeners(commands.Cog):
     async def on_member_remove(self, member: discord.Member):
         campaigns = []
         # get all campaign roles
-        resp = self.bot.CampaignSQLHelper.select_field("role")
+        resp = await self.bot.CampaignSQLHelper.select_field("role")
         for role_ in resp:
             # check if member is in campaign
             role = member.guild.get_role(role_['role'])
@@ -41,6 +42,9 @@ class Listeners(commands.Cog):
 
     @commands.Cog.listener()
     async def on_member_update(self, before: discord.Member, after: discord.Member):
+        if before.display_name != after.display_name:
+            self.touch_dm_campaigns(after)
+
         # Role Logging
 
         if sorted(before.roles, key=lambda x: x.id) == sorted(after.roles, key=lambda x: x.id):
@@ -51,38 +55,48 @@ class Listeners(commands.Cog):
             if i in after.roles and i not in before.roles:
                 new_roles.append(i)
         for i in new_roles:
-            resp = self.bot.db.execute("SELECT * FROM campaigns WHERE role LIKE ?", (i.id,)).fetchone()
-            if resp is None:
+            campaign = self.bot.CampaignSQLHelper.campaign_by_role(i.id)
+            if campaign is None:
                 continue
             else:
-                category = self.bot.get_channel(resp["category"])
+                category = self.bot.get_channel(campaign.category)
                 for channel in category.channels:
                     if channel.name == "lobby":
                         await channel.send(f"{after.mention} has joined the campaign!")
 
+    @commands.Cog.listener()
+    async def on_user_update(self, before: discord.User, after: discord.User):
+        if before.name != after.name or before.display_name != after.display_name:
+            self.touch_dm_campaigns(after)
+
+    def touch_dm_campaigns(self, member: discord.abc.User):
+        # campaign API responses include the DM's name, so they go stale when it changes
+        for campaign in self.bot.CampaignSQLHelper.campaigns_by_dm(member.id):
+            self.bot.CampaignSQLHelper.touch(campaign.id)
+
     @commands.command()
     @commands.has_permissions(manage_messages=True)
     async def add_reaction(self, context, phrase, reaction, channel):
-        self.bot.db.execute("INSERT INTO reacts (phrase, reaction, channel) VALUES (?, ?, ?)",
-                            (phrase, reaction, channel))
-        self.bot.connection.commit()
-        self.load_reactions()
+        await self.bot.db.execute("INSERT INTO reacts (phrase, reaction, channel) VALUES (?, ?, ?)",
+                                  (phrase, reaction, channel))
+        await self.bot.db.commit()
+        await self.load_reactions()
         await context.send("Added!")
 
     @commands.command()
     @commands.has_permissions(manage_messages=True)
     async def add_response(self, context, phrase, response, channel):
-        self.bot.db.execute("INSERT INTO responses (phrase, response, channel) VALUES (?, ?, ?)",
-                            (phrase, response, channel))
-        self.bot.connection.commit()
-        self.load_reactions()
+        await self.bot.db.execute("INSERT INTO responses (phrase, response, channel) VALUES (?, ?, ?)",
+                                  (phrase, response, channel))
+        await self.bot.db.commit()
+        await self.load_reactions()
         await context.send("Added!")
 
     @commands.command()
     @commands.has_permissions(manage_messages=True)
     async def list_reactions(self, context):
-        reacts = self.bot.db.execute("SELECT * FROM reacts").fetchall()
-        resps = self.bot.db.execute("SELECT * FROM responses").fetchall()
+        reacts = await self.bot.db.fetchall("SELECT * FROM reacts")
+        resps = await self.bot.db.fetchall("SELECT * FROM responses")
         resp = "Message Reactions:\n"
         for i in reacts:
             resp += f"{i['id']}: {i['phrase']} -> {i['reaction']} in {context.guild.get_channel(i['channel'])}\n"
@@ -95,17 +109,17 @@ class Listeners(commands.Cog):
     @commands.command()
     @commands.has_permissions(manage_messages=True)
     async def remove_reaction(self, context, id_):
-        self.bot.db.execute("DELETE FROM reacts WHERE id = ?", (id_,))
-        self.bot.connection.commit()
-        self.load_reactions()
+        await self.bot.db.execute("DELETE FROM reacts WHERE id = ?", (id_,))
+        await self.bot.db.commit()
+        await self.load_reactions()
         await context.send("Removed!")
 
     @commands.command()
     @commands.has_permissions(manage_messages=True)
     async def remove_response(self, context, id_):
-        self.bot.db.execute("DELETE FROM responses WHERE id = ?", (id_,))
-        self.bot.connection.commit()
-        self.load_reactions()
+        await self.bot.db.execute("DELETE FROM responses WHERE id = ?", (id_,))
+        await self.bot.db.commit()
+        await self.load_reactions()
         await context.send("Removed!")
 
     @commands.Cog.listener()
@@ -128,7 +142,7 @@ class Listeners(commands.Cog):
 
     @commands.command()
     async def reload_reactions(self, context):
-        self.load_reactions()
+        await self.load_reactions()
         await context.send("Reloaded!")
 
 
@@ -31,18 +31,19 @@ class Remind(commands.Cog):
         old_time = time.time()
         new_time = datetime.datetime.fromtimestamp(old_time + seconds, datetime.timezone.utc)
         timestamp = old_time + seconds
-        self.bot.db.execute("INSERT INTO reminders (user_id, channel, time, phrase, jump_url) VALUES (?, ?, ?, ?, ?)",
-                            (context.author.id, context.channel.id, timestamp, phrase, context.message.jump_url))
-        self.bot.connection.commit()
+        await self.bot.db.execute("INSERT INTO reminders (user_id, channel, time, phrase, jump_url) "
+                                  "VALUES (?, ?, ?, ?, ?)",
+                                  (context.author.id, context.channel.id, timestamp, phrase, context.message.jump_url))
+        await self.bot.db.commit()
         await context.send("Reminder " + phrase + " created for " + _time + "!")
         await discord.utils.sleep_until(new_time)
         await context.send(f"{context.author.mention}: {phrase}\nMessage: {context.message.jump_url}")
-        self.bot.db.execute("DELETE FROM reminders WHERE jump_url = ?", (context.message.jump_url,))
-        self.bot.connection.commit()
+        await self.bot.db.execute("DELETE FROM reminders WHERE jump_url = ?", (context.message.jump_url,))
+        await self.bot.db.commit()
 
     @commands.command()
     async def reminders(self, context: commands.Context):
-        reminders = self.bot.db.execute("SELECT * FROM reminders WHERE user_id = ?", (context.author.id,)).fetchall()
+        reminders = await self.bot.db.fetchall("SELECT * FROM reminders WHERE user_id = ?", (context.author.id,))
         if len(reminders) == 0:
             await context.send("You have no reminders!")
             return
@@ -55,20 +56,20 @@ class Remind(commands.Cog):
 
     @commands.command()
     async def delete_reminder(self, context: commands.Context, reminder_id):
-        reminder = self.bot.db.execute("SELECT * FROM reminders WHERE id = ?", (reminder_id,)).fetchone()
+        reminder = await self.bot.db.fetchone("SELECT * FROM reminders WHERE id = ?", (reminder_id,))
         if reminder is None:
             await context.send("Reminder not found!")
             return
         if reminder["user_id"] != context.author.id:
             await context.send("You can only delete your own reminders!")
             return
-        self.bot.db.execute("DELETE FROM reminders WHERE id = ?", (reminder_id,))
-        self.bot.connection.commit()
+        await self.bot.db.execute("DELETE FROM reminders WHERE id = ?", (reminder_id,))
+        await self.bot.db.commit()
         await context.send("Reminder deleted!")
 
     # noinspection PyAsyncCall
     async def cog_load(self):
-        reminders = self.bot.db.execute("SELECT * FROM reminders").fetchall()
+        reminders = await self.bot.db.fetchall("SELECT * FROM reminders")
         for reminder in reminders:
             self.tasks.append(asyncio.create_task(self.remind_task(reminder)))
         print("Done loading reminders!")
@@ -85,8 +86,8 @@ class Remind(commands.Cog):
             datetime.datetime.fromtimestamp(reminder["time"], datetime.timezone.utc)) + " for " + reminder["phrase"])
         await discord.utils.sleep_until(datetime.datetime.fromtimestamp(reminder["time"], datetime.timezone.utc))
         await channel.send(f"{user.mention}: {reminder['phrase']}\nMessage: {reminder['jump_url']}")
-        self.bot.db.execute("DELETE FROM reminders WHERE id = ?", (reminder["id"],))
-        self.bot.connection.commit()
+        await self.bot.db.execute("DELETE FROM reminders WHERE id = ?", (reminder["id"],))
+        await self.bot.db.commit()
 
 
 async def setup(bot):
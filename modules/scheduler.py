@@ -11,9 +11,6 @@ from discord.ext import commands
 class Scheduler(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.bot.db.execute("CREATE TABLE IF NOT EXISTS schedule (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER,"
-                            " time INTEGER, repeat TEXT, channel_id INTEGER, message TEXT, dst INTEGER DEFAULT 0)")
-        self.bot.connection.commit()
         self.tasks = {}
 
     @commands.command()
@@ -35,19 +32,20 @@ class Scheduler(commands.Cog):
         datetime_ = datetime.datetime.combine(date, time_)
         localized = pytz.timezone('America/Chicago').localize(datetime_)
         time_value = localized.timestamp()
-        self.bot.db.execute("INSERT INTO schedule (user_id, channel_id, time, repeat, message, dst) VALUES (?, ?, ?, ?, ?, ?)",
-                            (context.author.id, channel.id, time_value, repeat, message, time.daylight))
-        self.bot.connection.commit()
+        cursor = await self.bot.db.execute("INSERT INTO schedule (user_id, channel_id, time, repeat, message, dst) "
+                                           "VALUES (?, ?, ?, ?, ?, ?)",
+                                           (context.author.id, channel.id, time_value, repeat, message, time.daylight))
+        await self.bot.db.commit()
 
         await context.send(f"Message scheduled for {day_sent} at {time_sent} {am_pm} in {channel.mention} with the message: {message}")
-        message_id = self.bot.db.lastrowid
+        message_id = cursor.lastrowid
         self.tasks[message_id] = asyncio.create_task(self.message_task(
             {"id": message_id, "user_id": context.author.id, "channel_id": channel.id, "time": time_value, "repeat": repeat,
              "message": message, "dst": time.daylight}))
 
     @commands.command()
     async def list_schedules(self, context: commands.Context):
-        messages = self.bot.db.execute("SELECT * FROM schedule WHERE user_id = ?", (context.author.id,)).fetchall()
+        messages = await self.bot.db.fetchall("SELECT * FROM schedule WHERE user_id = ?", (context.author.id,))
         if not messages:
             await context.send("You have no scheduled messages!")
             return
@@ -71,15 +69,15 @@ class Scheduler(commands.Cog):
 
     @commands.command()
     async def delete_schedule(self, context: commands.Context, message_id: int):
-        message = self.bot.db.execute("SELECT * FROM schedule WHERE id = ?", (message_id,)).fetchone()
+        message = await self.bot.db.fetchone("SELECT * FROM schedule WHERE id = ?", (message_id,))
         if not message:
             await context.send("Message not found!")
             return
         if message["user_id"] != context.author.id:
             await context.send("You can't delete someone else's message!")
             return
-        self.bot.db.execute("DELETE FROM schedule WHERE id = ?", (message_id,))
-        self.bot.connection.commit()
+        await self.bot.db.execute("DELETE FROM schedule WHERE id = ?", (message_id,))
+        await self.bot.db.commit()
         self.tasks[message_id].cancel()
         del self.tasks[message_id]
         await context.send("Message deleted!")
@@ -102,22 +100,26 @@ class Scheduler(commands.Cog):
         localized = pytz.timezone('America/Chicago').localize(datetime_)
         time_value = localized.timestamp()
 
-        self.bot.db.execute("UPDATE schedule SET time = ? WHERE id = ?", (time_value, id_))
-        self.bot.connection.commit()
+        await self.bot.db.execute("UPDATE schedule SET time = ? WHERE id = ?", (time_value, id_))
+        await self.bot.db.commit()
         await context.send("date updated!")
 
     @commands.command()
     async def update_schedule_message(self, context: commands.Context, id_: int, message: str):
-        self.bot.db.execute("UPDATE schedule SET message = ? WHERE id = ?", (message, id_))
-        self.bot.connection.commit()
+        await self.bot.db.execute("UPDATE schedule SET message = ? WHERE id = ?", (message, id_))
+        await self.bot.db.commit()
         await context.send("message updated!")
 
     # noinspection PyAsyncCall
     async def cog_load(self):
+        await self.bot.db.execute("CREATE TABLE IF NOT EXISTS schedule (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                                  "user_id INTEGER, time INTEGER, repeat TEXT, channel_id INTEGER, message TEXT, "
+                                  "dst INTEGER DEFAULT 0)")
+        await self.bot.db.commit()
         for task in self.tasks:
             task.cancel()
         self.tasks = {}
-        messages = self.bot.db.execute("SELECT * FROM schedule").fetchall()
+        messages = await self.bot.db.fetchall("SELECT * FROM schedule")
         for message in messages:
             print("loading message: " + message["message"])
             self.tasks[message['id']] = asyncio.create_task(self.message_task(message))
@@ -132,23 +134,24 @@ class Scheduler(commands.Cog):
     async def message_task(self, message):
         if message["dst"] != time.daylight:
             message["time"] += 3600 if message["dst"] == 1 else -3600
-            self.bot.db.execute("UPDATE schedule SET time = ?, dst = ? WHERE id = ?",
-                                (message["time"], time.daylight, message["id"]))
+            await self.bot.db.execute("UPDATE schedule SET time = ?, dst = ? WHERE id = ?",
+                                      (message["time"], time.daylight, message["id"]))
+            await self.bot.db.commit()
         print("Starting message task for " + str(message['id']))
         print("Message Info: " + str(message))
         channel = self.bot.get_channel(message["channel_id"])
         if channel is None:
             print("Channel not found for message " + str(message['id']))
-            self.bot.db.execute("DELETE FROM schedule WHERE id = ?", (message["id"],))
-            self.bot.connection.commit()
+            await self.bot.db.execute("DELETE FROM schedule WHERE id = ?", (message["id"],))
+            await self.bot.db.commit()
             return
         print("Sleeping until " + str(
             datetime.datetime.fromtimestamp(message["time"], pytz.timezone('America/Chicago'))) + " for " + message["message"])
         await discord.utils.sleep_until(datetime.datetime.fromtimestamp(message["time"], pytz.timezone('America/Chicago')))
         await channel.send(message['message'])
         if message["repeat"] == "none":
-            self.bot.db.execute("DELETE FROM schedule WHERE id = ?", (message["id"],))
-            self.bot.connection.commit()
+            await self.bot.db.execute("DELETE FROM schedule WHERE id = ?", (message["id"],))
+            await self.bot.db.commit()
             return
         offset = 86400
         if message["repeat"] == "daily":
@@ -160,10 +163,10 @@ class Scheduler(commands.Cog):
         elif message["repeat"] == "monthly":
             offset *= 28
 
-        self.bot.db.execute("UPDATE schedule SET time = ? WHERE id = ?",
-                            (message["time"] + offset, message["id"]))
+        await self.bot.db.execute("UPDATE schedule SET time = ? WHERE id = ?",
+                                  (message["time"] + offset, message["id"]))
         message["time"] += offset
-        self.bot.connection.commit()
+        await self.bot.db.commit()
         print("Done sending message!")
         print("New time: " + str(datetime.datetime.fromtimestamp(message["time"], pytz.timezone('America/Chicago'))))
         print("New message info: " + str(message))
@@ -6,6 +6,8 @@ from discord.ext import commands
 import discord
 import json
 
+from .api.Permissions import invalidate_tokens
+
 
 class Utilities(commands.Cog):
     def __init__(self, bot):
@@ -66,7 +68,7 @@ class Utilities(commands.Cog):
     async def die(self, context):
         if context.author.id == 613371584295469084 or context.author.id == 656991495806779427:
             await context.send("Bot shutting down...")
-            self.bot.db.close()
+            await self.bot.db.close()
             await self.bot.close()
 
     @commands.command(help=f"Will unload a cog.\nUsage: {BOT_PREFIX}unload cogname", brief="Will unload a cog.",
@@ -198,8 +200,12 @@ class Utilities(commands.Cog):
     @commands.command()
     @commands.is_owner()
     async def execute(self, context, *, query):
-        resp = self.bot.db.execute(query).fetchall()
-        self.bot.connection.commit()
+        cursor = await self.bot.db.execute(query)
+        resp = await self.bot.db.run(cursor.fetchall)
+        await self.bot.db.commit()
+        # the query may have touched campaigns or API tokens behind the caches' backs
+        await self.bot.CampaignSQLHelper.load_registry()
+        invalidate_tokens()
         await context.send(f"Query processed. Rows found: {len(resp)}")
 
     @commands.command(aliases=['ac'])
@@ -11,8 +11,8 @@ class Warnings(commands.Cog):
     @commands.has_role(809567701735440469)
     @commands.command()
     async def warn(self, context: commands.Context, member: discord.Member, *, reason: str):
-        self.bot.db.execute("INSERT INTO warns (member, reason) VALUES (?, ?)", (member.id, reason))
-        self.bot.connection.commit()
+        await self.bot.db.execute("INSERT INTO warns (member, reason) VALUES (?, ?)", (member.id, reason))
+        await self.bot.db.commit()
         embed = discord.Embed(
             title="User warned",
             description=f"User {member.mention} warned.\nReason: {reason}",
@@ -36,7 +36,7 @@ class Warnings(commands.Cog):
         if member != context.author:
             if not any(self.bot.config["officer_role"] == i.id for i in context.author.roles):
                 member = context.author
-        resp = self.bot.db.execute("SELECT * FROM warns WHERE member = ?", (member.id,)).fetchall()
+        resp = await self.bot.db.fetchall("SELECT * FROM warns WHERE member = ?", (member.id,))
         counter = 0
         embed = discord.Embed(
             title="Warnings",
@@ -77,10 +77,10 @@ class Warnings(commands.Cog):
     @commands.has_role("Officer")
     @commands.command()
     async def remove_warn(self, context: commands.Context, member: discord.Member, index: int):
-        resp = self.bot.db.execute("SELECT * FROM warns WHERE member = ?", (member.id,)).fetchall()
+        resp = await self.bot.db.fetchall("SELECT * FROM warns WHERE member = ?", (member.id,))
         text = resp[index]["reason"]
-        self.bot.db.execute("DELETE FROM warns WHERE reason LIKE ? AND member = ?", (text, member.id))
-        self.bot.db.connection.commit()
+        await self.bot.db.execute("DELETE FROM warns WHERE reason LIKE ? AND member = ?", (text, member.id))
+        await self.bot.db.commit()
         embed = discord.Embed(
             title="Warning removed.",
             description=f"Warning {index} removed from {member.mention}",
@@ -0,0 +1,54 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from modules.CampaignInfo import CampaignInfo
+from modules.CampaignSQLHelper import CampaignSQLHelper
+from modules.Database import Database
+from modules.Migrations import Migrations
+
+
+class CampaignChangesTest(unittest.IsolatedAsyncioTestCase):
+    """
+    Change listeners only ever hear about committed campaign changes
+    """
+
+    async def asyncSetUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        # long enough that nothing is committed before the test checks
+        self.db = Database(os.path.join(self.directory.name, "test.db"), readers=2, commit_interval=0.5)
+        Migrations(self.db.connection).migrate()
+        self.helper = CampaignSQLHelper(SimpleNamespace(db=self.db))
+        self.events = []
+        self.helper.add_change_listener(self.events.extend)
+        await self.helper.load_registry()
+        await self.settle()
+        # loading tells listeners to start over
+        self.assertEqual([i["change"] for i in self.events], ["resync"])
+        self.events.clear()
+
+    async def asyncTearDown(self):
+        await self.db.close()
+        self.directory.cleanup()
+
+    async def settle(self):
+        await asyncio.gather(*self.helper.publishing)
+
+    async def test_uncommitted_changes_are_not_published(self):
+        self.assertTrue(await self.helper.create_campaign(CampaignInfo(name="Test", max_players=5)))
+        self.assertEqual(await self.helper.get_changes(0, 10), [])
+        # a publish triggered by someone else's commit mustn't pick up the pending event either
+        self.helper.publish_changes()
+        await self.settle()
+        self.assertEqual(self.events, [])
+
+        await self.db.commit()
+        await self.settle()
+        self.assertEqual([(i["change"], i["id"]) for i in self.events],
+                         [("created", self.helper.registry.all()[0].id)])
+
+
+if __name__ == "__main__":
+    unittest.main()
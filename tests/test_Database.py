@@ -0,0 +1,99 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from modules.Database import Database
+
+
+class DatabaseCommitTest(unittest.IsolatedAsyncioTestCase):
+    """
+    Group commit: commits requested together share one flush, and every caller hears how it went
+    """
+
+    async def asyncSetUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db = self.open(commit_interval=0.05, commit_batch=64)
+
+    async def asyncTearDown(self):
+        await self.db.close()
+        self.directory.cleanup()
+
+    def open(self, **kwargs) -> Database:
+        db = Database(os.path.join(self.directory.name, "test.db"), readers=2, **kwargs)
+        db.connection.execute("CREATE TABLE IF NOT EXISTS items (id INTEGER PRIMARY KEY, parent INTEGER "
+                              "REFERENCES items(id) DEFERRABLE INITIALLY DEFERRED)")
+        db.connection.execute("PRAGMA foreign_keys=ON")
+        db.connection.commit()
+        self.flushes = 0
+
+        def flushed():
+            self.flushes += 1
+
+        db.add_commit_listener(flushed)
+        return db
+
+    async def count(self) -> int:
+        return (await self.db.fetchone("SELECT COUNT(*) AS count FROM items"))["count"]
+
+    async def write_and_commit(self, item: int):
+        await self.db.execute("INSERT INTO items (id) VALUES (?)", (item,))
+        await self.db.commit()
+
+    async def test_commits_share_one_flush(self):
+        await asyncio.gather(*(self.write_and_commit(i) for i in range(10)))
+        self.assertEqual(self.flushes, 1)
+        self.assertEqual(await self.count(), 10)
+
+    async def test_commit_returns_once_readers_see_the_write(self):
+        await self.db.execute("INSERT INTO items (id) VALUES (1)")
+        self.assertEqual(await self.count(), 0)
+        await self.db.commit()
+        self.assertEqual(await self.count(), 1)
+
+    async def test_full_batch_flushes_without_waiting(self):
+        await self.db.close()
+        self.db = self.open(commit_interval=60, commit_batch=3)
+        await asyncio.wait_for(asyncio.gather(*(self.write_and_commit(i) for i in range(3))), 1)
+        self.assertEqual(self.flushes, 1)
+
+    async def test_uncommitted_writes_are_flushed_by_the_timer(self):
+        await self.db.execute("INSERT INTO items (id) VALUES (1)")
+        await asyncio.sleep(0.2)
+        self.assertEqual(self.flushes, 1)
+        self.assertEqual(await self.count(), 1)
+        # nothing is left holding the write lock, so another connection can write straight away
+        other = sqlite3.connect(self.db.filename, timeout=0)
+        try:
+            other.execute("INSERT INTO items (id) VALUES (2)")
+            other.commit()
+        finally:
+            other.close()
+
+    async def test_failed_commit_reaches_every_waiter(self):
+        # the dangling reference only fails when the transaction commits
+        await self.db.execute("INSERT INTO items (id, parent) VALUES (1, 100)")
+        results = await asyncio.gather(*(self.db.commit() for _ in range(5)), return_exceptions=True)
+        self.assertEqual(len(results), 5)
+        for result in results:
+            self.assertIsInstance(result, sqlite3.IntegrityError)
+        self.assertEqual(self.flushes, 0)
+        await self.db.run(self.db.connection.rollback)
+
+    async def test_failed_atomic_job_writes_nothing(self):
+        await self.db.execute("INSERT INTO items (id) VALUES (1)")
+
+        def job(connection: sqlite3.Connection):
+            connection.execute("INSERT INTO items (id) VALUES (2)")
+            connection.execute("INSERT INTO items (id) VALUES (1)")
+
+        with self.assertRaises(sqlite3.IntegrityError):
+            await self.db.run_atomic(job)
+        await self.db.commit()
+        # the write queued before the job still lands
+        self.assertEqual(await self.count(), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
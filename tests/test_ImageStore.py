@@ -0,0 +1,54 @@
+import asyncio
+import os
+import pathlib
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from PIL import Image
+from fastapi import status
+
+from modules.api.ImageStore import ImageStore
+
+
+class ImageStoreTest(unittest.IsolatedAsyncioTestCase):
+    """
+    Images revalidate with 304, resized variants included
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        root = pathlib.Path(self.directory.name)
+        Image.new("RGB", (1000, 500)).save(root / "campaign.png")
+        self.store = ImageStore(str(root), str(root / "cache"))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    async def revalidate(self, width):
+        first = await self.store.respond("campaign", width, SimpleNamespace(headers={}))
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        # reading the body closes the file
+        self.assertTrue(b"".join([chunk async for chunk in first.body_iterator]))
+        # long enough for a touched file to get a new mtime
+        await asyncio.sleep(0.05)
+        second = await self.store.respond("campaign", width,
+                                          SimpleNamespace(headers={"if-none-match": first.headers["ETag"]}))
+        self.assertEqual(second.status_code, status.HTTP_304_NOT_MODIFIED)
+        return first.headers["ETag"]
+
+    async def test_original_revalidates(self):
+        await self.revalidate(None)
+
+    async def test_variant_revalidates(self):
+        self.assertNotEqual(await self.revalidate(300), await self.revalidate(None))
+
+    async def test_evicted_variant_keeps_its_etag(self):
+        etag = await self.revalidate(300)
+        for entry in os.scandir(self.store.cache_dir):
+            os.remove(entry.path)
+        self.assertEqual(await self.revalidate(300), etag)
+
+
+if __name__ == "__main__":
+    unittest.main()
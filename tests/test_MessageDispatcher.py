@@ -0,0 +1,85 @@
+import asyncio
+import unittest
+
+from modules.MessageDispatcher import Lane, MessageDispatcher
+
+
+class MessageDispatcherTest(unittest.IsolatedAsyncioTestCase):
+    """
+    Sends go out one at a time per destination, in lane order, without bulk sends taking every slot
+    """
+
+    def setUp(self):
+        self.sent = []
+        self.gate = asyncio.Event()
+
+    def send(self, name: str, wait: bool = False):
+        async def send():
+            if wait:
+                await self.gate.wait()
+            self.sent.append(name)
+            return name
+
+        return send
+
+    async def test_destination_sends_in_lane_order(self):
+        dispatcher = MessageDispatcher(concurrency=4)
+        futures = [dispatcher.submit(self.send("first", wait=True), "channel", Lane.BULK),
+                   dispatcher.submit(self.send("bulk"), "channel", Lane.BULK),
+                   dispatcher.submit(self.send("staff"), "channel", Lane.STAFF),
+                   dispatcher.submit(self.send("reply"), "channel", Lane.INTERACTIVE),
+                   dispatcher.submit(self.send("second bulk"), "channel", Lane.BULK)]
+        await asyncio.sleep(0)
+        # the first send is running, nothing else for its destination starts alongside it
+        self.assertEqual(dispatcher.running, 1)
+        self.gate.set()
+        self.assertEqual(await asyncio.gather(*futures), ["first", "bulk", "staff", "reply", "second bulk"])
+        self.assertEqual(self.sent, ["first", "reply", "staff", "bulk", "second bulk"])
+
+    async def test_bulk_sends_leave_slots_for_replies(self):
+        dispatcher = MessageDispatcher(concurrency=3, bulk_concurrency=2)
+        bulk = [dispatcher.submit(self.send(f"dm {i}", wait=True), i, Lane.BULK) for i in range(5)]
+        await asyncio.sleep(0)
+        self.assertEqual((dispatcher.running, dispatcher.running_bulk), (2, 2))
+        reply = dispatcher.submit(self.send("reply"), "channel", Lane.INTERACTIVE)
+        self.assertEqual(await asyncio.wait_for(reply, 1), "reply")
+        self.gate.set()
+        await asyncio.gather(*bulk)
+        self.assertEqual(self.sent[0], "reply")
+        self.assertEqual((dispatcher.running, dispatcher.running_bulk), (0, 0))
+
+    async def test_errors_reach_their_caller_only(self):
+        dispatcher = MessageDispatcher()
+
+        async def fail():
+            raise ValueError("closed DMs")
+
+        failed = dispatcher.submit(fail, "member", Lane.BULK)
+        after = dispatcher.submit(self.send("after"), "member", Lane.BULK)
+        with self.assertRaises(ValueError):
+            await failed
+        self.assertEqual(await after, "after")
+
+    async def test_cancelled_caller_is_skipped(self):
+        dispatcher = MessageDispatcher()
+        first = dispatcher.submit(self.send("first", wait=True), "channel")
+        skipped = dispatcher.submit(self.send("skipped"), "channel")
+        last = dispatcher.submit(self.send("last"), "channel")
+        skipped.cancel()
+        self.gate.set()
+        await asyncio.gather(first, last)
+        self.assertEqual(self.sent, ["first", "last"])
+
+    async def test_cancelled_send_cancels_its_future(self):
+        dispatcher = MessageDispatcher()
+        future = dispatcher.submit(self.send("never", wait=True), "channel")
+        await asyncio.sleep(0)
+        for task in list(dispatcher.tasks):
+            task.cancel()
+        await asyncio.sleep(0)
+        self.assertTrue(future.cancelled())
+        self.assertEqual(dispatcher.running, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+
+from modules.api import Permissions
+from modules.api.ApiContext import context
+from modules.api.RateLimiter import RateLimiter
+
+
+class FakeDatabase:
+    """
+    authorized_users with a single token
+    """
+
+    async def fetchone(self, query: str, params: tuple):
+        return {"permissions": int(Permissions.Permissions.FULL)} if params[0] == "real" else None
+
+
+class RevokedDatabase:
+    """
+    authorized_users after every token was removed
+    """
+
+    async def fetchone(self, query: str, params: tuple):
+        return None
+
+
+class RateLimiterTest(unittest.IsolatedAsyncioTestCase):
+    """
+    Made up tokens share one bucket, which never holds up a token that was verified before
+    """
+
+    def setUp(self):
+        self.previous_db = context.db
+        context.db = FakeDatabase()
+        Permissions.invalidate_tokens()
+        Permissions.verified_tokens.clear()
+        self.limiter = RateLimiter(rate=1, burst=3)
+
+    def tearDown(self):
+        context.db = self.previous_db
+        Permissions.invalidate_tokens()
+        Permissions.verified_tokens.clear()
+
+    def drain_shared_bucket(self):
+        waits = [self.limiter.check_rate(f"made up {i}") for i in range(10)]
+        self.assertEqual(waits[:3], [0, 0, 0])
+        self.assertTrue(all(wait > 0 for wait in waits[3:]))
+
+    async def test_made_up_tokens_share_one_bucket(self):
+        self.drain_shared_bucket()
+        self.assertEqual(self.limiter.buckets, {})
+        self.assertGreater(self.limiter.check_rate("real"), 0)
+
+    async def test_expired_real_token_keeps_its_bucket(self):
+        self.assertEqual(await Permissions.check_authorization("real"), Permissions.Permissions.FULL)
+        # the cached permissions run out, as they do after TOKEN_TTL
+        Permissions.token_cache[Permissions.token_digest("real")] = (Permissions.Permissions.FULL, 0)
+        self.drain_shared_bucket()
+        self.assertEqual(self.limiter.check_rate("real"), 0)
+
+    async def test_invalidated_real_token_keeps_its_bucket(self):
+        await Permissions.check_authorization("real")
+        Permissions.invalidate_tokens()
+        self.drain_shared_bucket()
+        self.assertEqual(self.limiter.check_rate("real"), 0)
+
+    async def test_revoked_token_goes_back_to_the_shared_bucket(self):
+        await Permissions.check_authorization("real")
+        Permissions.invalidate_tokens()
+        context.db = RevokedDatabase()
+        self.assertEqual(await Permissions.check_authorization("real"), 0)
+        self.drain_shared_bucket()
+        self.assertGreater(self.limiter.check_rate("real"), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
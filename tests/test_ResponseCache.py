@@ -0,0 +1,56 @@
+import unittest
+from types import SimpleNamespace
+
+from fastapi import Response, status
+
+from modules.api.ResponseCache import ResponseCache
+
+
+def sub_response() -> Response:
+    # what FastAPI injects into an endpoint
+    response = Response()
+    del response.headers["content-length"]
+    response.status_code = None
+    return response
+
+
+class ResponseCacheTest(unittest.IsolatedAsyncioTestCase):
+    """
+    Cached responses keep their headers, on a 304 as well
+    """
+
+    async def asyncSetUp(self):
+        self.cache = ResponseCache()
+        self.builds = 0
+
+    async def build(self, response: Response) -> bytes:
+        self.builds += 1
+        response.headers["X-Next-Cursor"] = "10"
+        return b"[]"
+
+    async def respond(self, version: str, etag: str = None):
+        response = sub_response()
+        request = SimpleNamespace(headers={} if etag is None else {"if-none-match": etag})
+        return response, await self.cache.respond("page", version, request, response, lambda: self.build(response))
+
+    async def test_cached_body_keeps_headers_set_while_building(self):
+        first, _ = await self.respond("1")
+        second, body = await self.respond("1")
+        self.assertEqual(body, b"[]")
+        self.assertEqual(self.builds, 1)
+        self.assertEqual(second.headers["X-Next-Cursor"], "10")
+        self.assertEqual(second.headers["ETag"], first.headers["ETag"])
+
+    async def test_not_modified_keeps_headers(self):
+        first, _ = await self.respond("1")
+        for version in ("1", "2"):
+            _, answer = await self.respond(version, first.headers["ETag"])
+            self.assertEqual(answer.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(answer.headers["X-Next-Cursor"], "10")
+            self.assertEqual(answer.headers["ETag"], first.headers["ETag"])
+        # a new version is built again, and still matches since the body didn't change
+        self.assertEqual(self.builds, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()